@@ -10,9 +10,10 @@ class BBoxCoarseFilter:
         self.scaler = 100
         self.bbox_dict = dict()
     
-    def bboxes2dict(self, bboxes):
+    def bboxes2dict(self, bboxes, corners=None):
+        # corners: N x 8 x 3 corners of the bboxes if already computed
         for i, bbox in enumerate(bboxes):
-            grid_keys = self.compute_bbox_key(bbox)
+            grid_keys = self.compute_bbox_key(bbox, None if corners is None else corners[i])
             for key in grid_keys:
                 if key not in self.bbox_dict.keys():
                     self.bbox_dict[key] = set([i])
@@ -20,14 +21,15 @@ class BBoxCoarseFilter:
                     self.bbox_dict[key].add(i)
         return
         
-    def compute_bbox_key(self, bbox):
+    def compute_bbox_key(self, bbox, corners_3D=None):
     
         # obtain the coordinates for bottom corners
-        corners_3D = Box3D.box2corners3d_camcoord(bbox) # 8 x 3
+        if corners_3D is None:
+            corners_3D = Box3D.box2corners3d_camcoord(bbox) # 8 x 3
         corners = corners_3D[-5::-1]                    # 4 x 3
 
-        min_keys = np.floor(np.min(corners, axis=0) / self.gsize).astype(np.int)
-        max_keys = np.floor(np.max(corners, axis=0) / self.gsize).astype(np.int)
+        min_keys = np.floor(np.min(corners, axis=0) / self.gsize).astype(int)
+        max_keys = np.floor(np.max(corners, axis=0) / self.gsize).astype(int)
         
         # enumerate all the corners
         grid_keys = [
@@ -38,11 +40,11 @@ class BBoxCoarseFilter:
         ]
         return grid_keys
     
-    def related_bboxes(self, bbox):
+    def related_bboxes(self, bbox, corners_3D=None):
         """ return the list of related bboxes
         """ 
         result = set()
-        grid_keys = self.compute_bbox_key(bbox)
+        grid_keys = self.compute_bbox_key(bbox, corners_3D)
         for key in grid_keys:
             if key in self.bbox_dict.keys():
                 result.update(self.bbox_dict[key])
@@ -1,20 +1,84 @@
 import numpy as np
 from numba import jit
 from copy import deepcopy
-from .kitti_oxts import roty
+
+# columns of [h,w,l,x,y,z,theta,s] in the order of [x,y,z,theta,l,w,h,s], and the other way around
+raw_order = np.array([3, 4, 5, 6, 2, 1, 0, 7])
+array_order = np.array([6, 5, 4, 0, 1, 2, 3, 7])
+
+def column_view(index):
+    # property of a named column of the box array
+    def get(self): return self.data[..., index]
+    def set(self, value): self.data[..., index] = value
+    return property(get, set)
+
+def corners_from_boxes(boxes):
+    ''' the 8 corners of N boxes in the format of [x,y,z,theta,l,w,h] in the camera coordinate, same as
+        Box3D.box2corners3d_camcoord for all boxes at once, the corners 0-3 are the bottom ones
+
+        Returns:
+            corners_3d: (N,8,3) array in rect camera coord
+    '''
+
+    x, y, z, ry, l, w, h = [boxes[:, index, None] for index in range(7)]
+    cos, sin = np.cos(ry), np.sin(ry)
+    x_corners = np.concatenate([l/2, l/2, -l/2, -l/2, l/2, l/2, -l/2, -l/2], axis=1)       # N x 8
+    y_corners = np.concatenate([0*h, 0*h, 0*h, 0*h, -h, -h, -h, -h], axis=1)
+    z_corners = np.concatenate([w/2, -w/2, -w/2, w/2, w/2, -w/2, -w/2, w/2], axis=1)
+
+    # rotate around the yaw axis and translate
+    corners_x = cos * x_corners + sin * z_corners + x
+    corners_y = y_corners + y
+    corners_z = -sin * x_corners + cos * z_corners + z
+
+    return np.stack([corners_x, corners_y, corners_z], axis=2)
+
+class CornerCache:
+    ''' corners of the N boxes of a frame, keyed by the index of the box in the frame and computed at most once
+        for each box on demand, so that the affinity, NMS, visualization and evaluation of the frame share them
+    '''
+
+    def __init__(self, boxes):
+        self.boxes = boxes                                      # N x 7
+        self.corners = np.zeros((boxes.shape[0], 8, 3))
+        self.computed = np.zeros(boxes.shape[0], dtype=bool)
+
+    def get(self, index=None):
+        # corners of the boxes of the index, all boxes if None, K x 8 x 3
+        index = np.arange(self.boxes.shape[0]) if index is None else np.asarray(index, dtype=int)
+        missing = index[~self.computed[index]]
+        if len(missing) > 0:
+            missing = np.unique(missing)
+            self.corners[missing] = corners_from_boxes(self.boxes[missing])
+            self.computed[missing] = True
+        return self.corners[index]
+
+    def get_bev(self, index=None):
+        # bottom corners in the bird's eye view, i.e., the (x, z) of the corners 0-3, K x 4 x 2
+        return self.get(index)[:, :4][:, :, [0, 2]]
 
 class Box3D:
-    def __init__(self, x=None, y=None, z=None, h=None, w=None, l=None, ry=None, s=None):
-        self.x = x      # center x
-        self.y = y      # center y
-        self.z = z      # center z
-        self.h = h      # height
-        self.w = w      # width
-        self.l = l      # length
-        self.ry = ry    # orientation
-        self.s = s      # detection score
+    # a single box, kept for legacy callers as a thin view of its own array or of a row of a Box3DArray in
+    # the format of [x,y,z,theta,l,w,h] or [x,y,z,theta,l,w,h,s], so that setting an attribute writes the row
+
+    def __init__(self, x=None, y=None, z=None, h=None, w=None, l=None, ry=None, s=None, data=None):
+        if data is None:
+            data = np.array([x, y, z, ry, l, w, h] + ([] if s is None else [s]), dtype=np.float64)
+        self.data = data
         self.corners_3d_cam = None
 
+    x, y, z, ry, l, w, h = [column_view(index) for index in range(7)]     # center, orientation and size
+
+    @property
+    def s(self):    # detection score
+        return self.data[7] if self.data.shape[0] > 7 else None
+
+    @s.setter
+    def s(self, value):
+        if value is None: self.data = self.data[:7]
+        elif self.data.shape[0] > 7: self.data[7] = value
+        else: self.data = np.append(self.data, value)
+
     def __str__(self):
         return 'x: {}, y: {}, z: {}, heading: {}, length: {}, width: {}, height: {}, score: {}'.format(
             self.x, self.y, self.z, self.ry, self.l, self.w, self.h, self.s)
@@ -27,37 +91,37 @@ class Box3D:
     
     @classmethod
     def bbox2array(cls, bbox):
-        if bbox.s is None:
-            return np.array([bbox.x, bbox.y, bbox.z, bbox.ry, bbox.l, bbox.w, bbox.h])
-        else:
-            return np.array([bbox.x, bbox.y, bbox.z, bbox.ry, bbox.l, bbox.w, bbox.h, bbox.s])
+        return bbox.data.copy()
+
+    @classmethod
+    def bboxes2array(cls, bboxes):
+        # stack a list of boxes into a K x 7 array in the format of [x,y,z,theta,l,w,h] for batched 
+        # computation, an array is assumed to be in this format already and returned as it is
+        if isinstance(bboxes, Box3DArray):
+            return bboxes.array
+        if isinstance(bboxes, np.ndarray):
+            return bboxes
+        if len(bboxes) == 0:
+            return np.zeros((0, 7))
+        return np.stack([bbox.data[:7] for bbox in bboxes])
 
     @classmethod
     def bbox2array_raw(cls, bbox):
-        if bbox.s is None:
-            return np.array([bbox.h, bbox.w, bbox.l, bbox.x, bbox.y, bbox.z, bbox.ry])
-        else:
-            return np.array([bbox.h, bbox.w, bbox.l, bbox.x, bbox.y, bbox.z, bbox.ry, bbox.s])
+        return bbox.data[array_order[:bbox.data.shape[0]]]
 
     @classmethod
     def array2bbox_raw(cls, data):
         # take the format of data of [h,w,l,x,y,z,theta]
 
-        bbox = Box3D()
-        bbox.h, bbox.w, bbox.l, bbox.x, bbox.y, bbox.z, bbox.ry = data[:7]
-        if len(data) == 8:
-            bbox.s = data[-1]
-        return bbox
+        data = np.asarray(data, dtype=np.float64)
+        return Box3D(data=data[raw_order[:8 if len(data) == 8 else 7]])
     
     @classmethod
     def array2bbox(cls, data):
         # take the format of data of [x,y,z,theta,l,w,h]
 
-        bbox = Box3D()
-        bbox.x, bbox.y, bbox.z, bbox.ry, bbox.l, bbox.w, bbox.h = data[:7]
-        if len(data) == 8:
-            bbox.s = data[-1]
-        return bbox
+        data = np.array(data, dtype=np.float64)
+        return Box3D(data=data[:8] if len(data) == 8 else data[:7])
     
     @classmethod
     def box2corners3d_camcoord(cls, bbox):
@@ -87,24 +151,68 @@ class Box3D:
         if bbox.corners_3d_cam is not None:
             return bbox.corners_3d_cam
 
-        # compute rotational matrix around yaw axis
-        # -1.57 means straight, so there is a rotation here
-        R = roty(bbox.ry)   
+        bbox.corners_3d_cam = corners_from_boxes(bbox.data[None, :7])[0]
+        return bbox.corners_3d_cam
+
+class Box3DArray:
+    ''' N boxes as an N x 7 or N x 8 float64 array in the format of [x,y,z,theta,l,w,h] or [x,y,z,theta,l,w,h,s]
+        with named views of the columns, used by the tracker instead of a list of Box3D. The corners are cached
+        once computed, also for the boxes selected from it, so the array should not be modified after that
+    '''
+
+    def __init__(self, data, cache=None, cache_index=None):
+        data = np.asarray(data, dtype=np.float64)
+        self.data = data if data.size > 0 else data.reshape((0, 7))
+        self.cache = cache                  # CornerCache shared with the Box3DArray these boxes are selected from
+        self.cache_index = cache_index      # index of each box in the cache, the boxes in order if None
+
+    @classmethod
+    def from_raw(cls, data):
+        # take the format of data of [h,w,l,x,y,z,theta] or [h,w,l,x,y,z,theta,s]
+
+        data = np.asarray(data, dtype=np.float64)
+        if data.size == 0: return cls(np.zeros((0, 7)))
+        return cls(data[:, raw_order[:data.shape[1]]])
+
+    @classmethod
+    def from_boxes(cls, bboxes):
+        # a Box3DArray as it is, or of a list of Box3D or of an N x 7 array in the format of [x,y,z,theta,l,w,h]
+        if isinstance(bboxes, Box3DArray): return bboxes
+        return cls(Box3D.bboxes2array(bboxes))
+
+    def to_raw(self):
+        return self.data[:, array_order[:self.data.shape[1]]]
+
+    x, y, z, ry, l, w, h = [column_view(index) for index in range(7)]     # N arrays of each column
+
+    @property
+    def s(self):
+        return self.data[:, 7] if self.data.shape[1] > 7 else None
+
+    @property
+    def array(self):
+        # N x 7 in the format of [x,y,z,theta,l,w,h]
+        return self.data[:, :7]
+
+    def corners(self):
+        # N x 8 x 3 corners in the camera coordinate
+        if self.cache is None: self.cache = CornerCache(self.array)
+        return self.cache.get(self.cache_index)
 
-        # 3d bounding box dimensions
-        l, w, h = bbox.l, bbox.w, bbox.h
+    def bev_corners(self):
+        # N x 4 x 2 bottom corners in the bird's eye view
+        if self.cache is None: self.cache = CornerCache(self.array)
+        return self.cache.get_bev(self.cache_index)
 
-        # 3d bounding box corners
-        x_corners = [l/2,l/2,-l/2,-l/2,l/2,l/2,-l/2,-l/2];
-        y_corners = [0,0,0,0,-h,-h,-h,-h];
-        z_corners = [w/2,-w/2,-w/2,w/2,w/2,-w/2,-w/2,w/2];
+    def __len__(self):
+        return self.data.shape[0]
 
-        # rotate and translate 3d bounding box
-        corners_3d = np.dot(R, np.vstack([x_corners, y_corners, z_corners]))
-        corners_3d[0,:] = corners_3d[0,:] + bbox.x
-        corners_3d[1,:] = corners_3d[1,:] + bbox.y
-        corners_3d[2,:] = corners_3d[2,:] + bbox.z
-        corners_3d = np.transpose(corners_3d)
-        bbox.corners_3d_cam = corners_3d
+    def __getitem__(self, index):
+        # a Box3D view of a row, or a Box3DArray of the selected rows sharing the cache of corners
+        if isinstance(index, (int, np.integer)): return Box3D(data=self.data[index])
+        if self.cache is None: self.cache = CornerCache(self.array)
+        cache_index = np.arange(len(self))[index] if self.cache_index is None else self.cache_index[index]
+        return Box3DArray(self.data[index], self.cache, cache_index)
 
-        return corners_3d
\ No newline at end of file
+    def __iter__(self):
+        for index in range(len(self)): yield self[index]
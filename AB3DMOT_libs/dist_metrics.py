@@ -1,7 +1,7 @@
 import numpy as np, time
 from numba import jit
 from scipy.spatial import ConvexHull
-from AB3DMOT_libs.box import Box3D
+from AB3DMOT_libs.box import Box3D, Box3DArray
 
 def polygon_clip(subjectPolygon, clipPolygon):
 	""" Clip a polygon with another polygon.
@@ -59,17 +59,125 @@ def convex_hull_intersection(p1, p2):
 	else:
 		return None, 0.0  
 
-def compute_inter_2D(boxa_bottom, boxb_bottom):
-	# computer intersection over union of two sets of bottom corner points
-
-	_, I_2D = convex_hull_intersection(boxa_bottom, boxb_bottom)
+#################### compiled kernel for the overlap of rotated boxes in the bird's eye view
+# closed-form replacement of polygon_clip + ConvexHull above, the intersection of two convex polygons is 
+# convex and its vertices are the corners of each box inside the other box plus the intersection points 
+# between the edges of two boxes, so the area can be obtained by sorting these points around their center
+
+@jit(nopython=True, cache=True)
+def inside_quad(px, py, quad):
+	# check if a point is inside (or on the boundary of) a convex quadrilateral with any vertex order
+
+	pos, neg = False, False
+	for i in range(4):
+		j = (i + 1) % 4
+		side = (quad[j, 0] - quad[i, 0]) * (py - quad[i, 1]) - (quad[j, 1] - quad[i, 1]) * (px - quad[i, 0])
+		if side > 0: pos = True
+		if side < 0: neg = True
+	return not (pos and neg)
+
+@jit(nopython=True, cache=True)
+def turn(o, a, b):
+	# z-component of (a - o) x (b - o), positive if o -> a -> b is a counter-clockwise turn
+
+	return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+@jit(nopython=True, cache=True)
+def inter_area_kernel(box_a, box_b):
+	# intersection area of two boxes given their bottom corners, box_a: 4 x 2, box_b: 4 x 2
+
+	pts = np.empty((24, 2))
+	num = 0
+
+	# corners of each box that are inside the other box
+	for i in range(4):
+		if inside_quad(box_a[i, 0], box_a[i, 1], box_b):
+			pts[num, 0], pts[num, 1] = box_a[i, 0], box_a[i, 1]; num += 1
+	for i in range(4):
+		if inside_quad(box_b[i, 0], box_b[i, 1], box_a):
+			pts[num, 0], pts[num, 1] = box_b[i, 0], box_b[i, 1]; num += 1
+
+	# intersection between every edge of box a and every edge of box b, solving 
+	# a_start + t * a_dir = b_start + u * b_dir with t, u in [0, 1]
+	for i in range(4):
+		a_dir_x, a_dir_y = box_a[(i + 1) % 4, 0] - box_a[i, 0], box_a[(i + 1) % 4, 1] - box_a[i, 1]
+		for j in range(4):
+			b_dir_x, b_dir_y = box_b[(j + 1) % 4, 0] - box_b[j, 0], box_b[(j + 1) % 4, 1] - box_b[j, 1]
+			denom = a_dir_x * b_dir_y - a_dir_y * b_dir_x
+			if denom == 0: continue			# parallel edges
+			diff_x, diff_y = box_b[j, 0] - box_a[i, 0], box_b[j, 1] - box_a[i, 1]
+			t = (diff_x * b_dir_y - diff_y * b_dir_x) / denom
+			u = (diff_x * a_dir_y - diff_y * a_dir_x) / denom
+			if t >= 0 and t <= 1 and u >= 0 and u <= 1:
+				pts[num, 0], pts[num, 1] = box_a[i, 0] + t * a_dir_x, box_a[i, 1] + t * a_dir_y; num += 1
+	if num < 3: return 0.0
+
+	# sort the vertices by angle around their center and compute the area with the shoelace formula
+	center_x, center_y = np.mean(pts[:num, 0]), np.mean(pts[:num, 1])
+	angle = np.arctan2(pts[:num, 1] - center_y, pts[:num, 0] - center_x)
+	order = np.argsort(angle)
+	area = 0.0
+	for k in range(num):
+		p, q = order[k], order[(k + 1) % num]
+		area += (pts[p, 0] - center_x) * (pts[q, 1] - center_y) - (pts[p, 1] - center_y) * (pts[q, 0] - center_x)
+
+	return abs(area) * 0.5
+
+@jit(nopython=True, cache=True)
+def convex_area_kernel(box_a, box_b):
+	# area of the convex hull enclosing two boxes given their bottom corners, box_a: 4 x 2, box_b: 4 x 2
+	# using the monotone chain algorithm on the 8 corners
+
+	pts = np.empty((8, 2))
+	pts[:4], pts[4:] = box_a, box_b
+	center_x, center_y = np.mean(pts[:, 0]), np.mean(pts[:, 1])
+	pts[:, 0] -= center_x
+	pts[:, 1] -= center_y
+
+	# sort by x and then by y
+	order = np.argsort(pts[:, 1], kind='mergesort')
+	order = order[np.argsort(pts[order, 0], kind='mergesort')]
+
+	# build the lower and then the upper hull, the last point is the same as the first one
+	hull = np.empty((17, 2))
+	num = 0
+	for k in range(8):
+		while num >= 2 and turn(hull[num-2], hull[num-1], pts[order[k]]) <= 0: num -= 1
+		hull[num] = pts[order[k]]; num += 1
+	lower = num + 1
+	for k in range(6, -1, -1):
+		while num >= lower and turn(hull[num-2], hull[num-1], pts[order[k]]) <= 0: num -= 1
+		hull[num] = pts[order[k]]; num += 1
+
+	area = 0.0
+	for k in range(num - 1):
+		area += hull[k, 0] * hull[k + 1, 1] - hull[k, 1] * hull[k + 1, 0]
+
+	return abs(area) * 0.5
+
+@jit(nopython=True, cache=True)
+def inter_area_pairs(box_a, box_b):
+	# intersection area for pairs of boxes, box_a: P x 4 x 2, box_b: P x 4 x 2, return P
+
+	area = np.zeros(box_a.shape[0])
+	for index in range(box_a.shape[0]):
+		area[index] = inter_area_kernel(box_a[index], box_b[index])
+	return area
+
+@jit(nopython=True, cache=True)
+def convex_area_pairs(box_a, box_b):
+	# enclosing convex hull area for pairs of boxes, box_a: P x 4 x 2, box_b: P x 4 x 2, return P
+
+	area = np.zeros(box_a.shape[0])
+	for index in range(box_a.shape[0]):
+		area[index] = convex_area_kernel(box_a[index], box_b[index])
+	return area
 
-	# a slower version
-	# from shapely.geometry import Polygon
-	# reca, recb = Polygon(boxa_bottom), Polygon(boxb_bottom)
-	# I_2D = reca.intersection(recb).area
+def compute_inter_2D(boxa_bottom, boxb_bottom):
+	# computer intersection area of two sets of bottom corner points
 
-	return I_2D
+	return inter_area_kernel(np.ascontiguousarray(boxa_bottom, dtype=np.float64), \
+		np.ascontiguousarray(boxb_bottom, dtype=np.float64))
 
 def compute_height(box_a, box_b, inter=True):
 
@@ -106,14 +214,10 @@ def PolyArea2D(pts):
     return area
 
 def convex_area(boxa_bottom, boxb_bottom):
-
 	# compute the convex area
-	all_corners = np.vstack((boxa_bottom, boxb_bottom))
-	C = ConvexHull(all_corners)
-	convex_corners = all_corners[C.vertices]
-	convex_area = PolyArea2D(convex_corners)
 
-	return convex_area
+	return convex_area_kernel(np.ascontiguousarray(boxa_bottom, dtype=np.float64), \
+		np.ascontiguousarray(boxb_bottom, dtype=np.float64))
 
 #################### distance metric
 
@@ -220,4 +324,208 @@ def m_distance(det, trk, trk_inv_innovation_matrix=None):
         dist = np.sqrt(np.matmul(np.matmul(diff.T, trk_inv_innovation_matrix), diff)[0][0])
     else:
         dist = np.sqrt(np.dot(diff.T, diff)) 		# distance along 7 dimension
-    return dist
\ No newline at end of file
+    return dist
+
+#################### batched distance metric
+# the functions below take an N x 7 array and an M x 7 array of boxes in the format of [x,y,z,theta,l,w,h],
+# or Box3DArray, and compute the N x M matrix for all pairs at once, which gives the same values as the
+# per-pair functions above on Box3D instances but avoids looping over every pair in python
+
+def bev_corners_batch(boxes):
+	# compute the bottom corners in the bird's eye view, i.e., the (x, z) of the corners 0-3 in 
+	# Box3D.box2corners3d_camcoord, boxes: K x 7, return K x 4 x 2
+
+	x, z, ry, l, w = boxes[:, 0], boxes[:, 2], boxes[:, 3], boxes[:, 4], boxes[:, 5]
+	cos, sin = np.cos(ry)[:, None], np.sin(ry)[:, None]
+	x_corners = np.stack([l/2, l/2, -l/2, -l/2], axis=1) 		# K x 4
+	z_corners = np.stack([w/2, -w/2, -w/2, w/2], axis=1)		# K x 4
+
+	# rotate around the yaw axis and translate
+	corners_x = cos * x_corners + sin * z_corners + x[:, None]
+	corners_z = -sin * x_corners + cos * z_corners + z[:, None]
+
+	return np.stack([corners_x, corners_z], axis=2)
+
+def get_bev_corners(boxes):
+	# corners in the bird's eye view of an array of boxes, K x 4 x 2, from the cache of corners if boxes is a
+	# Box3DArray so that the corners of each box are computed once per frame rather than once per pair
+
+	if isinstance(boxes, Box3DArray): return boxes.bev_corners()
+	return bev_corners_batch(boxes)
+
+def compute_height_batch(boxes_a, boxes_b, inter=True):
+	# overlap or union height of all pairs of boxes, the box spans from y - h to y 
+	# in the camera coordinate, boxes_a: N x 7, boxes_b: M x 7, return N x M
+
+	ymax_a, ymin_a = boxes_a[:, None, 1], boxes_a[:, None, 1] - boxes_a[:, None, 6]
+	ymax_b, ymin_b = boxes_b[None, :, 1], boxes_b[None, :, 1] - boxes_b[None, :, 6]
+	if inter: height = np.minimum(ymax_a, ymax_b) - np.maximum(ymin_a, ymin_b)
+	else:     height = np.maximum(ymax_a, ymax_b) - np.minimum(ymin_a, ymin_b)
+
+	return np.maximum(height, 0.0)
+
+def compute_height_pairs(boxes_a, boxes_b, inter=True):
+	# overlap or union height of K pairs of boxes, boxes_a: K x 7, boxes_b: K x 7, return K
+
+	ymax_a, ymin_a = boxes_a[:, 1], boxes_a[:, 1] - boxes_a[:, 6]
+	ymax_b, ymin_b = boxes_b[:, 1], boxes_b[:, 1] - boxes_b[:, 6]
+	if inter: height = np.minimum(ymax_a, ymax_b) - np.maximum(ymin_a, ymin_b)
+	else:     height = np.maximum(ymax_a, ymax_b) - np.minimum(ymin_a, ymin_b)
+
+	return np.maximum(height, 0.0)
+
+def iou_pairs(boxes_a, boxes_b, metric='giou_3d', corners_a=None, corners_b=None):
+	''' Compute 3D/2D bounding box IoU/GIoU for K pairs of boxes, i.e., between the k-th rows of both inputs
+
+	Input:
+		boxes_a: K x 7 array in the format of [x,y,z,theta,l,w,h]
+		boxes_b: K x 7 array in the format of [x,y,z,theta,l,w,h]
+		corners_a, corners_b: K x 4 x 2 corners in the bird's eye view, computed from the boxes if not given
+	Output:
+		K array of IoU/GIoU
+	'''
+
+	# compute 2D related measures, only pairs whose circumscribed circles overlap can have a non-zero intersection
+	if corners_a is None: corners_a = bev_corners_batch(boxes_a)
+	if corners_b is None: corners_b = bev_corners_batch(boxes_b)
+	radius_a, radius_b = np.hypot(boxes_a[:, 4], boxes_a[:, 5]) / 2, np.hypot(boxes_b[:, 4], boxes_b[:, 5]) / 2
+	center_dist = np.hypot(boxes_a[:, 0] - boxes_b[:, 0], boxes_a[:, 2] - boxes_b[:, 2])
+	index = np.nonzero(center_dist <= radius_a + radius_b)[0]
+	I_2D = np.zeros(boxes_a.shape[0])
+	if len(index) > 0: I_2D[index] = inter_area_pairs(corners_a[index], corners_b[index])
+
+	# only needed for GIoU
+	if 'giou' in metric:
+		C_2D = convex_area_pairs(corners_a, corners_b)
+
+	area_a = boxes_a[:, 5] * boxes_a[:, 4]
+	area_b = boxes_b[:, 5] * boxes_b[:, 4]
+	if '2d' in metric:		 	# return 2D IoU/GIoU
+		U_2D = area_a + area_b - I_2D
+		if metric == 'iou_2d':  return I_2D / U_2D
+		if metric == 'giou_2d': return I_2D / U_2D - (C_2D - U_2D) / C_2D
+
+	elif '3d' in metric:		# return 3D IoU/GIoU
+		overlap_height = compute_height_pairs(boxes_a, boxes_b)
+		I_3D = I_2D * overlap_height	
+		U_3D = area_a * boxes_a[:, 6] + area_b * boxes_b[:, 6] - I_3D
+		if metric == 'iou_3d':  return I_3D / U_3D
+		if metric == 'giou_3d':
+			union_height = compute_height_pairs(boxes_a, boxes_b, inter=False)
+			C_3D = C_2D * union_height
+			return I_3D / U_3D - (C_3D - U_3D) / C_3D
+	else:
+		assert False, '%s is not supported' % metric
+
+def iou_batch(boxes_a, boxes_b, metric='giou_3d', max_pairs=20000):
+	''' Compute 3D/2D bounding box IoU/GIoU for all pairs of boxes, same as iou() but batched
+
+	Input:
+		boxes_a: N x 7 array in the format of [x,y,z,theta,l,w,h], or Box3DArray
+		boxes_b: M x 7 array in the format of [x,y,z,theta,l,w,h], or Box3DArray
+		max_pairs: process the rows in chunks to bound the memory of intermediate arrays
+	Output:
+		N x M array of IoU/GIoU
+	'''
+
+	# the corners of each box are computed once and repeated for all pairs
+	corners_a, corners_b = get_bev_corners(boxes_a), get_bev_corners(boxes_b)
+	boxes_a, boxes_b = Box3D.bboxes2array(boxes_a), Box3D.bboxes2array(boxes_b)
+	N, M = boxes_a.shape[0], boxes_b.shape[0]
+	if N * M == 0: return np.zeros((N, M))
+
+	iou = []
+	chunk = N if N * M <= max_pairs else max(1, max_pairs // M)
+	for start in range(0, N, chunk):
+		num = min(chunk, N - start)
+		box_a = np.repeat(boxes_a[start:start+chunk], M, axis=0)				# num*M x 7
+		box_b = np.tile(boxes_b, (num, 1))									# num*M x 7
+		iou.append(iou_pairs(box_a, box_b, metric, np.repeat(corners_a[start:start+chunk], M, axis=0), \
+			np.tile(corners_b, (num, 1, 1))).reshape((num, M)))
+
+	return np.concatenate(iou, axis=0)
+
+def dist_ground_batch(boxes_a, boxes_b):
+	# distance of bottom center for all pairs of boxes, NOT considering the difference in height
+
+	boxes_a, boxes_b = Box3D.bboxes2array(boxes_a), Box3D.bboxes2array(boxes_b)
+	diff = boxes_a[:, None, [0, 2]] - boxes_b[None, :, [0, 2]]
+	return np.linalg.norm(diff, axis=2)
+
+def dist3d_batch(boxes_a, boxes_b):
+	# distance of actual center for all pairs of boxes, the center of the 8 corners is 
+	# at the bottom center lifted by half of the height, i.e., y - h / 2
+
+	boxes_a, boxes_b = Box3D.bboxes2array(boxes_a), Box3D.bboxes2array(boxes_b)
+	center_a = boxes_a[:, :3] - np.stack([np.zeros(len(boxes_a)), boxes_a[:, 6] / 2, np.zeros(len(boxes_a))], axis=1)
+	center_b = boxes_b[:, :3] - np.stack([np.zeros(len(boxes_b)), boxes_b[:, 6] / 2, np.zeros(len(boxes_b))], axis=1)
+	return np.linalg.norm(center_a[:, None, :] - center_b[None, :, :], axis=2)
+
+@jit(nopython=True, cache=True)
+def mahalanobis_kernel(diff, trk_inn_cholesky, trk_index):
+	# squared mahalanobis distance of K differences, trk_inn_cholesky: M x 7 x 7 lower cholesky factors L of
+	# the innovation matrices S = LL', trk_index: K tracks of the differences. diff' inv(S) diff is the squared
+	# norm of z solving Lz = diff, which is solved by forward substitution without inverting S
+
+	dist = np.zeros(diff.shape[0])
+	z = np.zeros(diff.shape[1])
+	for k in range(diff.shape[0]):
+		L = trk_inn_cholesky[trk_index[k]]
+		for i in range(diff.shape[1]):
+			value = diff[k, i]
+			for j in range(i): value -= L[i, j] * z[j]
+			z[i] = value / L[i, i]
+			dist[k] += z[i] * z[i]
+	return dist
+
+def m_distance_batch(dets, trks, trk_inn_cholesky=None):
+	# mahalanobis distance for all pairs of detections and tracks, trk_inn_cholesky: M x 7 x 7 lower cholesky
+	# factors of the innovation matrices, euclidean distance along 7 dimensions if not provided
+
+	dets, trks = Box3D.bboxes2array(dets), Box3D.bboxes2array(trks)
+	diff = dets[:, None, :7] - trks[None, :, :7] 		# N x M x 7
+
+	# correct orientation
+	yaw_diff = diff[..., 3]
+	yaw_diff = np.where(yaw_diff > np.pi / 2, yaw_diff - np.pi, yaw_diff)
+	yaw_diff = np.where(yaw_diff < -np.pi / 2, yaw_diff + np.pi, yaw_diff)
+	diff[..., 3] = yaw_diff
+
+	if trk_inn_cholesky is not None:
+		trk_index = np.tile(np.arange(diff.shape[1]), diff.shape[0])
+		dist = np.sqrt(mahalanobis_kernel(diff.reshape((-1, 7)), trk_inn_cholesky, trk_index)).reshape(diff.shape[:2])
+	else:
+		dist = np.sqrt(np.sum(diff ** 2, axis=2))
+	return dist
+
+def dist_ground_pairs(boxes_a, boxes_b):
+	# distance of bottom center for K pairs of boxes, NOT considering the difference in height
+
+	return np.linalg.norm(boxes_a[:, [0, 2]] - boxes_b[:, [0, 2]], axis=1)
+
+def dist3d_pairs(boxes_a, boxes_b):
+	# distance of actual center for K pairs of boxes
+
+	center_a, center_b = boxes_a[:, :3].copy(), boxes_b[:, :3].copy()
+	center_a[:, 1] -= boxes_a[:, 6] / 2
+	center_b[:, 1] -= boxes_b[:, 6] / 2
+	return np.linalg.norm(center_a - center_b, axis=1)
+
+def m_distance_pairs(dets, trks, trk_inn_cholesky=None, trk_index=None):
+	# mahalanobis distance for K pairs of detections and tracks, trk_inn_cholesky: M x 7 x 7 lower cholesky
+	# factors of the innovation matrices of all tracks and trk_index the K tracks of the pairs, euclidean
+	# distance along 7 dimensions if not provided
+
+	diff = dets[:, :7] - trks[:, :7] 					# K x 7
+
+	# correct orientation
+	yaw_diff = diff[:, 3]
+	yaw_diff = np.where(yaw_diff > np.pi / 2, yaw_diff - np.pi, yaw_diff)
+	yaw_diff = np.where(yaw_diff < -np.pi / 2, yaw_diff + np.pi, yaw_diff)
+	diff[:, 3] = yaw_diff
+
+	if trk_inn_cholesky is not None:
+		dist = np.sqrt(mahalanobis_kernel(diff, trk_inn_cholesky, trk_index))
+	else:
+		dist = np.sqrt(np.sum(diff ** 2, axis=1))
+	return dist
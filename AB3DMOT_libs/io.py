@@ -3,7 +3,7 @@
 
 from typing import Tuple, List, Union, Dict
 
-import warnings, numpy as np, os
+import warnings, numpy as np, os, threading, queue
 from xinshuo_miscellaneous.file_io import mkdir_if_missing, load_txt_file, save_txt_file
 
 # 1D array representing 1 detected object in a single frame. Elements in the array are as follows:
@@ -52,6 +52,93 @@ def get_frame_det(detections_all_frames: Detections, frame_index: int) -> Single
 	return {'dets': detections, 'info': additional_info}
 
 
+# *************** binary detection store ***************
+# detections of a sequence stored as memory-mappable columns, i.e., a C x N array where each column of the
+# text format is contiguous, reordered so that the info and the 3D box of the detections are two contiguous 
+# ranges of columns, plus an index of frame -> (start, end) into the detections sorted by frame, so that the
+# detections of a frame are zero-copy slices rather than boolean scans over all detections of the sequence
+
+# Frame Index | Alpha | Type | 2D BBOX (x1, y1, x2, y2) | Score | 3D BBOX (h, w, l, x, y, z, rot_y)
+store_order = [0, 14, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
+store_info, store_dets = slice(1, 8), slice(8, 15)
+
+
+def get_store_path(file: str) -> Tuple[str, str]:
+	# binary store next to the text file of detections, e.g., 0001.npy and 0001_frame_index.npy for 0001.txt
+	
+	base = os.path.splitext(file)[0]
+	return base + '.npy', base + '_frame_index.npy'
+
+
+class DetectionStore(object):
+	def __init__(self, columns: np.ndarray, frame_index: np.ndarray):
+		self.columns = columns 					# 15 x N, detections sorted by frame in the order of store_order
+		self.frame_index = frame_index 			# num_frames x 2, start and end of the detections of each frame
+
+	def __len__(self) -> int:
+		return self.columns.shape[1]
+
+	def get_frame(self, frame_index: int) -> SingleFrameDetections:
+		# same as get_frame_det but returns views of the columns without copying
+
+		if frame_index < 0 or frame_index >= self.frame_index.shape[0]: start, end = 0, 0
+		else: start, end = self.frame_index[frame_index]
+		return {'dets': self.columns[store_dets, start:end].T, 'info': self.columns[store_info, start:end].T}
+
+	@classmethod
+	def from_detections(cls, detections: Detections, dtype=np.float64) -> 'DetectionStore':
+		# build the store from N x 15 detections in the text format, keeping the order within each frame
+
+		frames = detections[:, 0].astype(np.int64)
+		order = np.argsort(frames, kind='stable')
+		columns = np.ascontiguousarray(detections[order][:, store_order].T, dtype=dtype)
+
+		# detections of frame f are in [start[f], end[f]) of the sorted detections
+		num_frames = frames.max() + 1 if len(frames) > 0 else 0
+		frame_index = np.searchsorted(frames[order], np.arange(num_frames + 1))
+		frame_index = np.stack((frame_index[:-1], frame_index[1:]), axis=1).astype(np.int64)
+
+		return cls(columns, frame_index)
+
+	def save(self, file: str) -> None:
+		columns_file, index_file = get_store_path(file)
+		np.save(columns_file, self.columns)
+		np.save(index_file, self.frame_index)
+
+
+def save_detection_store(file: str, dtype=np.float64) -> bool:
+	# convert the text file of detections of a sequence to the binary store next to it, float32 halves the size
+	# but rounds the detections, so the tracking results are not the same as with the text file
+	
+	detections, flag = load_detection(file)
+	if not flag: return False
+	DetectionStore.from_detections(detections, dtype).save(file)
+	return True
+
+
+def is_store_fresh(file: str, columns_file: str, index_file: str) -> bool:
+	# both files of the store exist and are modified after the text file if it exists
+
+	if not (os.path.exists(columns_file) and os.path.exists(index_file)): return False
+	if not os.path.exists(file): return True
+	mtime = os.stat(file).st_mtime_ns
+	return os.stat(columns_file).st_mtime_ns >= mtime and os.stat(index_file).st_mtime_ns >= mtime
+
+
+def load_detection_store(file: str) -> Tuple[Union[None, DetectionStore], bool]:
+	# load the binary store of a sequence with memory mapping if it exists and is not older than the text file,
+	# otherwise parse the text file, e.g., the detections are combined again after the conversion
+
+	columns_file, index_file = get_store_path(file)
+	if is_store_fresh(file, columns_file, index_file):
+		store = DetectionStore(np.load(columns_file, mmap_mode='r'), np.load(index_file))
+		return store, len(store) > 0
+
+	detections, flag = load_detection(file)
+	if not flag: return None, False
+	return DetectionStore.from_detections(detections), True
+
+
 def load_highlight(file):
 	# load file with each line containing seq_id, frame_id, ID, error_type
 	# used to highlight errors in the video visualization, such as IDS, FP
@@ -88,29 +175,47 @@ def get_saving_dir(eval_dir_dict, seq_name, save_dir, num_hypo):
 		eval_file_dict[index] = os.path.join(eval_dir_dict[index], seq_name + '.txt')
 		eval_file_dict[index] = open(eval_file_dict[index], 'w')
 		save_trk_dir[index] = os.path.join(save_dir, 'trk_withid_%d' % index, seq_name); mkdir_if_missing(save_trk_dir[index])
+	affinity_dir, affinity_vis = get_affinity_dir(save_dir, seq_name)
+
+	return eval_file_dict, save_trk_dir, affinity_dir, affinity_vis
+
+
+def get_affinity_dir(save_dir, seq_name):
+	# create dir for saving the affinity, which does not depend on the track ID
+	
 	affinity_dir = os.path.join(save_dir, 'affi', seq_name); mkdir_if_missing(affinity_dir)
 	affinity_vis = os.path.join(save_dir, 'affi_vis', seq_name); mkdir_if_missing(affinity_vis)
 
-	return eval_file_dict, save_trk_dir, affinity_dir, affinity_vis
+	return affinity_dir, affinity_vis
 
 
-def save_results(res, save_trk_file, eval_file, det_id2str, frame, score_threshold):
-	# box3d in the format of h, w, l, x, y, z, theta in camera coordinate
-	bbox3d_tmp, id_tmp, ori_tmp, type_tmp, bbox2d_tmp_trk, conf_tmp = \
-		res[0:7], res[7], res[8], det_id2str[res[9]], res[10:14], res[14] 		
-	 
-	# save in detection format with track ID, can be used for dection evaluation and tracking visualization
-	str_to_srite = '%s -1 -1 %f %f %f %f %f %f %f %f %f %f %f %f %f %d\n' % (type_tmp, ori_tmp,
-		bbox2d_tmp_trk[0], bbox2d_tmp_trk[1], bbox2d_tmp_trk[2], bbox2d_tmp_trk[3], 
-		bbox3d_tmp[0], bbox3d_tmp[1], bbox3d_tmp[2], bbox3d_tmp[3], bbox3d_tmp[4], bbox3d_tmp[5], bbox3d_tmp[6], conf_tmp, id_tmp)
-	save_trk_file.write(str_to_srite)
-
-	# save in tracking format, for 3D MOT evaluation
+# ori, 2D box (x1, y1, x2, y2), 3D box (h, w, l, x, y, z, theta) and confidence, the fields shared by both formats
+result_order = [8, 10, 11, 12, 13, 0, 1, 2, 3, 4, 5, 6, 14]
+result_fmt = ' '.join(['%f'] * len(result_order))
+
+
+def format_result(res, det_id2str, frame, score_threshold):
+	# box3d in the format of h, w, l, x, y, z, theta in camera coordinate, the shared fields are formatted once
+	# return the line in detection format and the line in tracking format, which is None for low confidence
+	res = res.tolist()
+	id_tmp, type_tmp, conf_tmp = res[7], det_id2str[res[9]], res[14]
+	fields = result_fmt % tuple([res[index] for index in result_order])
+
+	# detection format with track ID, can be used for dection evaluation and tracking visualization
+	trk_str = '%s -1 -1 %s %d\n' % (type_tmp, fields, id_tmp)
+
+	# tracking format, for 3D MOT evaluation
+	eval_str = None
 	if conf_tmp >= score_threshold:
-		str_to_srite = '%d %d %s 0 0 %f %f %f %f %f %f %f %f %f %f %f %f %f\n' % (frame, id_tmp, 
-			type_tmp, ori_tmp, bbox2d_tmp_trk[0], bbox2d_tmp_trk[1], bbox2d_tmp_trk[2], bbox2d_tmp_trk[3], 
-			bbox3d_tmp[0], bbox3d_tmp[1], bbox3d_tmp[2], bbox3d_tmp[3], bbox3d_tmp[4], bbox3d_tmp[5], bbox3d_tmp[6], conf_tmp)
-		eval_file.write(str_to_srite)
+		eval_str = '%d %d %s 0 0 %s\n' % (frame, id_tmp, type_tmp, fields)
+
+	return trk_str, eval_str
+
+
+def save_results(res, save_trk_file, eval_file, det_id2str, frame, score_threshold):
+	trk_str, eval_str = format_result(res, det_id2str, frame, score_threshold)
+	save_trk_file.write(trk_str)
+	if eval_str is not None: eval_file.write(eval_str)
 
 
 def save_affinity(affi_data, save_path):
@@ -138,6 +243,159 @@ def save_affinity(affi_data, save_path):
 	np.savetxt(save_path, affi_data, fmt=fmt, delimiter=', ')
 
 
+# *************** result sinks ***************
+# the results of a sequence are given frame by frame to a sink, which either writes the KITTI text layout,
+# i.e., one eval file per sequence plus one trk_withid file and one affinity file per frame, or packs all
+# frames into a single file per sequence. The files are written through an AsyncWriter on a background
+# thread so that the writing overlaps with the tracking of the next sequence
+
+def save_text(save_path, text):
+	with open(save_path, 'w') as file: file.write(text)
+
+
+class AsyncWriter(object):
+	def __init__(self, asynchronous=True, max_pending=1024):
+		# the queue is bounded to limit the memory of pending results, write in place if not asynchronous
+		self.error = None
+		self.queue = queue.Queue(maxsize=max_pending) if asynchronous else None
+		if asynchronous:
+			self.thread = threading.Thread(target=self.run, daemon=True)
+			self.thread.start()
+
+	def run(self):
+		while True:
+			task = self.queue.get()
+			if task is None: break
+			try: task[0](*task[1], **task[2])
+			except Exception as error: 			# report the first error in the main thread
+				if self.error is None: self.error = error
+
+	def submit(self, func, *args, **kwargs):
+		if self.error is not None: raise self.error
+		if self.queue is None: func(*args, **kwargs)
+		else: self.queue.put((func, args, kwargs))
+
+	def close(self):
+		# wait until all pending files are written
+		if self.queue is not None:
+			self.queue.put(None)
+			self.thread.join()
+			self.queue = None
+		if self.error is not None: raise self.error
+
+
+class TextResultSink(object):
+	def __init__(self, save_dir, seq_name, num_hypo, det_id2str, score_threshold, writer=None):
+		self.num_hypo, self.det_id2str, self.score_threshold = num_hypo, det_id2str, score_threshold
+		self.writer = writer if writer is not None else AsyncWriter(asynchronous=False)
+
+		# create dir for saving
+		self.eval_file, self.trk_dir = list(), list()
+		for index in range(num_hypo):
+			self.eval_file.append(os.path.join(save_dir, 'data_%d' % index, seq_name + '.txt'))
+			self.trk_dir.append(os.path.join(save_dir, 'trk_withid_%d' % index, seq_name))
+			mkdir_if_missing(self.eval_file[index]); mkdir_if_missing(self.trk_dir[index])
+		self.affinity_dir, self.affinity_vis = get_affinity_dir(save_dir, seq_name)
+		self.eval_lines = [list() for _ in range(num_hypo)] 		# written once at the end of the sequence
+
+	def write_frame(self, frame, results, affi):
+		# saving trajectories, loop over each hypothesis, one write per file
+		for hypo in range(self.num_hypo):
+			trk_lines = list()
+			for res in results[hypo]: 					# N x 15
+				trk_str, eval_str = format_result(res, self.det_id2str, frame, self.score_threshold)
+				trk_lines.append(trk_str)
+				if eval_str is not None: self.eval_lines[hypo].append(eval_str)
+			self.writer.submit(save_text, os.path.join(self.trk_dir[hypo], '%06d.txt' % frame), ''.join(trk_lines))
+
+		# saving affinity matrix, between the past frame and current frame
+		if (affi is not None) and (affi.shape[0] + affi.shape[1] > 0):
+			# save affinity as long as there are tracklets in at least one frame
+			self.writer.submit(np.save, os.path.join(self.affinity_dir, '%06d.npy' % frame), affi)
+
+			# cannot save for visualization unless both two frames have tracklets
+			if affi.shape[0] > 0 and affi.shape[1] > 0:
+				self.writer.submit(save_affinity, affi, os.path.join(self.affinity_vis, '%06d.txt' % frame))
+
+	def close(self):
+		for hypo in range(self.num_hypo):
+			self.writer.submit(save_text, self.eval_file[hypo], ''.join(self.eval_lines[hypo]))
+
+
+def get_packed_path(save_dir, seq_name):
+	return os.path.join(save_dir, 'packed', seq_name + '.npz')
+
+
+class PackedResultSink(object):
+	def __init__(self, save_dir, seq_name, num_hypo, det_id2str=None, score_threshold=None, writer=None):
+		# the tracks of all frames are concatenated with a frame index, same for the flattened affinity
+		self.num_hypo = num_hypo
+		self.writer = writer if writer is not None else AsyncWriter(asynchronous=False)
+		self.save_path = get_packed_path(save_dir, seq_name); mkdir_if_missing(self.save_path)
+		self.frames, self.results, self.affi = list(), [list() for _ in range(num_hypo)], list()
+
+	def write_frame(self, frame, results, affi):
+		self.frames.append(frame)
+		for hypo in range(self.num_hypo): self.results[hypo].append(results[hypo])
+		self.affi.append(affi)
+
+	def close(self):
+		packed = {'frames': np.array(self.frames, dtype=np.int64).reshape(-1)}
+
+		# tracks of frame f are in [start, end) of results_<hypo>
+		for hypo in range(self.num_hypo):
+			counts = [len(results) for results in self.results[hypo]]
+			packed['results_%d' % hypo] = np.concatenate([np.empty((0, 15))] + self.results[hypo], axis=0)
+			packed['index_%d' % hypo] = np.cumsum([0] + counts, dtype=np.int64)
+
+		# shape and memory order of the affinity of each frame, -1 if there is no affinity, the order is kept
+		# so that the exported .npy files are the same as saved directly
+		affi_shape, affi_all = list(), [np.empty(0)]
+		for affi in self.affi:
+			if affi is None: affi_shape.append((-1, -1, 0)); continue
+			fortran = affi.flags.f_contiguous and not affi.flags.c_contiguous
+			affi_shape.append(affi.shape + (fortran, ))
+			affi_all.append(affi.ravel(order='F' if fortran else 'C'))
+		packed['affi'] = np.concatenate(affi_all)
+		packed['affi_shape'] = np.array(affi_shape, dtype=np.int64).reshape((-1, 3))
+
+		self.writer.submit(np.savez, self.save_path, **packed)
+
+
+def get_result_sink(sink_name, save_dir, seq_name, num_hypo, det_id2str, score_threshold, writer=None):
+	if sink_name == 'text': sink = TextResultSink
+	elif sink_name == 'packed': sink = PackedResultSink
+	else: assert False, 'error'
+
+	return sink(save_dir, seq_name, num_hypo, det_id2str, score_threshold, writer)
+
+
+def export_packed_results(save_dir, seq_name, num_hypo, det_id2str, score_threshold, writer=None):
+	# convert the packed results of a sequence to the KITTI text layout, the same as saved by TextResultSink
+	# return False if the sequence has no packed results, e.g., no detection in the sequence
+
+	packed_path = get_packed_path(save_dir, seq_name)
+	if not os.path.exists(packed_path): return False
+	packed = np.load(packed_path)
+
+	sink = TextResultSink(save_dir, seq_name, num_hypo, det_id2str, score_threshold, writer)
+	results_all = [packed['results_%d' % hypo] for hypo in range(num_hypo)]
+	index = [packed['index_%d' % hypo] for hypo in range(num_hypo)]
+	affi_all, affi_shape, affi_start = packed['affi'], packed['affi_shape'], 0
+	for count, frame in enumerate(packed['frames']):
+		results = [results_all[hypo][index[hypo][count]:index[hypo][count+1]] for hypo in range(num_hypo)]
+
+		affi = None
+		if affi_shape[count, 0] >= 0:
+			affi_end = affi_start + affi_shape[count, 0] * affi_shape[count, 1]
+			affi = affi_all[affi_start:affi_end].reshape(affi_shape[count, :2], order='F' if affi_shape[count, 2] else 'C')
+			affi_start = affi_end
+		sink.write_frame(int(frame), results, affi)
+	sink.close()
+
+	return True
+
+
 def combine_files(file_list, save_path, sort=True):
 	# combine txt files and sort them in frame order, used to collect results from 
 	# different class categories
@@ -1,5 +1,6 @@
-import numpy as np
+import numpy as np, filterpy.kalman
 from filterpy.kalman import KalmanFilter, UnscentedKalmanFilter, MerweScaledSigmaPoints
+from AB3DMOT_libs.kalman_filter_cv import cv_predict, cv_update
 
 
 class Filter(object):
@@ -65,3 +66,161 @@ class KF(Filter):
 		# return the object velocity in the state
 
 		return self.kf.x[7:]
+
+#################### struct-of-arrays storage of all tracks
+# the same constant velocity Kalman filter as in KF above, but the states, covariances, counters and IDs 
+# of all tracks are kept in contiguous arrays so that the prediction and update run as batched matrix 
+# operations over all tracks instead of one filterpy object per track. The tracks are stored in the first 
+# num rows in the order of birth, the same order as the list of KF objects, dead tracks are removed by 
+# compacting the arrays which keeps the order of the remaining tracks
+# 
+# the backend of the prediction and update can be one of the followings:
+# 	cv: 		closed-form constant velocity filter in kalman_filter_cv.py, fastest
+# 	dense: 		generic batched matrix operations, bitwise the same as filterpy
+# 	filterpy: 	filterpy applied to one track at a time, slowest, for reference only
+
+class TrackBank(object):
+	def __init__(self, capacity=64, backend='cv'):
+
+		# constant velocity model, state x dimension 10: x, y, z, theta, l, w, h, dx, dy, dz
+		self.F = np.eye(10)						# state transition matrix, x' = x + dx, y' = y + dy, z' = z + dz
+		self.F[:3, 7:] = np.eye(3)
+		self.H = np.eye(7, 10)					# measurement function, the first 7 dimensions of the state
+		self.Q = np.eye(10)						# process uncertainty, make the constant velocity part more certain
+		self.Q[7:, 7:] *= 0.01
+		self.R = np.eye(7)						# measurement uncertainty
+		self.P_init = np.eye(10)				# initial state uncertainty, very uncertain about the initial velocity
+		self.P_init[7:, 7:] *= 1000.
+		self.P_init *= 10.
+
+		assert backend in ['cv', 'dense', 'filterpy'], '%s is not supported' % backend
+		self.backend = backend
+
+		# buffers, only the first num rows are valid
+		self.num = 0
+		self._x = np.zeros((capacity, 10))						# M x 10
+		self._P = np.zeros((capacity, 10, 10))					# M x 10 x 10
+		self._id = np.zeros((capacity, ), dtype=np.int64)
+		self._hits = np.zeros((capacity, ), dtype=np.int64)		# number of total hits including the first detection
+		self._time_since_update = np.zeros((capacity, ), dtype=np.int64)
+		self._info = np.zeros((capacity, 0))					# other information associated
+
+	def __len__(self):
+		return self.num
+
+	# views of the valid tracks, writing to them writes to the buffers
+	@property
+	def x(self): return self._x[:self.num]
+	@property
+	def P(self): return self._P[:self.num]
+	@property
+	def id(self): return self._id[:self.num]
+	@property
+	def hits(self): return self._hits[:self.num]
+	@property
+	def time_since_update(self): return self._time_since_update[:self.num]
+	@property
+	def info(self): return self._info[:self.num]
+
+	def reserve(self, capacity, dim_info):
+		# grow the buffers by doubling if more rows or a different size of info is needed, the size of info
+		# can only change when there is no track, e.g., at the first birth
+
+		if capacity <= self._x.shape[0] and dim_info == self._info.shape[1]: return
+		assert self.num == 0 or dim_info == self._info.shape[1], \
+			'size of info changes from %d to %d with %d tracks' % (self._info.shape[1], dim_info, self.num)
+		capacity = max(capacity, 2 * self._x.shape[0])
+		def grow(array, shape):
+			new_array = np.zeros(shape, dtype=array.dtype)
+			new_array[:self.num] = array[:self.num]
+			return new_array
+		self._x = grow(self._x, (capacity, 10))
+		self._P = grow(self._P, (capacity, 10, 10))
+		self._id = grow(self._id, (capacity, ))
+		self._hits = grow(self._hits, (capacity, ))
+		self._time_since_update = grow(self._time_since_update, (capacity, ))
+		if dim_info == self._info.shape[1]: self._info = grow(self._info, (capacity, dim_info))
+		else:								self._info = np.zeros((capacity, dim_info))
+
+	def birth(self, bboxes3d, info, ids):
+		# append new tracks initialized from the detections
+		# bboxes3d: K x 7 in the format of [x,y,z,theta,l,w,h], info: K x D, ids: K
+
+		num_new = len(ids)
+		if num_new == 0: return
+		self.reserve(self.num + num_new, info.shape[1])
+		new = slice(self.num, self.num + num_new)
+		self._x[new] = 0
+		self._x[new, :7] = bboxes3d
+		self._P[new] = self.P_init
+		self._id[new] = ids
+		self._hits[new] = 1
+		self._time_since_update[new] = 0
+		self._info[new] = info
+		self.num += num_new
+
+	def remove(self, dead):
+		# delete the tracks where dead is True by moving the remaining tracks to the front
+
+		keep = np.nonzero(np.logical_not(dead))[0]
+		num_keep = len(keep)
+		if num_keep == self.num: return
+		for array in [self._x, self._P, self._id, self._hits, self._time_since_update, self._info]:
+			array[:num_keep] = array[keep]
+		self.num = num_keep
+
+	def predict(self):
+		# x = Fx, P = FPF' + Q for all tracks
+
+		if self.num == 0: return
+		if self.backend == 'cv':
+			self._x[:self.num], self._P[:self.num] = cv_predict(self.x, self.P, self.Q)
+		elif self.backend == 'dense':
+			self._x[:self.num] = np.matmul(self.x, self.F.T)
+			self._P[:self.num] = np.matmul(np.matmul(self.F, self.P), self.F.T) + self.Q
+		else:
+			for index in range(self.num):
+				x, self._P[index] = filterpy.kalman.predict(self._x[index, :, None], self._P[index], self.F, self.Q)
+				self._x[index] = x[:, 0]
+
+	def update(self, index, z):
+		# update the tracks at index with the measurements z: K x 7 in the format of [x,y,z,theta,l,w,h]
+
+		if len(index) == 0: return
+		if self.backend == 'cv':
+			self._x[index], self._P[index] = cv_update(self._x[index], self._P[index], z, self.R)
+			return
+		elif self.backend == 'filterpy':
+			for track_index, z_tmp in zip(index, z):
+				x, self._P[track_index] = filterpy.kalman.update(self._x[track_index, :, None], \
+					self._P[track_index], z_tmp, self.R, self.H)
+				self._x[track_index] = x[:, 0]
+			return
+
+		x, P = self._x[index], self._P[index] 						# K x 10, K x 10 x 10
+
+		# residual between measurement and prediction, y = z - Hx
+		y = z - np.matmul(x, self.H.T)
+
+		# project system uncertainty into measurement space, S = HPH' + R
+		PHT = np.matmul(P, self.H.T)
+		S = np.matmul(self.H, PHT) + self.R
+
+		# kalman gain, K = PH'inv(S)
+		K = np.matmul(PHT, np.linalg.inv(S))
+
+		# x = x + Ky, P = (I-KH)P(I-KH)' + KRK'
+		self._x[index] = x + np.matmul(K, y[:, :, None])[:, :, 0]
+		I_KH = np.eye(10) - np.matmul(K, self.H)
+		self._P[index] = np.matmul(np.matmul(I_KH, P), I_KH.transpose(0, 2, 1)) + \
+			np.matmul(np.matmul(K, self.R), K.transpose(0, 2, 1))
+
+	def compute_innovation_matrix(self):
+		""" compute the innovation matrix of all tracks for association with mahalanobis distance
+		"""
+		return np.matmul(np.matmul(self.H, self.P), self.H.T) + self.R
+
+	def get_velocity(self):
+		# return the object velocity in the state of all tracks
+
+		return self.x[:, 7:]
@@ -0,0 +1,69 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# closed-form batched Kalman filter for the constant velocity model used in TrackBank
+# state x dimension 10: x, y, z, theta, l, w, h, dx, dy, dz, the transition only adds the velocity to
+# the position and the measurement selects the first 7 dimensions, so the prediction is a few additions
+# of rows and columns. As the initial, process and measurement uncertainties are all diagonal, the
+# covariance only couples each of x, y, z with its own velocity, i.e., it consists of three 2 x 2 blocks
+# and four scalars, so that the update is element-wise without any 10 x 10 multiplication or inverse
+
+import numpy as np
+
+pos, vel = np.arange(3), np.arange(7, 10) 		# index of x, y, z and of dx, dy, dz in the state
+meas = np.arange(7)								# index of the measured dimensions in the state
+
+def cv_predict(x, P, Q):
+	''' predict all tracks, same as x = Fx, P = FPF' + Q
+
+	Input:
+		x: M x 10, states
+		P: M x 10 x 10, covariances
+		Q: 10 x 10, diagonal process uncertainty
+	Output:
+		predicted x and P
+	'''
+
+	x, P = x.copy(), P.copy()
+	x[:, pos] += x[:, vel]
+
+	# F adds the rows of the velocity to the rows of the position, and F' the same for columns
+	P[:, pos, :] += P[:, vel, :]
+	P[:, :, pos] += P[:, :, vel]
+	P += Q
+
+	return x, P
+
+def cv_update(x, P, z, R):
+	''' update all tracks with their measurements, same as the Kalman filter update with H selecting
+	the first 7 dimensions of the state, only valid when the covariance has the block structure above
+
+	Input:
+		x: K x 10, states
+		P: K x 10 x 10, covariances
+		z: K x 7, measurements in the format of [x,y,z,theta,l,w,h]
+		R: 7 x 7, diagonal measurement uncertainty
+	Output:
+		updated x and P
+	'''
+
+	x, P = x.copy(), P.copy()
+	P_mm = P[:, meas, meas] 				# K x 7, variance of the measured dimensions
+	P_pv = P[:, pos, vel]					# K x 3, covariance between position and velocity
+	P_vv = P[:, vel, vel] 					# K x 3, variance of the velocity
+
+	# innovation S = HPH' + R is diagonal, so the kalman gain is a division
+	S = P_mm + np.diag(R)
+	K_m, K_v = P_mm / S, P_pv / S[:, :3]
+
+	# x = x + Ky
+	y = z - x[:, meas]
+	x[:, meas] += K_m * y
+	x[:, vel] += K_v * y[:, :3]
+
+	# P = P - KSK', element-wise for each block
+	P[:, meas, meas] = P_mm - K_m * P_mm
+	P[:, pos, vel] = P[:, vel, pos] = P_pv - K_m[:, :3] * P_pv
+	P[:, vel, vel] = P_vv - K_v * P_pv
+
+	return x, P
@@ -12,6 +12,13 @@ def inverse_rigid_trans(Tr):
     return inv_Tr
 
 
+def expand_rigid_trans(Tr):
+    ''' expand a 3x3 rotation or a 3x4 rigid transform to a 4x4 transform in the homogeneous coord '''
+    Tr_hom = np.eye(4)
+    Tr_hom[:3, :Tr.shape[1]] = Tr
+    return Tr_hom
+
+
 def save_calib_file(transform, save_path):
     with open(save_path, "w") as calib_file:
         for (key, val) in transform.items():
@@ -72,6 +79,7 @@ class Calibration(object):
         # Rotation from reference camera coord to rect camera coord
         self.R0 = calibs['R_rect']
         self.R0 = np.reshape(self.R0,[3,3])
+        self.R0_inv = np.linalg.inv(self.R0)
 
         self.I2V = calibs['Tr_imu_velo']  # 3 x 4
         self.I2V = np.reshape(self.I2V, [3,4])
@@ -120,6 +128,14 @@ class Calibration(object):
         data['P2'] = cam2cam['P_rect_02']
         return data
 
+    def imu_to_rect_transform(self):
+        ''' 4 x 4 transform from IMU to rect camera coord, the same as imu_to_rect in a single matrix '''
+        return np.dot(expand_rigid_trans(self.R0), np.dot(expand_rigid_trans(self.V2C), expand_rigid_trans(self.I2V)))
+
+    def rect_to_imu_transform(self):
+        ''' 4 x 4 transform from rect camera coord to IMU, the same as rect_to_imu in a single matrix '''
+        return np.dot(expand_rigid_trans(self.V2I), np.dot(expand_rigid_trans(self.C2V), expand_rigid_trans(self.R0_inv)))
+
     def cart2hom(self, pts_3d):
         ''' Input: nx3 points in Cartesian
             Oupput: nx4 points in Homogeneous by pending 1
@@ -155,7 +171,7 @@ class Calibration(object):
 
     def project_rect_to_ref(self, pts_3d_rect):
         ''' Input and Output are nx3 points '''
-        return np.transpose(np.dot(np.linalg.inv(self.R0), np.transpose(pts_3d_rect)))
+        return np.transpose(np.dot(self.R0_inv, np.transpose(pts_3d_rect)))
     
     def project_ref_to_rect(self, pts_3d_ref):
         ''' Input and Output are nx3 points '''
@@ -1,4 +1,4 @@
-import numpy as np, json
+import numpy as np, json, os
 from numba import jit
 from xinshuo_miscellaneous.file_io import fileparts
 
@@ -191,3 +191,113 @@ def egomotion_compensation_ID(traj_id, calib, ego_rot_imu, ego_xyz_imu, left, ri
     traj_id_rect = calib.imu_to_rect(traj_id_imu)
 
     return traj_id_rect
+
+
+class EgoPoseTable(object):
+    # precomputed ego motion between every two consecutive frames of a sequence, for each frame it is the
+    # same as get_ego_traj(imu_poses, frame, 1, 1, only_fut=True, inverse=True) which moves objects from the 
+    # coordinate of the last frame to the current frame, as the poses of a sequence are fixed, everything is 
+    # computed once per sequence rather than every frame. The motion is also composed with the rect <-> IMU 
+    # transforms of the calibration into a single 4 x 4 transform in the rect camera coordinate, so that 
+    # the ego-motion compensation of all objects is one matrix apply
+
+    def __init__(self, imu_poses, calib=None, imu_delta=None):
+        self.imu_poses = imu_poses                                  # seq_frames x 4 x 4
+        self.num_frames = imu_poses.shape[0]
+        if imu_delta is None: imu_delta = self.compute_imu_delta(imu_poses)
+        self.imu_delta = imu_delta                                  # seq_frames x 4 x 4, identity for the first frame
+
+        # compose rect -> IMU, ego motion in IMU and IMU -> rect
+        self.rect_delta = None                                      # seq_frames x 4 x 4
+        if calib is not None:
+            self.rect_delta = np.matmul(np.matmul(calib.imu_to_rect_transform(), imu_delta), calib.rect_to_imu_transform())
+
+    @staticmethod
+    def compute_imu_delta(imu_poses):
+        # relative ego motion in the IMU coordinate of the current frame for all frames at once
+
+        num_frames = imu_poses.shape[0]
+        imu_delta = np.tile(np.eye(4), (num_frames, 1, 1))
+        if num_frames < 2: return imu_delta
+
+        # relative translation, the position of the last frame in the coordinate of the current frame
+        T_world2imu = np.linalg.inv(imu_poses[1:])                                          # seq_frames-1 x 4 x 4
+        last_world_hom = np.concatenate((imu_poses[:-1, :3, 3], np.ones((num_frames - 1, 1))), axis=1)
+        imu_delta[1:, :3, 3] = np.matmul(T_world2imu, last_world_hom[:, :, None])[:, :3, 0]
+
+        # relative rotation, the rotation of the last frame compared to the current frame
+        imu_delta[1:, :3, :3] = np.matmul(imu_poses[:-1, :3, :3], np.linalg.inv(imu_poses[1:, :3, :3]))
+
+        return imu_delta
+
+    def compensate(self, xyz, frame):
+        # inverse ego motion compensation of N x 3 points in the rect coordinate from frame-1 to frame
+
+        assert self.rect_delta is not None, 'calibration is required for the compensation in the rect coordinate'
+        assert frame >= 0 and frame <= self.num_frames - 1, 'error'
+        transform = self.rect_delta[frame]
+        return np.matmul(xyz, np.transpose(transform[:3, :3])) + transform[:3, 3].reshape((1, 3))
+
+    def save(self, cache_file):
+        # save the poses and the relative motion in the IMU coordinate, which do not depend on the calibration.
+        # The file is written under a temporary name first, so that other processes never load a partial file
+
+        tmp_file = '%s.tmp%d' % (cache_file, os.getpid())
+        try:
+            with open(tmp_file, 'wb') as f: np.save(f, np.stack((self.imu_poses, self.imu_delta)))
+            os.replace(tmp_file, cache_file)
+        finally:
+            if os.path.exists(tmp_file): os.remove(tmp_file)
+
+
+class EgoPoseStream(EgoPoseTable):
+    # ego motion of the current frame for poses arriving one frame at a time, e.g., live localization output,
+    # only the pose of the last frame is kept so that the memory does not grow with the length of the stream
+
+    def __init__(self, calib=None):
+        self.calib = calib
+        self.imu_poses = None                                       # 1 x 4 x 4, pose of the last frame
+        self.imu_delta = np.eye(4)[None]                            # 1 x 4 x 4, ego motion to the current frame
+        self.num_frames = 0
+        self.rect_delta = self.to_rect(self.imu_delta)
+
+    def to_rect(self, imu_delta):
+        if self.calib is None: return None
+        return np.matmul(np.matmul(self.calib.imu_to_rect_transform(), imu_delta), self.calib.rect_to_imu_transform())
+
+    def push(self, imu_pose):
+        # add the 4 x 4 IMU pose of a new frame in the world coordinate, None if the pose is unknown, in which
+        # case the frame is not compensated and the next frame is compensated from this unknown pose
+        
+        if imu_pose is None or self.imu_poses is None: self.imu_delta = np.eye(4)[None]
+        else: self.imu_delta = self.compute_imu_delta(np.stack((self.imu_poses[0], imu_pose)))[1:]
+        self.imu_poses = None if imu_pose is None else np.asarray(imu_pose)[None]
+        self.rect_delta = self.to_rect(self.imu_delta)
+        self.num_frames += 1
+
+    def compensate(self, xyz, frame=None):
+        # inverse ego motion compensation of N x 3 points in the rect coordinate from the last pushed frame
+        # to the current one, frame is only kept for the same interface as EgoPoseTable
+
+        assert self.rect_delta is not None, 'calibration is required for the compensation in the rect coordinate'
+        transform = self.rect_delta[0]
+        return np.matmul(xyz, np.transpose(transform[:3, :3])) + transform[:3, 3].reshape((1, 3))
+
+
+def load_ego_pose_table(oxts_file, calib=None, use_cache=True):
+    # load the ego poses of a sequence and precompute the relative ego motion, the result is cached
+    # in a .npy file next to the oxts file and reused if the oxts file has not been changed since
+
+    cache_file = os.path.splitext(oxts_file)[0] + '_ego_pose.npy'
+    if use_cache and os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(oxts_file):
+        try:
+            imu_poses, imu_delta = np.load(cache_file)
+            return EgoPoseTable(imu_poses, calib, imu_delta)
+        except Exception: pass      # e.g., a corrupted cache, recompute and overwrite it
+
+    table = EgoPoseTable(load_oxts(oxts_file), calib)
+    if use_cache:
+        try: table.save(cache_file)
+        except OSError: pass        # e.g., read-only dataset folder, just skip the cache
+    
+    return table
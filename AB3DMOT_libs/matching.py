@@ -1,114 +1,396 @@
 import numpy as np
 from numba import jit
 from scipy.optimize import linear_sum_assignment
-from AB3DMOT_libs.dist_metrics import iou, dist3d, dist_ground, m_distance
+from scipy.spatial import cKDTree
+from AB3DMOT_libs.box import Box3D, Box3DArray
+from AB3DMOT_libs.dist_metrics import iou_batch, dist3d_batch, dist_ground_batch, m_distance_batch, get_bev_corners, \
+	iou_pairs, dist3d_pairs, dist_ground_pairs, m_distance_pairs
 
-def compute_affinity(dets, trks, metric, trk_inv_inn_matrices=None):
-	# compute affinity matrix
+def compute_affinity(dets, trks, metric, trk_inn_cholesky=None):
+	# compute affinity matrix for all pairs at once
+	# dets: N x 7, trks: M x 7, in the format of [x,y,z,theta,l,w,h], or Box3DArray
+	# trk_inn_cholesky: M x 7 x 7, lower cholesky factors of the innovation matrices, only needed for m_dis
 
-	aff_matrix = np.zeros((len(dets), len(trks)), dtype=np.float32)
-	for d, det in enumerate(dets):
-		for t, trk in enumerate(trks):
-
-			# choose to use different distance metrics
-			if 'iou' in metric:    	  dist_now = iou(det, trk, metric)            
-			elif metric == 'm_dis':   dist_now = -m_distance(det, trk, trk_inv_inn_matrices[t])
-			elif metric == 'euler':   dist_now = -m_distance(det, trk, None)
-			elif metric == 'dist_2d': dist_now = -dist_ground(det, trk)              	
-			elif metric == 'dist_3d': dist_now = -dist3d(det, trk)              				
-			else: assert False, 'error'
-			aff_matrix[d, t] = dist_now
-
-	return aff_matrix
-
-def greedy_matching(cost_matrix):
-    # association in the greedy manner
+	# choose to use different distance metrics
+	if 'iou' in metric:    	  aff_matrix = iou_batch(dets, trks, metric)
+	elif metric == 'm_dis':   aff_matrix = -m_distance_batch(dets, trks, trk_inn_cholesky)
+	elif metric == 'euler':   aff_matrix = -m_distance_batch(dets, trks, None)
+	elif metric == 'dist_2d': aff_matrix = -dist_ground_batch(dets, trks)
+	elif metric == 'dist_3d': aff_matrix = -dist3d_batch(dets, trks)
+	else: assert False, 'error'
+
+	return aff_matrix.astype(np.float32)
+
+def min_affinity(metric):
+	# lowest affinity of a metric, same as min_sim of the tracker, given to the pairs rejected by the gate
+	if 'giou' in metric: return -1.0
+	elif 'iou' in metric: return 0.0
+	else: return -100.
+
+def gate_radius_bound(dets, trks, metric, threshold):
+	# radius in the bird's eye view of each track out of which no detection can have an affinity above the
+	# threshold, so that gating with these radii keeps all pairs that the dense association can match. None if
+	# there is no such radius, e.g., for m_dis whose gate is the chi-square gate, or an IoU threshold <= 0
+	# dets: N x 7, trks: M x 7, in the format of [x,y,z,theta,l,w,h], return M radii
+
+	if len(dets) == 0 or len(trks) == 0: return None
+	if metric in ['dist_3d', 'dist_2d', 'euler']:
+		# the distance is at least the distance of the centers in the bird's eye view
+		return np.full(len(trks), max(-threshold, 0.))
+	if 'iou' not in metric: return None
+
+	# boxes can only intersect if their circumscribed circles do
+	circum_dets, circum_trks = np.hypot(dets[:, 4], dets[:, 5]) / 2, np.hypot(trks[:, 4], trks[:, 5]) / 2
+	radius = circum_trks + circum_dets.max()
+	if 'giou' not in metric: return radius if threshold > 0 else None
+	if threshold <= -1: return None
+
+	# for GIoU, boxes out of the circles have no intersection, so GIoU = U / C - 1 and C <= U / (1 + threshold),
+	# and U <= (area_a + area_b) * height of C in 3D. The hull C contains the far halves of both boxes, cut by the
+	# lines through their centers perpendicular to the center line, and the trapezoid between these lines with
+	# sides at least the short sides of the boxes, so C >= d * (w_a + w_b) / 2 + (area_a + area_b) / 2 for
+	# centers at distance d, which bounds d. The largest and thinnest detections give the bound of each track
+	area_dets, area_trks = dets[:, 4] * dets[:, 5], trks[:, 4] * trks[:, 5]
+	short_dets, short_trks = np.minimum(dets[:, 4], dets[:, 5]), np.minimum(trks[:, 4], trks[:, 5])
+	with np.errstate(divide='ignore', invalid='ignore'):
+		bound = (area_trks + area_dets.max()) * (1. / (1 + threshold) - 0.5) / ((short_trks + short_dets.min()) / 2)
+	if not np.all(np.isfinite(bound)): return None
+	return np.maximum(radius, bound) * (1 + 1e-3) 			# margin for the rounding of the GIoU
+
+def gate_pairs(dets, trks, radius):
+	# candidate pairs of detections and tracks whose centers are within radius in the bird's eye view, the
+	# pairs are found with a KD-tree so that the cost is near-linear in the number of boxes rather than N x M
+	# dets: N x 7, trks: M x 7, radius: a scalar, or M radii of each track
+	# return K indexes of detections and of tracks, sorted by detection then track
+
+	if np.ndim(radius) == 0:
+		pairs = cKDTree(dets[:, [0, 2]]).sparse_distance_matrix(cKDTree(trks[:, [0, 2]]), radius, output_type='ndarray')
+		det_index, trk_index = pairs['i'], pairs['j']
+	else:
+		neighbors = cKDTree(dets[:, [0, 2]]).query_ball_point(trks[:, [0, 2]], radius)
+		trk_index = np.repeat(np.arange(len(trks)), [len(neighbor) for neighbor in neighbors])
+		det_index = np.fromiter((det for neighbor in neighbors for det in neighbor), dtype=int, count=len(trk_index))
+	order = np.lexsort((trk_index, det_index))
+	return det_index[order].astype(int), trk_index[order].astype(int)
+
+def chi2_gate_pairs(dets, trks, trk_inn_cholesky, chi2_gate):
+	# candidate pairs of detections and tracks whose squared mahalanobis distance is within chi2_gate, the
+	# squared distance is at least the one of the marginal over (x, z), which is at least the squared distance
+	# in the bird's eye view over the largest variance of (x, z), so that the pairs out of the radius
+	# sqrt(chi2_gate * largest variance) of each track are out of the gate and never scored
+	# return K indexes of detections and of tracks sorted by detection then track, and their affinity
+
+	cholesky_bev = trk_inn_cholesky[:, [0, 2], :]
+	var_bev = np.linalg.eigvalsh(np.matmul(cholesky_bev, cholesky_bev.transpose(0, 2, 1)))[:, -1]	# M
+	det_index, trk_index = gate_pairs(dets.array, trks.array, np.sqrt(chi2_gate * var_bev))
+	aff = compute_affinity_pairs(dets, trks, det_index, trk_index, 'm_dis', trk_inn_cholesky)
+	keep = aff.astype(np.float64) ** 2 <= chi2_gate
+
+	return det_index[keep], trk_index[keep], aff[keep]
+
+def compute_affinity_pairs(dets, trks, det_index, trk_index, metric, trk_inn_cholesky=None):
+	# compute affinity of K pairs of detections and tracks only, same as compute_affinity at these pairs
+
+	if 'iou' in metric: corners_dets, corners_trks = get_bev_corners(dets)[det_index], get_bev_corners(trks)[trk_index]
+	dets, trks = Box3D.bboxes2array(dets)[det_index], Box3D.bboxes2array(trks)[trk_index]
+	if 'iou' in metric:    	  aff = iou_pairs(dets, trks, metric, corners_dets, corners_trks)
+	elif metric == 'm_dis':   aff = -m_distance_pairs(dets, trks, trk_inn_cholesky, trk_index)
+	elif metric == 'euler':   aff = -m_distance_pairs(dets, trks, None)
+	elif metric == 'dist_2d': aff = -dist_ground_pairs(dets, trks)
+	elif metric == 'dist_3d': aff = -dist3d_pairs(dets, trks)
+	else: assert False, 'error'
+
+	return aff.astype(np.float32)
+
+@jit(nopython=True, cache=True)
+def greedy_kernel(det_order, trk_order, cost_order, num_dets, num_trks, max_cost):
+	# assign the pairs one by one in the given order of cost, first come first serves, stop once a cost is
+	# over max_cost or min(N, M) pairs are matched, return the matches and whether the greedy is finished
+
+	det_matched = np.zeros(num_dets, dtype=np.bool_)
+	trk_matched = np.zeros(num_trks, dtype=np.bool_)
+	num_max = min(num_dets, num_trks)
+	matched_indices = np.empty((num_max, 2), dtype=np.int64)
+	num_matched = 0
+	for pair in range(det_order.shape[0]):
+		if num_matched == num_max or cost_order[pair] > max_cost: return matched_indices[:num_matched], True
+		det_id, trk_id = det_order[pair], trk_order[pair]
+
+		# if both id has not been matched yet
+		if not det_matched[det_id] and not trk_matched[trk_id]:
+			det_matched[det_id], trk_matched[trk_id] = True, True
+			matched_indices[num_matched, 0], matched_indices[num_matched, 1] = det_id, trk_id
+			num_matched += 1
+
+	return matched_indices[:num_matched], num_matched == num_max
+
+def greedy_matching(cost_matrix, max_cost=np.inf, partial_size=65536):
+    # association in the greedy manner, pairs over max_cost are never matched
     # refer to https://github.com/eddyhkchiu/mahalanobis_3d_multi_object_tracking/blob/master/main.py
+    # costs are sorted stably, i.e., ties in the order of detection then track. On matrices larger than
+    # partial_size, only the smallest costs are partitioned and sorted, which is enough unless the greedy needs
+    # pairs beyond them, then the partition grows until all costs are sorted
 
     num_dets, num_trks = cost_matrix.shape[0], cost_matrix.shape[1]
-
-    # sort all costs and then convert to 2D
     distance_1d = cost_matrix.reshape(-1)
-    index_1d = np.argsort(distance_1d)
-    index_2d = np.stack([index_1d // num_trks, index_1d % num_trks], axis=1)
+    max_cost = distance_1d.dtype.type(max_cost) 		# compared in the precision of the costs
+    num_partial = 4 * max(num_dets, num_trks)
+    while distance_1d.shape[0] > partial_size and num_partial < distance_1d.shape[0]:
+        # all pairs as small as the largest of the partition are kept so that the order is the same as a full sort
+        bound = distance_1d[np.argpartition(distance_1d, num_partial - 1)[num_partial - 1]]
+        index_1d = np.flatnonzero(distance_1d <= bound)
+        index_1d = index_1d[np.argsort(distance_1d[index_1d], kind='stable')]
+        matched_indices, finished = greedy_kernel(index_1d // num_trks, index_1d % num_trks, \
+            distance_1d[index_1d], num_dets, num_trks, max_cost)
+        if finished or bound > max_cost: return matched_indices
+        num_partial *= 4
+
+    # sort all costs and then assign matches one by one given the sorting
+    index_1d = np.argsort(distance_1d, kind='stable')
+    matched_indices, _ = greedy_kernel(index_1d // num_trks, index_1d % num_trks, distance_1d[index_1d], \
+        num_dets, num_trks, max_cost)
+
+    return matched_indices
+
+def greedy_matching_sparse(det_index, trk_index, cost, max_cost=np.inf):
+    # same as greedy_matching but only over the K candidate pairs, det_index, trk_index and cost are K arrays
+    # sorted by detection then track, so that ties are broken in the same order as greedy_matching
+
+    order = np.argsort(cost, kind='stable')
+    max_cost = cost.dtype.type(max_cost)
+    num_dets = det_index.max() + 1 if len(det_index) > 0 else 0
+    num_trks = trk_index.max() + 1 if len(trk_index) > 0 else 0
+    matched_indices, _ = greedy_kernel(det_index[order], trk_index[order], cost[order], num_dets, num_trks, max_cost)
+
+    return matched_indices
+
+def greedy_continue(matched_indices, num_dets, num_trks, rest_cost):
+    # continue the greedy stopped at max_cost over all pairs of the detections and tracks left, so that the matches
+    # are those of the greedy without max_cost in the order of assignment, the pairs over max_cost being rejected
+    # later. rest_cost(det_index, trk_index) gives the costs of the pairs of two index arrays of the same shape
 
-    # assign matches one by one given the sorting, but first come first serves
-    det_matches_to_trk = [-1] * num_dets
-    trk_matches_to_det = [-1] * num_trks
-    matched_indices = []
-    for sort_i in range(index_2d.shape[0]):
-        det_id = int(index_2d[sort_i][0])
-        trk_id = int(index_2d[sort_i][1])
+    rest_dets = np.setdiff1d(np.arange(num_dets), matched_indices[:, 0])
+    rest_trks = np.setdiff1d(np.arange(num_trks), matched_indices[:, 1])
+    if len(rest_dets) == 0 or len(rest_trks) == 0: return matched_indices
+    det_index, trk_index = np.meshgrid(rest_dets, rest_trks, indexing='ij')
+    rest = greedy_matching(rest_cost(det_index, trk_index))
 
-        # if both id has not been matched yet
-        if trk_matches_to_det[trk_id] == -1 and det_matches_to_trk[det_id] == -1:
-            trk_matches_to_det[trk_id] = det_id
-            det_matches_to_trk[det_id] = trk_id
-            matched_indices.append([det_id, trk_id])
+    return np.concatenate((matched_indices, np.stack((rest_dets[rest[:, 0]], rest_trks[rest[:, 1]]), axis=1)), axis=0)
 
-    return np.asarray(matched_indices)
+def complete_index_order(matched_indices, num_dets, num_trks):
+    # assign the detections and tracks left in index order after the matched pairs, as the greedy does over pairs
+    # of equal cost, until there are no detections or tracks left
+
+    rest_dets = np.setdiff1d(np.arange(num_dets), matched_indices[:, 0])
+    rest_trks = np.setdiff1d(np.arange(num_trks), matched_indices[:, 1])
+    num_rest = min(len(rest_dets), len(rest_trks))
+
+    return np.concatenate((matched_indices, np.stack((rest_dets[:num_rest], rest_trks[:num_rest]), axis=1)), axis=0)
+
+@jit(nopython=True, cache=True)
+def components_kernel(det_index, trk_index, num_dets, num_trks):
+	# label of the connected component of every detection and track, the tracks after the detections, of the
+	# bipartite graph of K pairs, by union-find with path halving
+
+	parent = np.arange(num_dets + num_trks)
+	for pair in range(det_index.shape[0]):
+		a, b = det_index[pair], num_dets + trk_index[pair]
+		while parent[a] != a:
+			parent[a] = parent[parent[a]]
+			a = parent[a]
+		while parent[b] != b:
+			parent[b] = parent[parent[b]]
+			b = parent[b]
+		if a != b: parent[max(a, b)] = min(a, b)
+	for node in range(num_dets + num_trks):
+		parent[node] = parent[parent[node]]
+	return parent
+
+def hungarian_components(det_index, trk_index, gain, num_dets, num_trks, labels=None):
+	# maximum gain assignment over the bipartite graph of K pairs of detections and tracks with non-negative
+	# gain, the pairs out of the graph having zero gain. As the total gain is the sum over the matched pairs
+	# of the graph and pairs of different connected components share no detection or track, the optimal
+	# assignment of the whole N x M matrix is the union of the optimal assignments of the components, which
+	# are solved one by one as the cost of the hungarian algorithm is cubic in the size of the matrix
+	# labels: the components of components_kernel if already computed
+	# return the matched pairs of the graph sorted by detection
+
+	if len(det_index) == 0: return np.empty((0, 2), dtype=int)
+	if labels is None: labels = components_kernel(det_index, trk_index, num_dets, num_trks)
+	pair_label = labels[det_index]
+
+	# index of the detections and tracks within their component
+	dets_graph, trks_graph = np.unique(det_index), np.unique(trk_index)
+	num_dets_comp = np.bincount(labels[dets_graph], minlength=len(labels))
+	num_trks_comp = np.bincount(labels[trks_graph + num_dets], minlength=len(labels))
+	det_local, trk_local = np.zeros(num_dets, dtype=int), np.zeros(num_trks, dtype=int)
+	for nodes, offset, local in [(dets_graph, 0, det_local), (trks_graph, num_dets, trk_local)]:
+		node_label = labels[nodes + offset]
+		order = np.lexsort((nodes, node_label))
+		first = np.searchsorted(node_label[order], node_label[order])
+		local[nodes[order]] = np.arange(len(nodes)) - first
+
+	# a component of a single detection or track, e.g., 1 x 1, is matched to its pair of the largest gain
+	star = (num_dets_comp[pair_label] == 1) | (num_trks_comp[pair_label] == 1)
+	order = np.flatnonzero(star)[np.lexsort((-gain[star], pair_label[star]))]
+	best = np.ones(len(order), dtype=bool)
+	best[1:] = pair_label[order[1:]] != pair_label[order[:-1]] 		# first pair of each component
+	matched_indices = [np.stack((det_index[order[best]], trk_index[order[best]]), axis=1)]
+
+	# the other components are solved on their own
+	order = np.flatnonzero(~star)[np.argsort(pair_label[~star], kind='stable')]
+	for pairs in np.split(order, np.flatnonzero(np.diff(pair_label[order])) + 1):
+		if len(pairs) == 0: continue
+		shape = (num_dets_comp[pair_label[pairs[0]]], num_trks_comp[pair_label[pairs[0]]])
+		rows, cols = det_local[det_index[pairs]], trk_local[trk_index[pairs]]
+		gain_matrix, pair_matrix = np.zeros(shape), np.full(shape, -1)
+		gain_matrix[rows, cols], pair_matrix[rows, cols] = gain[pairs], pairs
+		matched = pair_matrix[linear_sum_assignment(gain_matrix, maximize=True)]
+		matched = matched[matched >= 0] 				# pairs out of the graph are dropped
+		matched_indices.append(np.stack((det_index[matched], trk_index[matched]), axis=1))
+
+	matched_indices = np.concatenate(matched_indices, axis=0).astype(int)
+	return matched_indices[np.argsort(matched_indices[:, 0], kind='stable')]
+
+def hungarian_matching(aff_matrix, threshold, joint_size=250000):
+	# hungarian algorithm of the dense affinity, i.e., the same objective as linear_sum_assignment(-aff_matrix),
+	# solved per connected component of the pairs above the lowest affinity m of the matrix. With k = min(N, M)
+	# pairs assigned, the total affinity is k * m plus the gain aff - m >= 0 of the pairs, so the optimum is
+	# a maximum gain matching of the graph of the pairs above m, completed by pairs of affinity m in index order.
+	# Only effective with a floor of the metric, e.g., iou for the boxes that do not overlap, the matrix is
+	# solved as a whole if N x M is at most joint_size, if the graph is a single component, or if m is above the
+	# threshold so that the pairs of the completion would be accepted. The assignment is optimal but can differ
+	# from linear_sum_assignment(-aff_matrix) between equal optima
+	# return the assigned pairs sorted by detection
+
+	num_dets, num_trks = aff_matrix.shape
+	if num_dets * num_trks <= joint_size or aff_matrix.min() >= threshold:
+		row_ind, col_ind = linear_sum_assignment(-aff_matrix)      	# hougarian algorithm
+		return np.stack((row_ind, col_ind), axis=1)
+	floor = aff_matrix.min()
+	det_index, trk_index = np.nonzero(aff_matrix > floor)
+	labels = components_kernel(det_index, trk_index, num_dets, num_trks)
+	if not labels.any():
+		row_ind, col_ind = linear_sum_assignment(-aff_matrix)      	# hougarian algorithm
+		return np.stack((row_ind, col_ind), axis=1)
+
+	gain = aff_matrix[det_index, trk_index].astype(np.float64) - floor
+	matched_indices = hungarian_components(det_index, trk_index, gain, num_dets, num_trks, labels)
+
+	# completion by the detections and tracks left, all their pairs have the lowest affinity
+	matched_indices = complete_index_order(matched_indices, num_dets, num_trks)
+
+	return matched_indices[np.argsort(matched_indices[:, 0], kind='stable')]
+
+def match_maps(matched_indices, aff_matrix, threshold):
+	# filter out the assigned pairs with low affinity, and map each detection to its matched track and each
+	# track to its matched detection, -1 if unmatched. The unmatched detections are the ones never assigned
+	# in index order, then the ones of the filtered pairs in the order of assignment, i.e., the order of birth
+
+	keep = aff_matrix[matched_indices[:, 0], matched_indices[:, 1]] >= threshold
+	matches = matched_indices[keep].astype(int)
+	det2trk = np.full(aff_matrix.shape[0], -1, dtype=int)
+	trk2det = np.full(aff_matrix.shape[1], -1, dtype=int)
+	det2trk[matches[:, 0]], trk2det[matches[:, 1]] = matches[:, 1], matches[:, 0]
+	assigned = np.zeros(aff_matrix.shape[0], dtype=bool)
+	assigned[matched_indices[:, 0]] = True
+	unmatched_dets = np.concatenate((np.flatnonzero(~assigned), matched_indices[~keep, 0])).astype(int)
+
+	return matches, unmatched_dets, det2trk, trk2det
 
 def data_association(dets, trks, metric, threshold, algm='greedy', \
-	trk_innovation_matrix=None, hypothesis=1):   
+	trk_innovation_matrix=None, hypothesis=1, gate_radius=None, chi2_gate=None):   
 	"""
 	Assigns detections to tracked object
 
-	dets:  a list of Box3D object
-	trks:  a list of Box3D object
+	dets:  Box3DArray, a list of Box3D object, or an N x 7 array in the format of [x,y,z,theta,l,w,h]
+	trks:  Box3DArray, a list of Box3D object, or an M x 7 array in the format of [x,y,z,theta,l,w,h]
+	gate_radius: if given, only the pairs within the radius in the bird's eye view are scored and can
+		be matched by the greedy, the others have the lowest affinity of the metric in the returned affinity
+		matrix, except the pairs of the detections and tracks left unmatched by the greedy, which are all scored
+		if there are at most 65536 of them, see gated_association.
+		The hungarian algorithm scores all pairs, as its matches also depend on the pairs below the threshold
+	chi2_gate: for m_dis, if given, only the pairs with the squared mahalanobis distance within the gate are
+		scored and can be matched, instead of the pairs within gate_radius
 
-	Returns 3 lists of matches, unmatched_dets and unmatched_trks, and total cost, and affinity matrix
+	Returns matches, unmatched_dets in the order of birth, unmatched_trks in index order, total cost, affinity
+	matrix, and det2trk and trk2det, the matched track of each detection and matched detection of each track, or -1
 	"""
 
 	# if there is no item in either row/col, skip the association and return all as unmatched
 	aff_matrix = np.zeros((len(dets), len(trks)), dtype=np.float32)
-	if len(trks) == 0: 
-		return np.empty((0, 2), dtype=int), np.arange(len(dets)), [], 0, aff_matrix
-	if len(dets) == 0: 
-		return np.empty((0, 2), dtype=int), [], np.arange(len(trks)), 0, aff_matrix		
+	if len(trks) == 0 or len(dets) == 0:
+		det2trk, trk2det = np.full(len(dets), -1, dtype=int), np.full(len(trks), -1, dtype=int)
+		return np.empty((0, 2), dtype=int), np.arange(len(dets)), np.arange(len(trks)), 0, aff_matrix, det2trk, trk2det
 	
-	# prepare inverse innovation matrix for m_dis
+	# prepare cholesky factors of the innovation matrices of all tracks at once for m_dis
 	if metric == 'm_dis':
 		assert trk_innovation_matrix is not None, 'error'
-		trk_inv_inn_matrices = [np.linalg.inv(m) for m in trk_innovation_matrix]
+		trk_inn_cholesky = np.linalg.cholesky(trk_innovation_matrix)
 	else:
-		trk_inv_inn_matrices = None
+		trk_inn_cholesky, chi2_gate = None, None
 
 	# compute affinity matrix
-	aff_matrix = compute_affinity(dets, trks, metric, trk_inv_inn_matrices)
+	dets, trks = Box3DArray.from_boxes(dets), Box3DArray.from_boxes(trks)
+	if (gate_radius is not None or chi2_gate is not None) and algm == 'greedy' and hypothesis == 1:
+		return gated_association(dets, trks, metric, threshold, trk_inn_cholesky, gate_radius, chi2_gate)
+	aff_matrix = compute_affinity(dets, trks, metric, trk_inn_cholesky)
 
 	# association based on the affinity matrix
 	if hypothesis == 1:
 		if algm == 'hungar':
-			row_ind, col_ind = linear_sum_assignment(-aff_matrix)      	# hougarian algorithm
-			matched_indices = np.stack((row_ind, col_ind), axis=1)
+			matched_indices = hungarian_matching(aff_matrix, threshold) 	# hougarian algorithm
 		elif algm == 'greedy':
-			matched_indices = greedy_matching(-aff_matrix) 				# greedy matching
+			matched_indices = greedy_matching(-aff_matrix, -threshold) 	# greedy matching
+			matched_indices = greedy_continue(matched_indices, len(dets), len(trks), lambda d, t: -aff_matrix[d, t])
 		else: assert False, 'error'
 	else:
 		cost_list, hun_list = best_k_matching(-aff_matrix, hypothesis)
 
 	# compute total cost
-	cost = 0
-	for row_index in range(matched_indices.shape[0]):
-		cost -= aff_matrix[matched_indices[row_index, 0], matched_indices[row_index, 1]]
-
-	# save for unmatched objects
-	unmatched_dets = []
-	for d, det in enumerate(dets):
-		if (d not in matched_indices[:, 0]): unmatched_dets.append(d)
-	unmatched_trks = []
-	for t, trk in enumerate(trks):
-		if (t not in matched_indices[:, 1]): unmatched_trks.append(t)
-
-	# filter out matches with low affinity
-	matches = []
-	for m in matched_indices:
-		if (aff_matrix[m[0], m[1]] < threshold):
-			unmatched_dets.append(m[0])
-			unmatched_trks.append(m[1])
-		else: matches.append(m.reshape(1, 2))
-	if len(matches) == 0: 
-		matches = np.empty((0, 2),dtype=int)
-	else: matches = np.concatenate(matches, axis=0)
-
-	return matches, np.array(unmatched_dets), np.array(unmatched_trks), cost, aff_matrix
\ No newline at end of file
+	cost = -np.sum(aff_matrix[matched_indices[:, 0], matched_indices[:, 1]])
+
+	# filter out matches with low affinity, the others are unmatched
+	matches, unmatched_dets, det2trk, trk2det = match_maps(matched_indices, aff_matrix, threshold)
+
+	return matches, unmatched_dets, np.flatnonzero(trk2det < 0), cost, aff_matrix, det2trk, trk2det
+
+def gated_association(dets, trks, metric, threshold, trk_inn_cholesky, gate_radius, chi2_gate=None, \
+	max_rest=65536):
+	# greedy association of data_association with the gate, only the candidate pairs within the gate radius,
+	# or within the chi-square gate for m_dis, are scored and can be matched. The pairs above the threshold
+	# are all within the gate, so the accepted matches are the same as the dense association. The pairs below
+	# the threshold only decide the order of birth of the detections left, for which the pairs of the detections
+	# and tracks left by the accepted matches are also scored, at most max_rest of them
+	
+	num_dets, num_trks = len(dets), len(trks)
+	if chi2_gate is not None:
+		det_index, trk_index, aff = chi2_gate_pairs(dets, trks, trk_inn_cholesky, chi2_gate)
+	else:
+		det_index, trk_index = gate_pairs(dets.array, trks.array, gate_radius)
+		aff = compute_affinity_pairs(dets, trks, det_index, trk_index, metric, trk_inn_cholesky)
+	aff_matrix = np.full((num_dets, num_trks), min_affinity(metric), dtype=np.float32)
+	aff_matrix[det_index, trk_index] = aff
+
+	# the pairs of the detections and tracks left are all scored for the greedy to continue over them
+	def rest_cost(d, t):
+		aff_matrix[d, t] = compute_affinity_pairs(dets, trks, d.ravel(), t.ravel(), metric, trk_inn_cholesky).reshape(d.shape)
+		return -aff_matrix[d, t]
+	matched_indices = greedy_matching_sparse(det_index, trk_index, -aff, -threshold) 	# greedy matching
+	num_rest = (num_dets - len(matched_indices)) * (num_trks - len(matched_indices))
+	if num_rest <= max_rest:
+		matched_indices = greedy_continue(matched_indices, num_dets, num_trks, rest_cost)
+	else:
+		# too many pairs left, e.g., crowded scenes with many births and deaths, the greedy continues over the
+		# candidate pairs only, then the detections and tracks left are assigned in index order as pairs of the
+		# lowest affinity. The matches are the same, the order of birth of the detections left can differ
+		matched_indices = greedy_matching_sparse(det_index, trk_index, -aff)
+		matched_indices = complete_index_order(matched_indices, num_dets, num_trks)
+
+	# compute total cost
+	cost = -np.sum(aff_matrix[matched_indices[:, 0], matched_indices[:, 1]])
+
+	# filter out matches with low affinity, the others are unmatched
+	matches, unmatched_dets, det2trk, trk2det = match_maps(matched_indices, aff_matrix, threshold)
+
+	return matches, unmatched_dets, np.flatnonzero(trk2det < 0), cost, aff_matrix, det2trk, trk2det
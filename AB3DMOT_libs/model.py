@@ -1,13 +1,13 @@
 # Author: Xinshuo Weng
 # email: xinshuo.weng@gmail.com
-from typing import List
-
 import numpy as np, os, copy, math
-from AB3DMOT_libs.box import Box3D
-from AB3DMOT_libs.matching import data_association
-from AB3DMOT_libs.kalman_filter import KF
+from scipy.stats import chi2
+from AB3DMOT_libs.box import Box3DArray
+from AB3DMOT_libs.matching import data_association, gate_radius_bound
+from AB3DMOT_libs.kalman_filter import TrackBank
+from AB3DMOT_libs.kitti_oxts import EgoPoseTable
 from AB3DMOT_libs.vis import vis_obj
-from xinshuo_miscellaneous.logger import print_log
+from AB3DMOT_libs.tracker_log import TrackerLog, DEBUG
 from xinshuo_miscellaneous.file_io import mkdir_if_missing
 
 np.set_printoptions(suppress=True, precision=3)
@@ -22,10 +22,10 @@ class AB3DMOT(object):
 		self.vis_dir = vis_dir
 		self.vis = cfg.vis
 		self.hw = hw
-		self.log = log
+		self.log = log if isinstance(log, TrackerLog) else TrackerLog(log, cfg.get('log_level', 'info'))
 
 		# counter
-		self.trackers: List[KF] = []
+		self.trackers = TrackBank(backend=cfg.get('kf_backend', 'cv'))		# Kalman filter of all tracks
 		self.frame_count = 0
 		self.ID_count = [ID_init]
 		self.id_now_output = []
@@ -34,7 +34,8 @@ class AB3DMOT(object):
 		self.cat = cat
 		self.ego_com = cfg.ego_com 			# ego motion compensation
 		self.calib = calib
-		self.oxts = oxts
+		self.oxts = oxts 					# ego poses, seq_frames x 4 x 4 or EgoPoseTable
+		if oxts is not None and not isinstance(oxts, EgoPoseTable): self.oxts = EgoPoseTable(oxts, calib)
 		self.affi_process = cfg.affi_pro	# post-processing affinity
 		self.get_param(cfg, cat)
 		self.print_param()
@@ -99,31 +100,39 @@ class AB3DMOT(object):
 		self.algm, self.metric, self.thres, self.max_age, self.min_hits = \
 			algm, metric, thres, max_age, min_hits
 
+		# gate in the bird's eye view if gating, the radius of each track is derived every frame from the threshold
+		# of the metric and the sizes of the boxes, so that the pairs above the threshold are always kept. Only for
+		# the greedy, the matches of the hungarian algorithm also depend on the pairs below the threshold
+		self.gating = cfg.get('gating', False) and self.algm == 'greedy'
+
+		# chi-square gate of the squared mahalanobis distance for m_dis if gating, the 99% quantile with 7 degrees
+		# of freedom of the measurement, large enough to keep the pairs above the threshold
+		self.chi2_gate = None
+		if self.gating and self.metric == 'm_dis':
+			self.chi2_gate = max(chi2.ppf(0.99, 7), self.thres ** 2)
+
 		# define max/min values for the output affinity matrix
 		if self.metric in ['dist_3d', 'dist_2d', 'm_dis']: self.max_sim, self.min_sim = 0.0, -100.
 		elif self.metric in ['iou_2d', 'iou_3d']:   	   self.max_sim, self.min_sim = 1.0, 0.0
 		elif self.metric in ['giou_2d', 'giou_3d']: 	   self.max_sim, self.min_sim = 1.0, -1.0
 
 	def print_param(self):
-		print_log('\n\n***************** Parameters for %s *********************' % self.cat, log=self.log, display=False)
-		print_log('matching algorithm is %s' % self.algm, log=self.log, display=False)
-		print_log('distance metric is %s' % self.metric, log=self.log, display=False)
-		print_log('distance threshold is %f' % self.thres, log=self.log, display=False)
-		print_log('min hits is %f' % self.min_hits, log=self.log, display=False)
-		print_log('max age is %f' % self.max_age, log=self.log, display=False)
-		print_log('ego motion compensation is %d' % self.ego_com, log=self.log, display=False)
+		self.log.info('\n\n***************** Parameters for %s *********************', self.cat)
+		self.log.info('matching algorithm is %s', self.algm)
+		self.log.info('distance metric is %s', self.metric)
+		self.log.info('distance threshold is %f', self.thres)
+		self.log.info('min hits is %f', self.min_hits)
+		self.log.info('max age is %f', self.max_age)
+		self.log.info('ego motion compensation is %d', self.ego_com)
+		self.log.info('gating is %d', self.gating)
+		if self.chi2_gate is not None: self.log.info('chi-square gate is %f', self.chi2_gate)
 
 	def process_dets(self, dets):
-		# convert each detection into the class Box3D 
+		# convert the detections into Box3DArray in the format of [x,y,z,theta,l,w,h]
 		# inputs: 
 		# 	dets - a numpy array of detections in the format [[h,w,l,x,y,z,theta],...]
 
-		dets_new = []
-		for det in dets:
-			det_tmp = Box3D.array2bbox_raw(det)
-			dets_new.append(det_tmp)
-
-		return dets_new
+		return Box3DArray.from_raw(dets)
 
 	def within_range(self, theta):
 		# make sure the orientation is within a proper range
@@ -152,23 +161,43 @@ class AB3DMOT(object):
 
 		return theta_pre, theta_obs
 
+	def within_range_batch(self, theta):
+		# same as within_range but for an array of orientations
+
+		theta = np.where(theta >= np.pi, theta - np.pi * 2, theta)
+		theta = np.where(theta < -np.pi, theta + np.pi * 2, theta)
+
+		return theta
+
+	def orientation_correction_batch(self, theta_pre, theta_obs):
+		# same as orientation_correction but for arrays of orientations
+		
+		theta_pre = self.within_range_batch(theta_pre)
+		theta_obs = self.within_range_batch(theta_obs)
+
+		# if the angle of two theta is not acute angle, then make it acute
+		diff = np.abs(theta_obs - theta_pre)
+		flip = (diff > np.pi / 2.0) & (diff < np.pi * 3 / 2.0)
+		theta_pre = np.where(flip, self.within_range_batch(theta_pre + np.pi), theta_pre)
+
+		# now the angle is acute: < 90 or > 270, convert the case of > 270 to < 90
+		wrap = np.abs(theta_obs - theta_pre) >= np.pi * 3 / 2.0
+		theta_pre = np.where(wrap & (theta_obs > 0), theta_pre + np.pi * 2, theta_pre)
+		theta_pre = np.where(wrap & (theta_obs <= 0), theta_pre - np.pi * 2, theta_pre)
+
+		return theta_pre, theta_obs
+
 	def ego_motion_compensation(self, frame, trks):
 		# inverse ego motion compensation, move trks from the last frame of coordinate to the current frame for matching
 		
-		from AB3DMOT_libs.kitti_oxts import get_ego_traj, egomotion_compensation_ID
 		assert len(self.trackers) == len(trks), 'error'
-		ego_xyz_imu, ego_rot_imu, left, right = get_ego_traj(self.oxts, frame, 1, 1, only_fut=True, inverse=True) 
-		for index in range(len(self.trackers)):
-			trk_tmp = trks[index]
-			xyz = np.array([trk_tmp.x, trk_tmp.y, trk_tmp.z]).reshape((1, -1))
-			compensated = egomotion_compensation_ID(xyz, self.calib, ego_rot_imu, ego_xyz_imu, left, right)
-			trk_tmp.x, trk_tmp.y, trk_tmp.z = compensated[0]
-
-			# update compensated state in the Kalman filter
-			try:
-				self.trackers[index].kf.x[:3] = copy.copy(compensated).reshape((-1))
-			except:
-				self.trackers[index].kf.x[:3] = copy.copy(compensated).reshape((-1, 1))
+		if len(trks) == 0: return trks
+
+		# compensate the centers of all tracks at once with the precomputed transform of the frame
+		# and update compensated state in the Kalman filter
+		compensated = self.oxts.compensate(self.trackers.x[:, :3], frame)
+		self.trackers.x[:, :3] = compensated
+		trks.data[:, :3] = compensated
 
 		return trks
 
@@ -185,19 +214,20 @@ class AB3DMOT(object):
 		max_color = 20
 		colors = random_colors(max_color)       # Generate random colors
 
-		# visualize all detections as yellow boxes
-		for det_tmp in dets: 
-			img = vis_obj(det_tmp, img, calib, hw, (255, 255, 0))				# yellow for detection
+		# visualize all detections as yellow boxes, the corners of the frame are computed once
+		corners_dets, corners_trks = dets.corners(), trks.corners()
+		for count, det_tmp in enumerate(dets): 
+			img = vis_obj(det_tmp, img, calib, hw, (255, 255, 0), corners=corners_dets[count])	# yellow for detection
 		
 		# visualize color-specific tracks
 		count = 0
-		ID_list = [tmp.id for tmp in self.trackers]
+		ID_list = self.trackers.id.tolist()
 		for trk_tmp in trks: 
 			ID_tmp = ID_list[count]
 			color_float = colors[int(ID_tmp) % max_color]
 			color_int = tuple([int(tmp * 255) for tmp in color_float])
 			str_vis = '%d, %f' % (ID_tmp, trk_tmp.o)
-			img = vis_obj(trk_tmp, img, calib, hw, color_int, str_vis)		# blue for tracklets
+			img = vis_obj(trk_tmp, img, calib, hw, color_int, str_vis, corners=corners_trks[count])		# blue for tracklets
 			count += 1
 		
 		img = Image.fromarray(img)
@@ -207,84 +237,69 @@ class AB3DMOT(object):
 	def prediction(self):
 		# get predicted locations from existing tracks
 
-		trks = []
-		for t in range(len(self.trackers)):
-			
-			# propagate locations
-			kf_tmp = self.trackers[t]
-			if kf_tmp.id == self.debug_id:
-				print('\n before prediction')
-				print(kf_tmp.kf.x.reshape((-1)))
-				print('\n current velocity')
-				print(kf_tmp.get_velocity())
-			kf_tmp.kf.predict()
-			if kf_tmp.id == self.debug_id:
-				print('After prediction')
-				print(kf_tmp.kf.x.reshape((-1)))
-			kf_tmp.kf.x[3] = self.within_range(kf_tmp.kf.x[3])
-
-			# update statistics
-			kf_tmp.time_since_update += 1 		
-			trk_tmp = kf_tmp.kf.x.reshape((-1))[:7]
-			trks.append(Box3D.array2bbox(trk_tmp))
+		bank = self.trackers
+		debug_index = np.nonzero(bank.id == self.debug_id)[0] if self.debug_id is not None else []
+		for index in debug_index:
+			print('\n before prediction')
+			print(bank.x[index])
+			print('\n current velocity')
+			print(bank.get_velocity()[index])
+
+		# propagate locations of all tracks
+		bank.predict()
+		for index in debug_index:
+			print('After prediction')
+			print(bank.x[index])
+		bank.x[:, 3] = self.within_range_batch(bank.x[:, 3])
+
+		# update statistics
+		bank.time_since_update[:] += 1
+		trks = Box3DArray(bank.x[:, :7].copy())
 
 		return trks
 
-	def update(self, matched, unmatched_trks, dets, info):
-		# update matched trackers with assigned detections
+	def update(self, det2trk, dets, info):
+		# update matched trackers with assigned detections, det2trk is the matched track of each detection or -1
 		
-		dets = copy.copy(dets)
-		for t, trk in enumerate(self.trackers):
-			if t not in unmatched_trks:
-				d = matched[np.where(matched[:, 1] == t)[0], 0]     # a list of index
-				assert len(d) == 1, 'error'
-
-				# update statistics
-				trk.time_since_update = 0		# reset because just updated
-				trk.hits += 1
-
-				# update orientation in propagated tracks and detected boxes so that they are within 90 degree
-				bbox3d = Box3D.bbox2array(dets[d[0]])
-				trk.kf.x[3], bbox3d[3] = self.orientation_correction(trk.kf.x[3], bbox3d[3])
-
-				if trk.id == self.debug_id:
-					print('After ego-compoensation')
-					print(trk.kf.x.reshape((-1)))
-					print('matched measurement')
-					print(bbox3d.reshape((-1)))
-					# print('uncertainty')
-					# print(trk.kf.P)
-					# print('measurement noise')
-					# print(trk.kf.R)
-
-				# kalman filter update with observation
-				trk.kf.update(bbox3d)
-
-				if trk.id == self.debug_id:
-					print('after matching')
-					print(trk.kf.x.reshape((-1)))
-					print('\n current velocity')
-					print(trk.get_velocity())
-
-				trk.kf.x[3] = self.within_range(trk.kf.x[3])
-				trk.info = info[d, :][0]
-
-			# debug use only
-			# else:
-				# print('track ID %d is not matched' % trk.id)
+		det_index = np.flatnonzero(det2trk >= 0)
+		if len(det_index) == 0: return
+		bank = self.trackers
+		trk_index = det2trk[det_index]
 
-	def birth(self, dets, info, unmatched_dets):
-		# create and initialise new trackers for unmatched detections
+		# update statistics
+		bank.time_since_update[trk_index] = 0		# reset because just updated
+		bank.hits[trk_index] += 1
+
+		# update orientation in propagated tracks and detected boxes so that they are within 90 degree
+		bbox3d = dets.array[det_index]
+		bank.x[trk_index, 3], bbox3d[:, 3] = self.orientation_correction_batch(bank.x[trk_index, 3], bbox3d[:, 3])
+
+		debug_index = np.nonzero(bank.id[trk_index] == self.debug_id)[0] if self.debug_id is not None else []
+		for index in debug_index:
+			print('After ego-compoensation')
+			print(bank.x[trk_index[index]])
+			print('matched measurement')
+			print(bbox3d[index])
 
-		# dets = copy.copy(dets)
-		new_id_list = list()					# new ID generated for unmatched detections
-		for i in unmatched_dets:        			# a scalar of index
-			trk = KF(Box3D.bbox2array(dets[i]), info[i, :], self.ID_count[0])
-			self.trackers.append(trk)
-			new_id_list.append(trk.id)
-			# print('track ID %s has been initialized due to new detection' % trk.id)
+		# kalman filter update with observation
+		bank.update(trk_index, bbox3d)
+
+		for index in debug_index:
+			print('after matching')
+			print(bank.x[trk_index[index]])
+			print('\n current velocity')
+			print(bank.get_velocity()[trk_index[index]])
+
+		bank.x[trk_index, 3] = self.within_range_batch(bank.x[trk_index, 3])
+		bank.info[trk_index] = info[det_index]
+
+	def birth(self, dets, info, unmatched_dets):
+		# create and initialise new trackers for unmatched detections, in the order of unmatched_dets
 
-			self.ID_count[0] += 1
+		new_id_list = list(range(self.ID_count[0], self.ID_count[0] + len(unmatched_dets)))	# new ID generated for unmatched detections
+		bbox3d = dets.array[unmatched_dets]
+		self.trackers.birth(bbox3d, info[unmatched_dets], new_id_list)
+		self.ID_count[0] += len(unmatched_dets)
 
 		return new_id_list
 
@@ -292,24 +307,21 @@ class AB3DMOT(object):
 		# output exiting tracks that have been stably associated, i.e., >= min_hits
 		# and also delete tracks that have appeared for a long time, i.e., >= max_age
 
-		num_trks = len(self.trackers)
-		results = []
-		for trk in reversed(self.trackers):
-			# change format from [x,y,z,theta,l,w,h] to [h,w,l,x,y,z,theta]
-			d = Box3D.array2bbox(trk.kf.x[:7].reshape((7, )))     # bbox location self
-			d = Box3D.bbox2array_raw(d)
+		bank = self.trackers
+		if len(bank) == 0: return np.empty((0, 15))
 
-			if ((trk.time_since_update < self.max_age) and (trk.hits >= self.min_hits or self.frame_count <= self.min_hits)):      
-				results.append(np.concatenate((d, [trk.id], trk.info)).reshape(1, -1)) 		
-			num_trks -= 1
+		# change format from [x,y,z,theta,l,w,h] to [h,w,l,x,y,z,theta], output in the reversed order of tracks
+		valid = (bank.time_since_update < self.max_age) & ((bank.hits >= self.min_hits) | (self.frame_count <= self.min_hits))
+		valid_index = np.nonzero(valid)[0][::-1]
+		results = np.concatenate((bank.x[valid_index][:, [6, 5, 4, 0, 1, 2, 3]], bank.id[valid_index, None], \
+			bank.info[valid_index]), axis=1)
 
-			# deadth, remove dead tracklet
-			if (trk.time_since_update >= self.max_age): 
-				self.trackers.pop(num_trks)
+		# deadth, remove dead tracklet
+		bank.remove(bank.time_since_update >= self.max_age)
 
 		return results
 
-	def process_affi(self, affi, matched, unmatched_dets, new_id_list):
+	def process_affi(self, affi, det2trk, unmatched_dets, new_id_list):
 
 		# post-processing affinity matrix, convert from affinity between raw detection and past total tracklets
 		# to affinity between past "active" tracklets and current active output tracklets, so that we can know 
@@ -319,67 +331,44 @@ class AB3DMOT(object):
 		###### determine the ID for each past track
 		trk_id = self.id_past 			# ID in the trks for matching
 
-		###### determine the ID for each current detection
-		det_id = [-1 for _ in range(affi.shape[0])]		# initialization
-
-		# assign ID to each detection if it is matched to a track
-		for match_tmp in matched:		
-			det_id[match_tmp[0]] = trk_id[match_tmp[1]]
-
-		# assign the new birth ID to each unmatched detection
-		count = 0
+		###### determine the ID for each current detection, the ID of the matched track, otherwise the new
+		# birth ID as new_id_list is in the same order as unmatched_dets
+		matched = det2trk >= 0
 		assert len(unmatched_dets) == len(new_id_list), 'error'
-		for unmatch_tmp in unmatched_dets:
-			det_id[unmatch_tmp] = new_id_list[count] 	# new_id_list is in the same order as unmatched_dets
-			count += 1
-		assert not (-1 in det_id), 'error, still have invalid ID in the detection list'
+		det_id = np.empty(affi.shape[0], dtype=int)
+		det_id[matched] = np.asarray(trk_id, dtype=int)[det2trk[matched]]
+		det_id[unmatched_dets] = new_id_list
 
 		############################ update the affinity matrix based on the ID matching
-		
-		# transpose so that now row is past trks, col is current dets	
-		affi = affi.transpose() 			
-
-		###### compute the permutation for rows (past tracklets), possible to delete but not add new rows
-		permute_row = list()
-		for output_id_tmp in self.id_past_output:
-			index = trk_id.index(output_id_tmp)
-			permute_row.append(index)
-		affi = affi[permute_row, :]	
-		assert affi.shape[0] == len(self.id_past_output), 'error'
-
-		###### compute the permutation for columns (current tracklets), possible to delete and add new rows
-		# addition can be because some tracklets propagated from previous frames with no detection matched
-		# so they are not contained in the original detection columns of affinity matrix, deletion can happen
-		# because some detections are not matched
-
-		max_index = affi.shape[1]
-		permute_col = list()
-		to_fill_col, to_fill_id = list(), list() 		# append new columns at the end, also remember the ID for the added ones
-		for output_id_tmp in self.id_now_output:
-			try:
-				index = det_id.index(output_id_tmp)
-			except:		# some output ID does not exist in the detections but rather predicted by KF
-				index = max_index
-				max_index += 1
-				to_fill_col.append(index); to_fill_id.append(output_id_tmp)
-			permute_col.append(index)
 
-		# expand the affinity matrix with newly added columns
-		append = np.zeros((affi.shape[0], max_index - affi.shape[1]))
-		append.fill(self.min_sim)
-		affi = np.concatenate([affi, append], axis=1)
+		# index of each ID in the rows of past tracks, the columns of current detections and the past outputs
+		trk_index = dict(zip(trk_id, range(len(trk_id))))
+		det_index = dict(zip(det_id.tolist(), range(len(det_id))))
+		past_output_index = dict(zip(self.id_past_output, range(len(self.id_past_output))))
+
+		###### rows are the past output tracklets, possible to delete but not add new rows
+		permute_row = [trk_index[output_id_tmp] for output_id_tmp in self.id_past_output]
+
+		###### columns are the current output tracklets, possible to delete and add new columns, addition can be
+		# because some tracklets propagated from previous frames with no detection matched so they are not 
+		# contained in the original detection columns of affinity matrix, deletion can happen because some 
+		# detections are not matched. The added columns take the last column, filled with min_sim
+		permute_col, fill_row, fill_col = list(), list(), list()
+		for col, output_id_tmp in enumerate(self.id_now_output):
+			index = det_index.get(output_id_tmp, -1)
+			if index < 0: fill_row.append(past_output_index[output_id_tmp]); fill_col.append(col)
+			permute_col.append(index)
 
-		# find out the correct permutation for the newly added columns of ID
-		for count in range(len(to_fill_col)):
-			fill_col = to_fill_col[count]
-			fill_id = to_fill_id[count]
-			row_index = self.id_past_output.index(fill_id)
+		# transpose so that now row is past trks, col is current dets, with an additional column of min_sim
+		affi_expand = np.empty((affi.shape[1], affi.shape[0] + 1))
+		affi_expand[:, :-1] = affi.transpose()
+		affi_expand[:, -1] = self.min_sim
+		affi_output = affi_expand[permute_row][:, permute_col]
 
-			# construct one hot vector because it is proapgated from previous tracks, so 100% matching
-			affi[row_index, fill_col] = self.max_sim		
-		affi = affi[:, permute_col]
+		# construct one hot vector for the added columns because it is proapgated from previous tracks, so 100% matching
+		affi_output[fill_row, fill_col] = self.max_sim
 
-		return affi
+		return affi_output
 
 	def track(self, dets_all, frame, seq_name):
 		"""
@@ -394,16 +383,16 @@ class AB3DMOT(object):
 		NOTE: The number of objects returned may differ from the number of detections provided.
 		"""
 		dets, info = dets_all['dets'], dets_all['info']         # dets: N x 7, float numpy array
+		dets = np.asarray(dets, dtype=np.float64) 				# can be float32 views of the binary detection store
 		if self.debug_id: print('\nframe is %s' % frame)
 	
-		# logging
-		print_str = '\n\n*****************************************\n\nprocessing seq_name/frame %s/%d' % (seq_name, frame)
-		print_log(print_str, log=self.log, display=False)
+		# logging, only formatted when the log is flushed
+		self.log.debug('\n\n*****************************************\n\nprocessing seq_name/frame %s/%d', seq_name, frame)
 		self.frame_count += 1
 
 		# recall the last frames of outputs for computing ID correspondences during affinity processing
 		self.id_past_output = copy.copy(self.id_now_output)
-		self.id_past = [trk.id for trk in self.trackers]
+		self.id_past = self.trackers.id.tolist()
 
 		# process detection format
 		dets = self.process_dets(dets)
@@ -424,41 +413,43 @@ class AB3DMOT(object):
 		# matching
 		trk_innovation_matrix = None
 		if self.metric == 'm_dis':
-			trk_innovation_matrix = [trk.compute_innovation_matrix() for trk in self.trackers] 
-		matched, unmatched_dets, unmatched_trks, cost, affi = \
-			data_association(dets, trks, self.metric, self.thres, self.algm, trk_innovation_matrix)
-		# print_log('detections are', log=self.log, display=False)
-		# print_log(dets, log=self.log, display=False)
-		# print_log('tracklets are', log=self.log, display=False)
-		# print_log(trks, log=self.log, display=False)
-		# print_log('matched indexes are', log=self.log, display=False)
-		# print_log(matched, log=self.log, display=False)
-		# print_log('raw affinity matrix is', log=self.log, display=False)
-		# print_log(affi, log=self.log, display=False)
+			trk_innovation_matrix = self.trackers.compute_innovation_matrix()
+		gate_radius = None
+		if self.gating: gate_radius = gate_radius_bound(dets.array, trks.array, self.metric, self.thres)
+		matched, unmatched_dets, unmatched_trks, cost, affi, det2trk, trk2det = \
+			data_association(dets, trks, self.metric, self.thres, self.algm, trk_innovation_matrix, \
+				gate_radius=gate_radius, chi2_gate=self.chi2_gate)
+		# self.log.debug('detections are')
+		# self.log.debug(dets)
+		# self.log.debug('tracklets are')
+		# self.log.debug(trks)
+		# self.log.debug('matched indexes are')
+		# self.log.debug(matched)
+		# self.log.debug('raw affinity matrix is')
+		# self.log.debug(affi)
 
 		# update trks with matched detection measurement
-		self.update(matched, unmatched_trks, dets, info)
+		self.update(det2trk, dets, info)
 
 		# create and initialise new trackers for unmatched detections
 		new_id_list = self.birth(dets, info, unmatched_dets)
 
 		# output existing valid tracks
-		results = self.output()
-		if len(results) > 0: results = [np.concatenate(results)]		# h,w,l,x,y,z,theta, ID, other info, confidence
-		else:            	 results = [np.empty((0, 15))]
+		results = [self.output()]		# h,w,l,x,y,z,theta, ID, other info, confidence
 		self.id_now_output = results[0][:, 7].tolist()					# only the active tracks that are outputed
 
 		# post-processing affinity to convert to the affinity between resulting tracklets
 		if self.affi_process:
-			affi = self.process_affi(affi, matched, unmatched_dets, new_id_list)
-			# print_log('processed affinity matrix is', log=self.log, display=False)
-			# print_log(affi, log=self.log, display=False)
+			affi = self.process_affi(affi, det2trk, unmatched_dets, new_id_list)
+			# self.log.debug('processed affinity matrix is')
+			# self.log.debug(affi)
 
 		# logging
-		print_log('\ntop-1 cost selected', log=self.log, display=False)
-		print_log(cost, log=self.log, display=False)
-		for result_index in range(len(results)):
-			print_log(results[result_index][:, :8], log=self.log, display=False)
-			print_log('', log=self.log, display=False)
+		if self.log.enabled(DEBUG):
+			self.log.debug('\ntop-1 cost selected')
+			self.log.debug(cost)
+			for result_index in range(len(results)):
+				self.log.debug(results[result_index][:, :8])
+				self.log.debug('')
 
 		return results, affi
@@ -1,6 +1,7 @@
 import numpy as np
 from .bbox_coarse_hash import BBoxCoarseFilter
-from AB3DMOT_libs.dist_metrics import iou
+from AB3DMOT_libs.box import Box3D, Box3DArray
+from AB3DMOT_libs.dist_metrics import iou_batch
 
 def weird_bbox(bbox):
     if bbox.l <= 0 or bbox.w <= 0 or bbox.h <= 0:
@@ -11,8 +12,10 @@ def weird_bbox(bbox):
 def nms(dets, inst_types, threshold_low=0.1, threshold_high=1.0, threshold_yaw=0.3):
     """ keep the bboxes with overlap <= threshold
     """
+    boxes = Box3DArray.from_boxes(dets)         # corners of each box computed once for the grid and the ious
+    corners = boxes.corners()                   # N x 8 x 3
     dets_coarse_filter = BBoxCoarseFilter(grid_size=100, scaler=100)
-    dets_coarse_filter.bboxes2dict(dets)
+    dets_coarse_filter.bboxes2dict(dets, corners)
 
     scores = np.asarray([det.s for det in dets])
     yaws = np.asarray([det.ry for det in dets])
@@ -28,7 +31,7 @@ def nms(dets, inst_types, threshold_low=0.1, threshold_high=1.0, threshold_yaw=0
             continue
 
         # locate the related bboxes that have the same object type
-        filter_indexes = dets_coarse_filter.related_bboxes(dets[index])
+        filter_indexes = dets_coarse_filter.related_bboxes(dets[index], corners[index])
         in_mask = np.isin(order, filter_indexes)
         related_idxes = order[in_mask]
         related_idxes = np.asarray([i for i in related_idxes if inst_types[i] == inst_types[index]])
@@ -36,9 +39,8 @@ def nms(dets, inst_types, threshold_low=0.1, threshold_high=1.0, threshold_yaw=0
         # compute the ious
         bbox_num = len(related_idxes)
         ious = np.zeros(bbox_num)
-        for i, idx in enumerate(related_idxes):
-            # ious[i] = utils.iou3d(dets[index], dets[idx])[1]
-            ious[i] = iou(dets[index], dets[idx], metric='iou_3d')
+        if bbox_num > 0:
+            ious = iou_batch(boxes[[index]], boxes[related_idxes], metric='iou_3d')[0]
         related_inds = np.where(ious > threshold_low)
         related_inds_vote = np.where(ious > threshold_high)
         order_vote = related_idxes[related_inds_vote]
@@ -0,0 +1,57 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# streaming interface of AB3DMOT for live perception output, the detections of each frame are given as they
+# arrive together with the ego pose, and the tracks are returned right away. Nothing is read from or written
+# to the filesystem and the memory only holds the alive tracks and the pose of the last frame
+
+import numpy as np
+from easydict import EasyDict as edict
+from AB3DMOT_libs.model import AB3DMOT
+from AB3DMOT_libs.kitti_oxts import EgoPoseStream
+
+# same keys as in configs/*.yml, dataset and det_name select the tuned parameters of each category
+default_cfg = {'dataset': 'KITTI', 'det_name': 'pointrcnn', 'ego_com': True, 'vis': False, 'affi_pro': False, \
+	'kf_backend': 'cv'}
+
+class OnlineTracker(object):
+	def __init__(self, cat, cfg=None, calib=None, ID_init=1):
+		# cfg is a dictionary overwriting default_cfg, calib is required for the ego motion compensation
+
+		cfg = edict(dict(default_cfg, **(cfg or dict())))
+		assert not cfg.vis, 'visualization requires the image folder'
+		self.ego_poses = EgoPoseStream(calib) if (cfg.ego_com and calib is not None) else None
+		self.tracker = AB3DMOT(cfg, cat, calib=calib, oxts=self.ego_poses, log=None, ID_init=ID_init)
+		self.frame = 0 							# index of the next frame
+		self.affi = None 						# affinity of the last frame, only processed if affi_pro
+
+	def track(self, dets, info=None, ego_pose=None, frame=None):
+		''' track the detections of a new frame
+
+		Input:
+			dets: N x 7, 3D boxes in the format of [h,w,l,x,y,z,theta] in the rect camera coordinate
+			info: N x 7, [alpha, type, x1, y1, x2, y2, score], zeros if not given
+			ego_pose: 4 x 4, pose of the IMU in the world coordinate, no ego-motion compensation if not given
+			frame: index of the frame, the next index if not given
+		Output:
+			M x 15, tracks in the format of [h,w,l,x,y,z,theta,ID,alpha,type,x1,y1,x2,y2,score]
+		'''
+
+		dets = np.asarray(dets, dtype=np.float64).reshape((-1, 7))
+		if info is None: info = np.zeros((dets.shape[0], 7))
+		if frame is None: frame = self.frame
+		if self.ego_poses is not None: self.ego_poses.push(ego_pose)
+
+		results, self.affi = self.tracker.track({'dets': dets, 'info': np.asarray(info).reshape((-1, 7))}, frame, '')
+		self.frame = frame + 1
+
+		return results[0]
+
+	def run(self, frames):
+		# generator of the tracks for an iterable of frames, each frame is a dictionary with the arguments of
+		# track, e.g., {'dets': dets, 'info': info, 'ego_pose': pose}, or only the N x 7 detections
+
+		for data in frames:
+			if not isinstance(data, dict): data = {'dets': data}
+			frame = data.get('frame', self.frame)
+			yield frame, self.track(**data)
@@ -0,0 +1,45 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# leveled log of the tracker with lazy formatting, a message below the level of the log is dropped before
+# anything is formatted, so that the per-frame logging of AB3DMOT.track costs a comparison at the INFO level.
+# Messages above the level are kept unformatted in a buffer, and only formatted and written to the log file
+# when flushed, i.e., at the end of a sequence, on error or when the buffer is full
+
+import collections
+from xinshuo_miscellaneous.logger import print_log
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+level_names = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+
+class TrackerLog(object):
+	def __init__(self, log_file=None, level=INFO, capacity=100000):
+		# log_file is an opened file, nothing is logged if None, level is a number or a name in level_names
+
+		if isinstance(level, str): level = level_names[level.lower()]
+		self.log_file = log_file
+		self.level = level if log_file is not None else ERROR + 1
+		self.records = collections.deque() 			# (message, args), flushed when capacity is reached
+		self.capacity = capacity
+
+	def enabled(self, level):
+		return level >= self.level
+
+	def log(self, level, message, *args):
+		# message is formatted as message % args when flushed, or is any object such as a numpy array if
+		# no args, which are not copied so they should not be modified in place after logging
+
+		if level < self.level: return
+		self.records.append((message, args))
+		if level >= ERROR or len(self.records) >= self.capacity: self.flush()
+
+	def debug(self, message, *args): self.log(DEBUG, message, *args)
+	def info(self, message, *args): self.log(INFO, message, *args)
+	def warning(self, message, *args): self.log(WARNING, message, *args)
+	def error(self, message, *args): self.log(ERROR, message, *args)
+
+	def flush(self):
+		if self.log_file is None: return
+		while self.records:
+			message, args = self.records.popleft()
+			print_log(message % args if args else message, log=self.log_file, display=False)
@@ -6,7 +6,7 @@ from typing import NamedTuple, List, Dict, Tuple, Union
 import yaml, os
 from easydict import EasyDict as edict
 from AB3DMOT_libs.model import AB3DMOT
-from AB3DMOT_libs.kitti_oxts import load_oxts
+from AB3DMOT_libs.kitti_oxts import load_ego_pose_table
 from AB3DMOT_libs.kitti_calib import Calibration
 from AB3DMOT_libs.nuScenes_split import get_split
 from xinshuo_miscellaneous.file_io import mkdir_if_missing, is_path_exists, fileparts, load_list_from_folder
@@ -155,19 +155,21 @@ def initialize(cfg, data_root, save_dir, subfolder, seq_name, cat, ID_start, hw,
 	oxts = os.path.join(data_root, subfolder, 'oxts', seq_name+'.json')
 	if not is_path_exists(oxts):
 		oxts = os.path.join(data_root, subfolder, 'oxts', seq_name+'.txt')
-	imu_poses = load_oxts(oxts)                 # seq_frames x 4 x 4
 
 	# load calibration
 	calib = os.path.join(data_root, subfolder, 'calib', seq_name+'.txt')
 	calib = Calibration(calib)
 
+	# precompute the ego motion between frames, cached next to the oxts file
+	ego_poses = load_ego_pose_table(oxts, calib)
+
 	# load image for visualization
 	img_seq = os.path.join(data_root, subfolder, 'image_02', seq_name)
 	vis_dir = os.path.join(save_dir, 'vis_debug', seq_name); mkdir_if_missing(vis_dir)
 
 	# initiate the tracker
 	assert cfg.num_hypo == 1, f'Only single hypothesis mode supported, but cfg.num_hypo={cfg.num_hypo}'
-	tracker = AB3DMOT(cfg, cat, calib=calib, oxts=imu_poses, img_dir=img_seq, vis_dir=vis_dir, hw=hw, log=log_file, ID_init=ID_start)
+	tracker = AB3DMOT(cfg, cat, calib=calib, oxts=ego_poses, img_dir=img_seq, vis_dir=vis_dir, hw=hw, log=log_file, ID_init=ID_start)
 
 	return tracker
 
@@ -1,6 +1,6 @@
 import numpy as np, cv2, random
 from PIL import Image
-from AB3DMOT_libs.box import Box3D
+from AB3DMOT_libs.box import Box3D, Box3DArray
 from xinshuo_miscellaneous.visualization import random_colors
 
 random.seed(0)
@@ -45,12 +45,13 @@ def draw_box3d_image(image, qs, img_size=(900, 1600), color=(255,255,255), thick
 
 	return image, True
 
-def vis_obj(box, img, calib, hw, color_tmp=None, str_vis=None, thickness=4, id_hl=None, err_type=None):
+def vis_obj(box, img, calib, hw, color_tmp=None, str_vis=None, thickness=4, id_hl=None, err_type=None, corners=None):
 	# visualize an individual object	
 	# repeat is for highlighted objects, used to create pause in the video
+	# corners: 8 x 3 corners of the box if already computed for the frame
 
 	# draw box
-	obj_8corner = Box3D.box2corners3d_camcoord(box)
+	obj_8corner = Box3D.box2corners3d_camcoord(box) if corners is None else corners
 	obj_pts_2d = calib.project_rect_to_image(obj_8corner)
 	img, draw = draw_box3d_image(img, obj_pts_2d, hw, color=color_tmp, thickness=thickness)
 
@@ -95,8 +96,11 @@ def vis_image_with_obj(img, obj_res, obj_gt, calib, hw, save_path, h_thres=0, \
 	# load image
 	img = np.array(Image.open(img))
 
+	# corners of all objects of the frame at once
+	corners = Box3DArray.from_boxes([obj.get_box3D() for obj in obj_res]).corners()
+
 	# loop through every objects
-	for obj in obj_res:
+	for obj_index, obj in enumerate(obj_res):
 		depth = obj.z
 		if depth >= 2: 		# check in front of camera
 
@@ -123,7 +127,8 @@ def vis_image_with_obj(img, obj_res, obj_gt, calib, hw, save_path, h_thres=0, \
 				err_type = id_hl[obj.id]
 			else:
 				err_type = None
-			img = vis_obj(box_tmp, img, calib, hw['image'], color_tmp, str_vis, thickness, id_hl, err_type)
+			img = vis_obj(box_tmp, img, calib, hw['image'], color_tmp, str_vis, thickness, id_hl, err_type, \
+				corners=corners[obj_index])
 
 	# save image
 	img = Image.fromarray(img)
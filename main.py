@@ -3,9 +3,9 @@
 
 from __future__ import print_function
 import matplotlib; matplotlib.use('Agg')
-import os, numpy as np, time, sys, argparse
+import os, io, numpy as np, time, sys, argparse, multiprocessing
 from AB3DMOT_libs.utils import Config, get_subfolder_seq, initialize, load_image_frame_list
-from AB3DMOT_libs.io import load_detection, get_saving_dir, get_frame_det, save_results, save_affinity
+from AB3DMOT_libs.io import load_detection_store, get_result_sink, AsyncWriter
 from scripts.post_processing.combine_trk_cat import combine_trk_cat
 from xinshuo_miscellaneous.counter import get_timestring
 from xinshuo_miscellaneous.file_io import mkdir_if_missing
@@ -17,16 +17,15 @@ def parse_args():
     parser.add_argument('--dataset', type=str, default='nuScenes', help='KITTI, nuScenes')
     parser.add_argument('--split', type=str, default='', help='train, val, test')
     parser.add_argument('--det_name', type=str, default='', help='pointrcnn')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to run the sequences in parallel')
     args = parser.parse_args()
     return args
 
 
-def main_per_category(cfg, cat, log, ID_start):
+def get_category_dir(cfg, cat):
     # get data-cat-split specific path
     result_sha = '%s_%s_%s' % (cfg.det_name, cat, cfg.split)
     det_root = os.path.join('./data', cfg.dataset, 'detection', result_sha)
-    subfolder, det_id2str, hw, seq_eval, data_root = get_subfolder_seq(cfg.dataset, cfg.split)
-    trk_root = os.path.join(data_root, 'tracking')
     save_dir = os.path.join(cfg.save_root, result_sha + '_H%d' % cfg.num_hypo); mkdir_if_missing(save_dir)
 
     # create eval dir for each hypothesis
@@ -34,74 +33,144 @@ def main_per_category(cfg, cat, log, ID_start):
     for index in range(cfg.num_hypo):
         eval_dir_dict[index] = os.path.join(save_dir, 'data_%d' % index); mkdir_if_missing(eval_dir_dict[index])
 
+    return result_sha, det_root, save_dir, eval_dir_dict
+
+
+def track_sequence(cfg, cat, seq_name, seq_count, log, ID_start):
+    # run the tracker over a sequence, the results are returned and saved by save_sequence so that the
+    # track ID can still be offset when sequences run in parallel
+    result_sha, det_root, save_dir, _ = get_category_dir(cfg, cat)
+    subfolder, det_id2str, hw, seq_eval, data_root = get_subfolder_seq(cfg.dataset, cfg.split)
+    trk_root = os.path.join(data_root, 'tracking')
+
+    seq_file = os.path.join(det_root, seq_name+'.txt')
+    seq_dets, flag = load_detection_store(seq_file) 		# load detection, binary store if converted
+    if not flag: return None								# no detection
+
+    # initialize tracker
+    tracker = initialize(cfg, trk_root, save_dir, subfolder, seq_name, cat, ID_start, hw, log)
+    frame_list = load_image_frame_list(trk_root, subfolder, seq_name)
+
+    # loop over frame
+    seq_results, total_time = list(), 0.0
+    min_frame, max_frame = int(frame_list[0]), int(frame_list[-1])
+    for frame in range(min_frame, max_frame + 1):
+        # add an additional frame here to deal with the case that the last frame, although no detection
+        # but should output an N x 0 affinity for consistency
+
+        # logging
+        print_str = 'processing %s %s: %d/%d, %d/%d   \r' % (result_sha, seq_name, seq_count, \
+            len(seq_eval), frame, max_frame)
+        sys.stdout.write(print_str)
+        sys.stdout.flush()
+
+        # tracking by detection, the buffered log of the tracker is written if it fails
+        dets_frame = seq_dets.get_frame(frame)
+        since = time.time()
+        try: results, affi = tracker.track(dets_frame, frame, seq_name)
+        except Exception:
+            tracker.log.error('tracking failed at seq_name/frame %s/%d', seq_name, frame)
+            raise
+        total_time += time.time() - since
+
+        # affinity matrix between the past frame and current frame, e.g., for 000006.npy, it means affinity
+        # between frame 5 and 6. Note that the saved value in affinity can be different in reality because it
+        # is between the original detections and ego-motion compensated predicted tracklets, rather than
+        # between the actual two sets of output tracklets
+        seq_results.append((frame, results, affi))
+    tracker.log.flush()
+
+    return {'results': seq_results, 'ID_count': tracker.ID_count, 'time': total_time, \
+        'metric': tracker.metric, 'thres': tracker.thres}
+
+
+def save_sequence(cfg, cat, seq_name, seq_results, writer=None, ID_offset=0):
+    # save the results of a sequence returned by track_sequence to the result sink of the config, with
+    # the track ID shifted by ID_offset, the files are written by the writer
+    _, _, save_dir, _ = get_category_dir(cfg, cat)
+    _, det_id2str, _, _, _ = get_subfolder_seq(cfg.dataset, cfg.split)
+    sink = get_result_sink(cfg.get('result_sink', 'text'), save_dir, seq_name, cfg.num_hypo, det_id2str, \
+        cfg.score_threshold, writer)
+
+    for frame, results, affi in seq_results:
+        if ID_offset != 0:
+            results = [result.copy() for result in results]
+            for result in results: result[:, 7] += ID_offset
+        sink.write_frame(frame, results, affi)
+    sink.close()
+
+
+def print_category_log(cfg, cat, log, total_time, total_frames, metric, thres):
+    result_sha = '%s_%s_%s' % (cfg.det_name, cat, cfg.split)
+    print_log('%s, %25s: %4.f seconds for %5d frames or %6.1f FPS, metric is %s = %.2f' % \
+        (cfg.dataset, result_sha, total_time, total_frames, total_frames / total_time, \
+        metric, thres), log=log)
+
+
+def main_per_category(cfg, cat, log, ID_start, writer=None):
+    get_category_dir(cfg, cat)
+    _, _, _, seq_eval, _ = get_subfolder_seq(cfg.dataset, cfg.split)
+
     # loop every sequence
     seq_count = 0
-    total_time, total_frames = 0.0, 0
+    stats = [0.0, 0, None, None] 								# time, frames, metric, thres
     for seq_name in seq_eval:
-        seq_file = os.path.join(det_root, seq_name+'.txt')
-        seq_dets, flag = load_detection(seq_file) 				# load detection
-        if not flag: continue									# no detection
-
-        # create folders for saving
-        eval_file_dict, save_trk_dir, affinity_dir, affinity_vis = \
-            get_saving_dir(eval_dir_dict, seq_name, save_dir, cfg.num_hypo)
-
-        # initialize tracker
-        tracker = initialize(cfg, trk_root, save_dir, subfolder, seq_name, cat, ID_start, hw, log)
-        frame_list = load_image_frame_list(trk_root, subfolder, seq_name)
-
-        # loop over frame
-        min_frame, max_frame = int(frame_list[0]), int(frame_list[-1])
-        for frame in range(min_frame, max_frame + 1):
-            # add an additional frame here to deal with the case that the last frame, although no detection
-            # but should output an N x 0 affinity for consistency
-
-            # logging
-            print_str = 'processing %s %s: %d/%d, %d/%d   \r' % (result_sha, seq_name, seq_count, \
-                len(seq_eval), frame, max_frame)
-            sys.stdout.write(print_str)
-            sys.stdout.flush()
-
-            # tracking by detection
-            dets_frame = get_frame_det(seq_dets, frame)
-            since = time.time()
-            results, affi = tracker.track(dets_frame, frame, seq_name)
-            total_time += time.time() - since
-
-            # saving affinity matrix, between the past frame and current frame
-            # e.g., for 000006.npy, it means affinity between frame 5 and 6
-            # note that the saved value in affinity can be different in reality because it is between the
-            # original detections and ego-motion compensated predicted tracklets, rather than between the
-            # actual two sets of output tracklets
-            save_affi_file = os.path.join(affinity_dir, '%06d.npy' % frame)
-            save_affi_vis  = os.path.join(affinity_vis, '%06d.txt' % frame)
-            if (affi is not None) and (affi.shape[0] + affi.shape[1] > 0):
-                # save affinity as long as there are tracklets in at least one frame
-                np.save(save_affi_file, affi)
-
-                # cannot save for visualization unless both two frames have tracklets
-                if affi.shape[0] > 0 and affi.shape[1] > 0:
-                    save_affinity(affi, save_affi_vis)
-
-            # saving trajectories, loop over each hypothesis
-            for hypo in range(cfg.num_hypo):
-                save_trk_file = os.path.join(save_trk_dir[hypo], '%06d.txt' % frame)
-                save_trk_file = open(save_trk_file, 'w')
-                for result_tmp in results[hypo]:				# N x 15
-                    save_results(result_tmp, save_trk_file, eval_file_dict[hypo], \
-                        det_id2str, frame, cfg.score_threshold)
-                save_trk_file.close()
-
-            total_frames += 1
+        output = track_sequence(cfg, cat, seq_name, seq_count, log, ID_start)
+        if output is None: continue 							# no detection
+        save_sequence(cfg, cat, seq_name, output['results'], writer)
+
+        stats[0] += output['time']
+        stats[1] += len(output['results'])
+        stats[2:] = output['metric'], output['thres']
         seq_count += 1
 
         for index in range(cfg.num_hypo):
-            eval_file_dict[index].close()
-            ID_start = max(ID_start, tracker.ID_count[index])
+            ID_start = max(ID_start, output['ID_count'][index])
+
+    if stats[1] > 0: print_category_log(cfg, cat, log, *stats)
+
+    return ID_start
+
+
+def track_job(job):
+    # worker of the process pool, run one (category, sequence) with its own ID range starting from 1
+    # and its own log, which are both merged by the main process in the same order as the serial run
+    cfg, cat, seq_name, seq_count = job
+    log = io.StringIO()
+    output = track_sequence(cfg, cat, seq_name, seq_count, log, ID_start=1)
+    return output, log.getvalue()
 
-    print_log('%s, %25s: %4.f seconds for %5d frames or %6.1f FPS, metric is %s = %.2f' % \
-        (cfg.dataset, result_sha, total_time, total_frames, total_frames / total_time, \
-        tracker.metric, tracker.thres), log=log)
+
+def main_parallel(cfg, log, ID_start, workers, writer=None):
+    # run all (category, sequence) in a process pool. As track IDs are given consecutively from the ID_start
+    # of the tracker, every job tracks with IDs starting from 1 and is then assigned the deterministic range
+    # [ID_start, ID_start + number of IDs) following the jobs before it in the serial order, so that IDs never
+    # collide and the saved results are the same as the serial run, only the logs keep the job-local IDs
+    for cat in cfg.cat_list: get_category_dir(cfg, cat)
+    _, _, _, seq_eval, _ = get_subfolder_seq(cfg.dataset, cfg.split)
+    jobs = [(cfg, cat, seq_name, seq_count) for cat in cfg.cat_list for seq_count, seq_name in enumerate(seq_eval)]
+
+    stats = {cat: [0.0, 0, None, None] for cat in cfg.cat_list}  	# time, frames, metric, thres
+    since = time.time()
+    with multiprocessing.Pool(workers) as pool:
+
+        # results are returned in the order of jobs, so the IDs are offset in the serial order
+        for (_, cat, seq_name, _), (output, log_str) in zip(jobs, pool.imap(track_job, jobs)):
+            log.write(log_str)
+            if output is None: continue 						# no detection
+
+            ID_offset = ID_start - 1
+            save_sequence(cfg, cat, seq_name, output['results'], writer, ID_offset)
+            for index in range(cfg.num_hypo):
+                ID_start = max(ID_start, output['ID_count'][index] + ID_offset)
+
+            stats[cat][0] += output['time']
+            stats[cat][1] += len(output['results'])
+            stats[cat][2:] = output['metric'], output['thres']
+
+    for cat in cfg.cat_list:
+        if stats[cat][1] > 0: print_category_log(cfg, cat, log, *stats[cat])
+    print_log('%d jobs on %d workers: %.1f seconds in total' % (len(jobs), workers, time.time() - since), log=log)
 
     return ID_start
 
@@ -130,13 +199,22 @@ def main(args):
         # without ID conflicting, Also use 1 (not 0) as start because MOT benchmark requires positive ID
         ID_start = 1
 
-        # run tracking for each category
-        for cat in cfg.cat_list:
-            ID_start = main_per_category(cfg, cat, log, ID_start)
-
-        # combine results for every category
-        print_log('\ncombining results......', log=log)
-        combine_trk_cat(cfg.split, cfg.dataset, cfg.det_name, 'H%d' % cfg.num_hypo, cfg.num_hypo)
+        # run tracking for each category, or for all sequences of all categories in parallel, the results
+        # are written on a background thread if async_flush
+        writer = AsyncWriter(cfg.get('async_flush', True))
+        if args.workers > 1:
+            ID_start = main_parallel(cfg, log, ID_start, args.workers, writer)
+        else:
+            for cat in cfg.cat_list:
+                ID_start = main_per_category(cfg, cat, log, ID_start, writer)
+        writer.close()
+
+        # combine results for every category, packed results need to be exported to the KITTI text first
+        if cfg.get('result_sink', 'text') == 'text':
+            print_log('\ncombining results......', log=log)
+            combine_trk_cat(cfg.split, cfg.dataset, cfg.det_name, 'H%d' % cfg.num_hypo, cfg.num_hypo)
+        else:
+            print_log('\nresults are packed, run scripts/post_processing/export_packed_results.py for the KITTI format', log=log)
         print_log('\nDone!', log=log)
 
 
@@ -0,0 +1,44 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# assignment backends of the hungarian method used by the evaluation. The associations over the gating have
+# a cost of max_cost, every backend returns an N x 2 array of the (row, col) of a minimum cost assignment
+# sorted by row. The associations over the gating in the assignment can differ between the backends, they
+# are dropped by the evaluation anyway
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from munkres import Munkres
+
+def assign_munkres(cost_matrix, max_cost):
+    # pure python hungarian method on the whole cost matrix
+    cost_matrix = np.asarray(cost_matrix, dtype=float)
+    if cost_matrix.size == 0: return np.zeros((0, 2), dtype=int)
+    return np.array(Munkres().compute(cost_matrix.tolist()), dtype=int).reshape((-1, 2))
+
+def has_ties(cost_matrix, max_cost):
+    # equal costs within the gating in a row or a column, where the optimal assignment might not be unique
+    for matrix in (cost_matrix, cost_matrix.T):
+        matrix = np.sort(matrix, axis=1)
+        if np.any((matrix[:, 1:] == matrix[:, :-1]) & (matrix[:, 1:] < max_cost)): return True
+    return False
+
+def assign_scipy(cost_matrix, max_cost):
+    """
+        Compiled hungarian method of scipy on the rows and columns with an association within the gating, the
+        other rows and columns can only be assigned over the gating. When an optimal assignment might not be
+        unique, the frame is solved by munkres to keep its choice among the optimal assignments
+    """
+
+    cost_matrix = np.asarray(cost_matrix, dtype=float)
+    if cost_matrix.size == 0: return np.zeros((0, 2), dtype=int)
+    gated = cost_matrix < max_cost
+    rows, cols = np.flatnonzero(gated.any(axis=1)), np.flatnonzero(gated.any(axis=0))
+    if len(rows) == 0: return np.zeros((0, 2), dtype=int)
+    cost_matrix_gated = cost_matrix[np.ix_(rows, cols)]
+    if len(rows) == 1 and len(cols) == 1: return np.array([[rows[0], cols[0]]])
+    if has_ties(cost_matrix_gated, max_cost): return assign_munkres(cost_matrix, max_cost)
+    row_ind, col_ind = linear_sum_assignment(cost_matrix_gated)
+    return np.stack([rows[row_ind], cols[col_ind]], axis=1)
+
+assignment_backends = {'scipy': assign_scipy, 'munkres': assign_munkres}
@@ -3,8 +3,9 @@
 
 from __future__ import print_function
 import matplotlib; matplotlib.use('Agg')
-import sys, os, copy, math, numpy as np, matplotlib.pyplot as plt
-from munkres import Munkres
+import sys, os, copy, math, multiprocessing, numpy as np, matplotlib.pyplot as plt
+from assignment import assignment_backends
+from label_cache import label_names, loaded_classes, load_labels, select_labels
 from collections import defaultdict
 try:
     from ordereddict import OrderedDict # can be installed using pip
@@ -12,14 +13,19 @@ except:
     from collections import OrderedDict # only included from python 2.7 on
 
 import mailpy
-from AB3DMOT_libs.dist_metrics import iou
+from AB3DMOT_libs.dist_metrics import iou_batch
 
 num_sample_pts = 41.0
+max_cost = 1e9                  # cost of the associations over the gating on box overlap
 
 class tData:
     """
         Utility class to load data.
     """
+    # one object is created for every box, slots keep it small
+    __slots__ = ('frame', 'track_id', 'obj_type', 'truncation', 'occlusion', 'obs_angle', 'x1', 'y1', 'x2', 'y2', 'w', 'h', 'l', 'x', 'y', 'z', \
+        'ry', 'score', 'ignored', 'valid', 'tracker')
+
     def __init__(self,frame=-1,obj_type="unset",truncation=-1,occlusion=-1,\
                  obs_angle=-10,x1=-1,y1=-1,x2=-1,y2=-1,w=-1,h=-1,l=-1,\
                  x=-1000,y=-1000,z=-1000,ry=-10,score=-1000,track_id=-1):
@@ -55,8 +61,8 @@ class tData:
             Print read data.
         """
         
-        attrs = vars(self)
-        return '\n'.join("%s: %s" % item for item in attrs.items())
+        attrs = [(name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name)]
+        return '\n'.join("%s: %s" % item for item in attrs)
 
 def boxoverlap(a, b, criterion="union"):
     """
@@ -90,6 +96,13 @@ def boxoverlap(a, b, criterion="union"):
         raise TypeError("Unkown type for criterion")
     return o
 
+def box3d_array(objs):
+    """
+        stack the 3D boxes of a list of tData into an N x 7 array in the format of [x,y,z,theta,l,w,h]
+        as used by the batched iou in dist_metrics.py
+    """
+    return np.array([[obj.x, obj.y, obj.z, obj.ry, obj.l, obj.w, obj.h] for obj in objs], dtype=np.float64).reshape((-1, 7))
+
 class trackingEvaluation(object):
     """ tracking statistics (CLEAR MOT, id-switches, fragments, ML/PT/MT, precision/recall)
              MOTA   - Multi-object tracking accuracy in [0,100]
@@ -109,7 +122,8 @@ class trackingEvaluation(object):
     """
 
     def __init__(self, t_sha, gt_path="./scripts/KITTI", max_truncation = 0, min_height = 25, max_occlusion = 2, \
-        mail=None, cls="car", eval_3diou=True, eval_2diou=False, num_hypo=1, thres=None):
+        mail=None, cls="car", eval_3diou=True, eval_2diou=False, num_hypo=1, thres=None, assignment='scipy', \
+        gt_cache_dir="./results/KITTI/gt_cache"):
         # get number of sequences and
         # get number of frames per sequence from test mapping
         # (created while extracting the benchmark)
@@ -132,6 +146,8 @@ class trackingEvaluation(object):
 
         # data and parameter
         self.gt_path           = os.path.join(gt_path, "label")
+        self.split             = "val"
+        self.gt_cache_dir      = gt_cache_dir   # cache of the parsed ground truth, None to always parse the label files
         self.t_sha             = t_sha
         self.t_path            = os.path.join("./results/KITTI", t_sha, "data_%d" % (int(num_hypo)-1))
         
@@ -182,6 +198,8 @@ class trackingEvaluation(object):
         
         self.eval_2diou = eval_2diou
         self.eval_3diou = eval_3diou
+        self.seq_arrays  = None     # flattened gt and tracks of every sequence and their assignment, for all thresholds
+        self.assignment  = assignment_backends[assignment]      # backend of the hungarian method, see assignment.py
         if thres is None:
             if eval_2diou: 
                 self.min_overlap   = 0.5  # minimum bounding box overlap for 3rd party metrics
@@ -196,105 +214,81 @@ class trackingEvaluation(object):
         self.max_occlusion     = max_occlusion # maximum occlusion of an object for evaluation
         self.min_height        = min_height # minimum height of an object for evaluation
         self.n_sample_points   = 500
-        
-        # this should be enough to hold all groundtruth trajectories
-        # is expanded if necessary and reduced in any case
-        self.gt_trajectories            = [[] for x in range(self.n_sequences)]
-        self.ign_trajectories           = [[] for x in range(self.n_sequences)]
 
-    def loadGroundtruth(self):
+    def loadLabels(self):
+        """
+            Helper function to read the tracker data and ground truth of all classes at once, every class
+            then selects its rows with loadTracker(labels) and loadGroundtruth(labels). None if not readable
+        """
+
+        try:
+            tracker_labels = load_labels(self.t_path, self.sequence_name)
+        except IOError:
+            tracker_labels = None
+        try:
+            gt_labels = load_labels(self.gt_path, self.sequence_name, loading_groundtruth=True, \
+                cache_dir=self.gt_cache_dir, cache_name="%s_all" % self.split)
+        except IOError:
+            gt_labels = None
+        return tracker_labels, gt_labels
+
+    def loadGroundtruth(self, labels=None):
         """
-            Helper function to load ground truth.
+            Helper function to load ground truth, selected from the labels of all classes if given.
         """
         
         try:
-            self._loadData(self.gt_path, cls=self.cls, loading_groundtruth=True)
+            self._loadData(self.gt_path, cls=self.cls, loading_groundtruth=True, labels=labels)
         except IOError:
             return False
         return True
 
-    def loadTracker(self):
+    def loadTracker(self, labels=None):
         """
-            Helper function to load tracker data.
+            Helper function to load tracker data, selected from the labels of all classes if given.
         """
         
         try:
-            if not self._loadData(self.t_path, cls=self.cls, loading_groundtruth=False):
+            if not self._loadData(self.t_path, cls=self.cls, loading_groundtruth=False, labels=labels):
                 return False
         except IOError:
             return False
         return True
 
-    def _loadData(self, root_dir, cls, min_score=-1000, loading_groundtruth=False):
+    def _loadData(self, root_dir, cls, min_score=-1000, loading_groundtruth=False, labels=None):
         """
             Generic loader for ground truth and tracking data.
             Use loadGroundtruth() or loadTracker() to load this data.
-            Loads detections in KITTI format from textfiles.
+            Loads detections in KITTI format from textfiles, or selects them from the labels of all classes.
         """
-        # construct objectDetections object to hold detection data
-        t_data  = tData()
-        data    = []
-        eval_2d = True
-        eval_3d = True
+        # rows of the classes to load of all sequences, the ground truth is parsed once and cached
+        if labels is not None:
+            labels = select_labels(labels, loaded_classes(cls))
+        elif loading_groundtruth:
+            labels = load_labels(root_dir, self.sequence_name, loaded_classes(cls), loading_groundtruth=True, \
+                cache_dir=self.gt_cache_dir, cache_name="%s_%s" % (self.split, cls.lower()))
+        else:
+            labels = load_labels(root_dir, self.sequence_name, loaded_classes(cls))
+        if labels is None:
+            self.mail.msg("file is not in KITTI format")
+            return
+        columns, seq_offset = labels
+
+        # check if uploaded data provides information for 2D and 3D evaluation
+        eval_2d = not np.any((columns['x1']==-1) | (columns['x2']==-1) | (columns['y1']==-1) | (columns['y2']==-1))
+        eval_3d = not np.any((columns['x']==-1000) | (columns['y']==-1000) | (columns['z']==-1000))
 
         seq_data           = []
         n_trajectories     = 0
         n_trajectories_seq = []
-        for seq, s_name in enumerate(self.sequence_name):
-            i              = 0
-            filename       = os.path.join(root_dir, "%s.txt" % s_name)
-            f              = open(filename, "r")
-
+        for seq in range(len(self.sequence_name)):
             f_data         = [[] for x in range(self.n_frames[seq])] # current set has only 1059 entries, sufficient length is checked anyway
-            ids            = []
+            ids            = set()
             n_in_seq       = 0
-            id_frame_cache = []
-            for line in f:
-                # KITTI tracking benchmark data format:
-                # (frame,tracklet_id,objectType,truncation,occlusion,alpha,x1,y1,x2,y2,h,w,l,X,Y,Z,ry)
-                line = line.strip()
-                fields            = line.split(" ")
-                # classes that should be loaded (ignored neighboring classes)
-                if "car" in cls.lower():
-                    classes = ["car","van"]
-                elif "pedestrian" in cls.lower():
-                    classes = ["pedestrian","person_sitting"]
-                else:
-                    classes = [cls.lower()]
-                classes += ["dontcare"]
-                if not any([s for s in classes if s in fields[2].lower()]):
-                    continue
-                # get fields from table
-                t_data.frame        = int(float(fields[0]))     # frame
-                t_data.track_id     = int(float(fields[1]))     # id
-                t_data.obj_type     = fields[2].lower()         # object type [car, pedestrian, cyclist, ...]
-                t_data.truncation   = int(float(fields[3]))     # truncation [-1,0,1,2]
-                t_data.occlusion    = int(float(fields[4]))     # occlusion  [-1,0,1,2]
-                t_data.obs_angle    = float(fields[5])          # observation angle [rad]
-                t_data.x1           = float(fields[6])          # left   [px]
-                t_data.y1           = float(fields[7])          # top    [px]
-                t_data.x2           = float(fields[8])          # right  [px]
-                t_data.y2           = float(fields[9])          # bottom [px]
-                t_data.h            = float(fields[10])         # height [m]
-                t_data.w            = float(fields[11])         # width  [m]
-                t_data.l            = float(fields[12])         # length [m]
-                t_data.x            = float(fields[13])         # X [m]
-                t_data.y            = float(fields[14])         # Y [m]
-                t_data.z            = float(fields[15])         # Z [m]
-                t_data.ry           = float(fields[16])         # yaw angle [rad]
-                t_data.corners_3d_cam = None
-                if not loading_groundtruth:
-                    if len(fields) == 17:
-                        t_data.score = -1
-                    elif len(fields) == 18:
-                        t_data.score  = float(fields[17])     # detection score
-                    else:
-                        self.mail.msg("file is not in KITTI format")
-                        return
-
-                # do not consider objects marked as invalid
-                if t_data.track_id is -1 and t_data.obj_type != "dontcare":
-                    continue
+            id_frame_cache = set()
+            seq_rows       = zip(*[columns[name][seq_offset[seq]:seq_offset[seq+1]].tolist() for name in label_names])
+            for row in seq_rows:
+                t_data = tData(**dict(zip(label_names, row)))
 
                 idx = t_data.frame
                 # check if length for frame data is sufficient
@@ -309,27 +303,20 @@ class trackingEvaluation(object):
                         self.mail.msg("Exiting...")
                         #continue # this allows to evaluate non-unique result files
                         return False
-                    id_frame_cache.append(id_frame)
-                    f_data[t_data.frame].append(copy.copy(t_data))
+                    id_frame_cache.add(id_frame)
+                    f_data[t_data.frame].append(t_data)
                 except:
                     print(len(f_data), idx)
                     raise
 
                 if t_data.track_id not in ids and t_data.obj_type!="dontcare":
-                    ids.append(t_data.track_id)
+                    ids.add(t_data.track_id)
                     n_trajectories +=1
                     n_in_seq +=1
 
-                # check if uploaded data provides information for 2D and 3D evaluation
-                if not loading_groundtruth and eval_2d is True and(t_data.x1==-1 or t_data.x2==-1 or t_data.y1==-1 or t_data.y2==-1):
-                    eval_2d = False
-                if not loading_groundtruth and eval_3d is True and(t_data.x==-1000 or t_data.y==-1000 or t_data.z==-1000):
-                    eval_3d = False
-
             # only add existing frames
             n_trajectories_seq.append(n_in_seq)
             seq_data.append(f_data)
-            f.close()
 
         if not loading_groundtruth:
             self.tracker=seq_data
@@ -434,13 +421,154 @@ class trackingEvaluation(object):
         self.MT                = 0
         self.PT                = 0
         self.ML                = 0
-        
-        self.gt_trajectories            = [[] for x in range(self.n_sequences)]
-        self.ign_trajectories           = [[] for x in range(self.n_sequences)]
 
         return 
 
-    def compute3rdPartyMetrics(self, threshold=-10000, recall_thres=1.0):
+    def buildArrays(self):
+        """
+            Flatten the ground truth and tracks of every sequence into arrays over all frames with their ignore
+            flags that do not depend on the threshold. The overlap of all ground truth and tracks of every frame
+            and their assignment are also computed once, using box overlap 0..1 as cost
+        """
+
+        self.seq_arrays, self.valid, self.valid_call = [], [], []
+        for seq_idx in range(len(self.groundtruth)):
+            seq_gt, seq_dc = self.groundtruth[seq_idx], self.dcareas[seq_idx]
+            seq_tracker = self.tracker[seq_idx]
+            g_all = [gg for f in range(len(seq_gt)) for gg in seq_gt[f]]
+            t_all = [tt for f in range(len(seq_gt)) for tt in seq_tracker[f]]
+
+            arrays = dict()
+            arrays['g_offset'] = np.cumsum([0] + [len(seq_gt[f]) for f in range(len(seq_gt))])
+            arrays['t_offset'] = np.cumsum([0] + [len(seq_tracker[f]) for f in range(len(seq_gt))])
+            arrays['g_frame']  = np.repeat(np.arange(len(seq_gt)), np.diff(arrays['g_offset']))
+            arrays['t_frame']  = np.repeat(np.arange(len(seq_gt)), np.diff(arrays['t_offset']))
+            arrays['g_id']     = np.array([gg.track_id for gg in g_all], dtype=int)
+            arrays['t_id']     = np.array([tt.track_id for tt in t_all], dtype=int)
+            arrays['t_score']  = np.array([tt.score for tt in t_all], dtype=float)
+
+            # ground truth ignored for truncation, occlusion or a neighboring class
+            arrays['g_ignore'] = np.array([gg.occlusion>self.max_occlusion or gg.truncation>self.max_truncation \
+                or (self.cls=="car" and gg.obj_type=="van") or (self.cls=="pedestrian" and gg.obj_type=="person_sitting") \
+                for gg in g_all], dtype=bool)
+
+            # tracks ignored for a neighboring class, the minimum height or a DontCare area unless matched.
+            # As KITTI does not provide ground truth 3D box for DontCare objects, we have to use 2D IoU here
+            # and a threshold of 0.5 for 2D IoU
+            arrays['t_ignore'] = np.array([(self.cls=="car" and tt.obj_type=="van") or (self.cls=="pedestrian" and tt.obj_type=="person_sitting") \
+                or abs(tt.y1 - tt.y2)<=self.min_height or any(boxoverlap(tt, d, "a") > 0.5 for d in seq_dc[tt.frame]) \
+                for tt in t_all], dtype=bool)
+
+            # cost of all ground truth and tracks of each frame and their assignment
+            arrays['cost'] = [self.costMatrix(seq_gt[f], seq_tracker[f]) for f in range(len(seq_gt))]
+            arrays['matches'] = self.flattenMatches(arrays, [(f, self.assign(arrays['cost'][f])) for f in range(len(seq_gt))])
+            self.seq_arrays.append(arrays)
+
+            # valid tracks are matched in any of the earlier calls of compute3rdPartyMetrics
+            self.valid.append(np.zeros(len(t_all), dtype=bool))
+            self.valid_call.append(np.full(len(t_all), np.inf))
+
+    def costMatrix(self, g, t):
+        # 1 - box overlap of all ground truth and tracker objects of a frame, over the gating set to max_cost
+        cost_matrix = np.full((len(g), len(t)), max_cost)
+        if len(g) > 0 and len(t) > 0:
+            if self.eval_2diou:
+                cost_matrix = 1 - np.array([[boxoverlap(gg, tt) for tt in t] for gg in g])
+            elif self.eval_3diou:
+                cost_matrix = 1 - iou_batch(box3d_array(g), box3d_array(t), metric='iou_3d')
+            else:
+                assert False, 'error'
+
+            # gating for box overlap
+            cost_matrix[~(cost_matrix <= 1 - self.min_overlap)] = max_cost
+        return cost_matrix
+
+    def assign(self, cost_matrix):
+        # hungarian method, the associations over the gating on box overlap are dropped
+        association_matrix = self.assignment(cost_matrix, max_cost)
+        cost = cost_matrix[association_matrix[:, 0], association_matrix[:, 1]]
+        return association_matrix[cost < max_cost], cost[cost < max_cost]
+
+    def flattenMatches(self, arrays, frame_matches, kept=None):
+        """
+            Matches of a list of (frame, (association_matrix, cost)) as arrays of the frame, the index of the
+            ground truth and tracks in the flattened sequence and the cost, the columns of the association
+            matrix index the kept tracks of the frame if given
+        """
+
+        frames, rows, cols, costs = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)], [np.zeros(0)]
+        for f, (association_matrix, cost) in frame_matches:
+            col = association_matrix[:, 1]
+            if kept is not None: col = kept[f][col]
+            frames.append(np.full(len(cost), f))
+            rows.append(arrays['g_offset'][f] + association_matrix[:, 0])
+            cols.append(arrays['t_offset'][f] + col)
+            costs.append(cost)
+        return np.concatenate(frames), np.concatenate(rows), np.concatenate(cols), np.concatenate(costs)
+
+    def filterTracker(self, threshold):
+        """
+            Average the scores of each track over its sequence, and remove the tracks with a lower average
+            score than the threshold. The averaged scores replace the scores, returns the mask of the kept
+            tracks of every sequence
+        """
+
+        seq_kept = []
+        for arrays in self.seq_arrays:
+            # the scores of a track are summed in the order of the frames
+            _, inverse = np.unique(arrays['t_id'], return_inverse=True)
+            average_score = np.bincount(inverse, weights=arrays['t_score']) / np.bincount(inverse)
+            arrays['t_score'] = average_score[inverse]
+            seq_kept.append(~(arrays['t_score'] < threshold))
+
+        return seq_kept
+
+    def associate(self, threshold):
+        """
+            The tracks kept at the threshold and their matches with the ground truth in every sequence. The
+            cached assignment of all tracks of a frame stays optimal when the removed tracks are not in it,
+            so the assignment is only solved again on the kept tracks of the frames with a removed match
+        """
+
+        if self.seq_arrays is None: self.buildArrays()
+        seq_kept = self.filterTracker(threshold)
+        seq_matches = []
+        for arrays, kept in zip(self.seq_arrays, seq_kept):
+            m_frame, m_g, m_t, m_c = arrays['matches']
+            redo = np.unique(m_frame[~kept[m_t]])
+            if len(redo) > 0:
+                kept_frame = {f: np.flatnonzero(kept[arrays['t_offset'][f]:arrays['t_offset'][f+1]]) for f in redo}
+                redo_matches = self.flattenMatches(arrays, [(f, self.assign(arrays['cost'][f][:, kept_frame[f]])) for f in redo], kept_frame)
+                same = ~np.isin(m_frame, redo)
+                m_frame, m_g, m_t, m_c = [np.concatenate([m[same], m_redo]) for m, m_redo in zip(arrays['matches'], redo_matches)]
+                order = np.argsort(m_frame, kind='stable')
+                m_frame, m_g, m_t, m_c = m_frame[order], m_g[order], m_t[order], m_c[order]
+            seq_matches.append((m_frame, m_g, m_t, m_c))
+
+        return seq_kept, seq_matches
+
+    def prepareSweep(self, association, threshold_list):
+        """
+            Associate at all thresholds of the sweep after the first call of compute3rdPartyMetrics with the
+            given association, in the order of the calls as the scores are averaged again in every call, and
+            record the first call where each track is matched
+        """
+
+        self.threshold_list = threshold_list
+        self.sweep_associations = [association] + [self.associate(threshold) for threshold in threshold_list]
+        for call, (seq_kept, seq_matches) in enumerate(self.sweep_associations):
+            for valid_call, (_, _, m_t, _) in zip(self.valid_call, seq_matches):
+                valid_call[m_t] = np.minimum(valid_call[m_t], call)
+
+    def restoreValid(self, call):
+        """
+            Restore the valid flag of the tracks, which marks the tracks matched in any of the earlier calls of
+            compute3rdPartyMetrics, as if the calls before the given call had been run in this process
+        """
+
+        self.valid = [valid_call < call for valid_call in self.valid_call]
+
+    def compute3rdPartyMetrics(self, threshold=-10000, recall_thres=1.0, association=None, call=None):
     # def compute3rdPartyMetrics(self, threshold=3):
         """
             Computes the metrics defined in
@@ -448,412 +576,136 @@ class trackingEvaluation(object):
                   MOTA, MOTAL, MOTP
                 - Nevatia 2008: Global Data Association for Multi-Object Tracking Using Network Flows
                   MT/PT/ML
+
+            association: the kept tracks and matches from associate(threshold), computed here if None
+            call: index of the call in a sweep run in parallel to restore the valid flag of the tracks
         """
 
-        # construct Munkres object for Hungarian Method association
-        hm = Munkres()
-        max_cost = 1e9
+        # the tracks kept at the threshold and their matches with the ground truth, from the cached assignments
+        if association is None: association = self.associate(threshold)
+        seq_kept, seq_matches = association
+        if call is not None: self.restoreValid(call)
         self.scores = list()
 
-        # go through all frames and associate ground truth and tracker results
-        # groundtruth and tracker contain lists for every single frame containing lists of KITTI format detections
-        fr, ids = 0,0
-        for seq_idx in range(len(self.groundtruth)):
-            seq_gt                = self.groundtruth[seq_idx]
-            seq_dc                = self.dcareas[seq_idx] # don't care areas
-            seq_tracker_before    = self.tracker[seq_idx]
-
-            # remove the tracks with low confidence for each frame
-            tracker_id_score = dict()
-            for frame in range(len(seq_tracker_before)):
-                tracks_tmp = seq_tracker_before[frame]
-                for index in range(len(tracks_tmp)):
-                    trk_tmp = tracks_tmp[index]
-                    id_tmp = trk_tmp.track_id
-                    score_tmp = trk_tmp.score
-            
-                    if id_tmp not in tracker_id_score.keys():
-                        tracker_id_score[id_tmp] = list()
-                    tracker_id_score[id_tmp].append(score_tmp)
-
-            id_average_score = dict()
-            to_delete_id = list()
-            for track_id, score_list in tracker_id_score.items():
-                average_score = sum(score_list) / float(len(score_list))
-                id_average_score[track_id] = average_score
-                if average_score < threshold:
-                    to_delete_id.append(track_id)
-            
-            seq_tracker = list()
-            for frame in range(len(seq_tracker_before)):
-                seq_tracker_frame = list()  
-                tracks_tmp = seq_tracker_before[frame]
-                for index in range(len(tracks_tmp)):
-                    trk_tmp = tracks_tmp[index]
-                    id_tmp = trk_tmp.track_id
-                    average_score = id_average_score[id_tmp] 
-                    trk_tmp.score = average_score
-                    if id_tmp not in to_delete_id:
-                        seq_tracker_frame.append(trk_tmp)
-                seq_tracker.append(seq_tracker_frame)
-
-            seq_trajectories      = defaultdict(list)
-            seq_ignored           = defaultdict(list)
-            
-            # statistics over the current sequence, check the corresponding
-            # variable comments in __init__ to get their meaning
-            seqtp            = 0
-            seqitp           = 0
-            seqfn            = 0
-            seqifn           = 0
-            seqfp            = 0
-            seqigt           = 0
-            seqitr           = 0
-            
-            last_ids = [[],[]]
-            
-            n_gts = 0
-            n_trs = 0
-            
-            for f in range(len(seq_gt)):        # go through each frame
-                g = seq_gt[f]
-                dc = seq_dc[f]
-
-                t = seq_tracker[f]
-                # counting total number of ground truth and tracker objects
-                self.n_gt += len(g)
-                self.n_tr += len(t)
-                
-                n_gts += len(g)
-                n_trs += len(t)
-                
-                # use hungarian method to associate, using box overlap 0..1 as cost
-                # build cost matrix
-                # row is gt, column is det
-                cost_matrix = []
-                this_ids = [[],[]]
-                for gg in g:
-                    # save current ids
-                    this_ids[0].append(gg.track_id)
-                    this_ids[1].append(-1)
-                    gg.tracker       = -1
-                    gg.id_switch     = 0
-                    gg.fragmentation = 0
-                    cost_row         = []
-                    for tt in t:
-                        if self.eval_2diou:
-                            c = 1 - boxoverlap(gg, tt)
-                        elif self.eval_3diou:
-                            c = 1 - iou(gg, tt, metric='iou_3d')
-                        else:
-                            assert False, 'error'
+        # go through all sequences, the statistics of every frame are counted over the flattened ground truth
+        # and tracks of the sequence, check the corresponding variable comments in __init__ to get their meaning
+        n_ignored_tr_total = 0
+        for seq_idx, (arrays, kept, matches) in enumerate(zip(self.seq_arrays, seq_kept, seq_matches)):
+            m_frame, m_g, m_t, m_c = matches
+            g_frame, t_frame, g_ignore = arrays['g_frame'], arrays['t_frame'], arrays['g_ignore']
+            num_frames = len(arrays['g_offset']) - 1
+            def count(frame): return np.bincount(frame, minlength=num_frames)
+
+            # matched tracks are valid from now on, the other tracks are ignored in a neighboring class, under
+            # the minimum height or in a DontCare area
+            self.valid[seq_idx][m_t] = True
+            t_ignored = kept & arrays['t_ignore'] & ~self.valid[seq_idx]
+            g_tracker = np.full(len(g_frame), -1)
+            g_tracker[m_g] = arrays['t_id'][m_t]
+
+            # true positives are only valid associations
+            self.scores += arrays['t_score'][m_t].tolist()
+            self.total_cost = float(np.cumsum(np.concatenate([[self.total_cost], 1 - m_c]))[-1])
+
+            # ignored FN/TP (truncation or neighboring object class), and ignored pairs, i.e. a true positive
+            # which is ignored but where the associated tracker detection has already been ignored
+            n_g, n_t, n_m = np.diff(arrays['g_offset']), count(t_frame[kept]), count(m_frame)
+            ignoredfn       = count(g_frame[(g_tracker < 0) & g_ignore])
+            nignoredtp      = count(g_frame[(g_tracker >= 0) & g_ignore])
+            nignoredtracker = count(t_frame[t_ignored])
+            nignoredpairs   = count(m_frame[g_ignore[m_g] & t_ignored[m_t]])
+
+            # correct TP by number of ignored TP due to truncation
+            # false negatives = non-associated gt bboxes - ignored false negatives
+            # false positives = tracker bboxes - associated tracker bboxes - ignored tracker bboxes
+            tmptp = n_m - nignoredtp
+            tmpfn = n_g - n_m - ignoredfn
+            tmpfp = n_t - tmptp - nignoredtracker - nignoredtp + nignoredpairs
+
+            # sanity checks
+            # - the number of true positives minues ignored true positives
+            #   should be greater or equal to 0
+            # - the number of false negatives should be greater or equal to 0
+            # - the number of false positives needs to be greater or equal to 0
+            #   otherwise ignored detections might be counted double
+            if np.any(tmptp<0):
+                f = np.argmax(tmptp<0); print(seq_idx, f, tmptp[f], nignoredtp[f])
+                raise NameError("Something went wrong! TP is negative")
+            if np.any(tmpfn<0):
+                f = np.argmax(tmpfn<0); print(seq_idx, f, tmpfn[f], n_g[f], n_m[f], ignoredfn[f], nignoredpairs[f])
+                raise NameError("Something went wrong! FN is negative")
+            if np.any(tmpfp<0):
+                f = np.argmax(tmpfp<0); print(seq_idx, f, tmpfp[f], n_t[f], tmptp[f], nignoredtracker[f], nignoredtp[f], nignoredpairs[f])
+                raise NameError("Something went wrong! FP is negative")
+
+            # MODP_t sums up the overlaps of all true positives of a frame in order, and subtracts the overlaps
+            # of the ignored true positives in the order of the ground truth
+            ignoredtp = np.flatnonzero(g_ignore[m_g])
+            ignoredtp = ignoredtp[np.argsort(m_g[ignoredtp], kind='stable')]
+            # bincount adds the weights one by one in their order as the loop over the frame did
+            tmpc = np.bincount(np.concatenate([m_frame, m_frame[ignoredtp]]), \
+                weights=np.concatenate([1 - m_c, m_c[ignoredtp] - 1]), minlength=num_frames)
+            self.MODP_t += np.where(tmptp!=0, tmpc / np.maximum(tmptp, 1), 1).tolist()
+
+            # totals over the frames of the sequence
+            self.n_gt   += int(np.sum(n_g) - np.sum(ignoredfn) - np.sum(nignoredtp))
+            self.n_tr   += int(np.sum(n_t))
+            self.tp     += int(np.sum(n_m))
+            self.itp    += int(np.sum(nignoredtp))
+            self.n_igt  += int(np.sum(ignoredfn) + np.sum(nignoredtp))
+            self.n_itr  += int(np.sum(nignoredtracker))
+            self.n_igttr += int(np.sum(nignoredpairs))
+            self.fn     += int(np.sum(tmpfn))
+            self.ifn    += int(np.sum(ignoredfn))
+            self.fp     += int(np.sum(tmpfp))
 
-                        # gating for box overlap
-                        if c <= 1 - self.min_overlap:
-                            cost_row.append(c)
-                        else:
-                            cost_row.append(max_cost) # = 1e9
-                    cost_matrix.append(cost_row)
-                    # all ground truth trajectories are initially not associated
-                    # extend groundtruth trajectories lists (merge lists)
-                    seq_trajectories[gg.track_id].append(-1)
-                    seq_ignored[gg.track_id].append(False)
-
-                if len(g) == 0:
-                    cost_matrix=[[]]
-                # associate
-                association_matrix = hm.compute(cost_matrix)
-
-                # tmp variables for sanity checks and MODP computation
-                tmptp = 0
-                tmpfp = 0
-                tmpfn = 0
-                tmpc  = 0 # this will sum up the overlaps for all true positives
-                tmpcs = [0]*len(g) # this will save the overlaps for all true positives
-                                   # the reason is that some true positives might be ignored
-                                   # later such that the corrsponding overlaps can
-                                   # be subtracted from tmpc for MODP computation
-                
-                # mapping for tracker ids and ground truth ids
-                for row,col in association_matrix:
-                    # apply gating on box overlap
-                    c = cost_matrix[row][col]
-                    if c < max_cost:
-                        g[row].tracker   = t[col].track_id
-                        this_ids[1][row] = t[col].track_id
-                        t[col].valid     = True
-                        g[row].distance  = c
-                        self.total_cost += 1-c
-                        tmpc            += 1-c
-                        tmpcs[row]      = 1-c
-                        seq_trajectories[g[row].track_id][-1] = t[col].track_id
-
-                        # true positives are only valid associations
-                        self.tp += 1
-                        tmptp   += 1
-                        self.scores.append(t[col].score)
-
-                    else:
-                        g[row].tracker = -1
-                        self.fn       += 1
-                        tmpfn         += 1
-                
-                # associate tracker and DontCare areas
-                # ignore tracker in neighboring classes
-                nignoredtracker = 0 # number of ignored tracker detections
-                ignoredtrackers = dict() # will associate the track_id with -1
-                                         # if it is not ignored and 1 if it is
-                                         # ignored;
-                                         # this is used to avoid double counting ignored
-                                         # cases, see the next loop
-                
-                for tt in t:
-                    ignoredtrackers[tt.track_id] = -1
-                    # ignore detection if it belongs to a neighboring class or is
-                    # smaller or equal to the minimum height
-                    
-                    tt_height = abs(tt.y1 - tt.y2)
-                    if ((self.cls=="car" and tt.obj_type=="van") or (self.cls=="pedestrian" and tt.obj_type=="person_sitting") or tt_height<=self.min_height) and not tt.valid:
-                        nignoredtracker+= 1
-                        tt.ignored      = True
-                        ignoredtrackers[tt.track_id] = 1
-                        continue
-                    for d in dc:
-                        # as KITTI does not provide ground truth 3D box for DontCare objects, we have to use
-                        # 2D IoU here and a threshold of 0.5 for 2D IoU. 
-                        overlap = boxoverlap(tt, d, "a")
-                        if overlap > 0.5 and not tt.valid:
-                            tt.ignored      = True
-                            nignoredtracker += 1
-                            ignoredtrackers[tt.track_id] = 1
-                            break
-
-                # check for ignored FN/TP (truncation or neighboring object class)
-                ignoredfn  = 0 # the number of ignored false negatives
-                nignoredtp = 0 # the number of ignored true positives
-                nignoredpairs = 0 # the number of ignored pairs, i.e. a true positive
-                                  # which is ignored but where the associated tracker
-                                  # detection has already been ignored
-                                  
-                gi = 0
-                for gg in g:
-                    if gg.tracker < 0:
-                        if gg.occlusion>self.max_occlusion or gg.truncation>self.max_truncation\
-                                or (self.cls=="car" and gg.obj_type=="van") or (self.cls=="pedestrian" and gg.obj_type=="person_sitting"):
-                            seq_ignored[gg.track_id][-1] = True                              
-                            gg.ignored = True
-                            ignoredfn += 1
-                            
-                    elif gg.tracker>=0:
-                        if gg.occlusion>self.max_occlusion or gg.truncation>self.max_truncation\
-                                or (self.cls=="car" and gg.obj_type=="van") or (self.cls=="pedestrian" and gg.obj_type=="person_sitting"):
-                            
-                            seq_ignored[gg.track_id][-1] = True
-                            gg.ignored = True
-                            nignoredtp += 1
-                            
-                            # if the associated tracker detection is already ignored,
-                            # we want to avoid double counting ignored detections
-                            if ignoredtrackers[gg.tracker] > 0:
-                                nignoredpairs += 1
-                            
-                            # for computing MODP, the overlaps from ignored detections
-                            # are subtracted
-                            tmpc -= tmpcs[gi]
-                    gi += 1
-                
-                # the below might be confusion, check the comments in __init__
-                # to see what the individual statistics represent
-                
-                # nignoredtp is already associated, but should ignored
-                # ignoredfn is already missed, but should ignored
-
-                # correct TP by number of ignored TP due to truncation
-                # ignored TP are shown as tracked in visualization
-                tmptp -= nignoredtp
-                
-                # count the number of ignored true positives
-                self.itp += nignoredtp
-                
-                # adjust the number of ground truth objects considered
-                # self.n_gt_adjusted = self.n_gt
-                self.n_gt -= (ignoredfn + nignoredtp)
-                
-                # count the number of ignored ground truth objects
-                self.n_igt += ignoredfn + nignoredtp
-                
-                # count the number of ignored tracker objects
-                self.n_itr += nignoredtracker
-                
-                # count the number of ignored pairs, i.e. associated tracker and
-                # ground truth objects that are both ignored
-                self.n_igttr += nignoredpairs
-                
-                # false negatives = associated gt bboxes exceding association threshold + non-associated gt bboxes
-                # 
-
-                # explanation of fn
-                # the original fn is in the matched gt where the score is not high enough
-                # len(g) - len(association amtrix), means that some gt is not matched in hungarian
-                # further - ignoredfn, means that some gt can be ignored
-
-                tmpfn   += len(g)-len(association_matrix)-ignoredfn
-                self.fn += len(g)-len(association_matrix)-ignoredfn
-                # self.fn += len(g)-len(association_matrix)
-                self.ifn += ignoredfn
-                
-                # false positives = tracker bboxes - associated tracker bboxes
-                # mismatches (mme_t)
-                tmpfp   += len(t) - tmptp - nignoredtracker - nignoredtp + nignoredpairs
-                self.fp += len(t) - tmptp - nignoredtracker - nignoredtp + nignoredpairs
-                #tmpfp   = len(t) - tmptp - nignoredtp # == len(t) - (tp - ignoredtp) - ignoredtp
-                #self.fp += len(t) - tmptp - nignoredtp
-
-                # update sequence data
-                seqtp += tmptp
-                seqitp += nignoredtp
-                seqfp += tmpfp
-                seqfn += tmpfn
-                seqifn += ignoredfn
-                seqigt += ignoredfn + nignoredtp
-                seqitr += nignoredtracker
-                
-                # sanity checks
-                # - the number of true positives minues ignored true positives
-                #   should be greater or equal to 0
-                # - the number of false negatives should be greater or equal to 0
-                # - the number of false positives needs to be greater or equal to 0
-                #   otherwise ignored detections might be counted double
-                # - the number of counted true positives (plus ignored ones)
-                #   and the number of counted false negatives (plus ignored ones)
-                #   should match the total number of ground truth objects
-                # - the number of counted true positives (plus ignored ones)
-                #   and the number of counted false positives
-                #   plus the number of ignored tracker detections should
-                #   match the total number of tracker detections; note that
-                #   nignoredpairs is subtracted here to avoid double counting
-                #   of ignored detection sin nignoredtp and nignoredtracker
-                if tmptp<0:
-                    print(tmptp, nignoredtp)
-                    raise NameError("Something went wrong! TP is negative")
-                if tmpfn<0:
-                    print(tmpfn, len(g), len(association_matrix), ignoredfn, nignoredpairs)
-                    raise NameError("Something went wrong! FN is negative")
-                if tmpfp<0:
-                    print(tmpfp, len(t), tmptp, nignoredtracker, nignoredtp, nignoredpairs)
-                    raise NameError("Something went wrong! FP is negative")
-                if tmptp + tmpfn != len(g)-ignoredfn-nignoredtp:
-                    print("seqidx", seq_idx)
-                    print("frame ", f)
-                    print("TP    ", tmptp)
-                    print("FN    ", tmpfn)
-                    print("FP    ", tmpfp)
-                    print("nGT   ", len(g))
-                    print("nAss  ", len(association_matrix))
-                    print("ign GT", ignoredfn)
-                    print("ign TP", nignoredtp)
-                    raise NameError("Something went wrong! nGroundtruth is not TP+FN")
-                if tmptp+tmpfp+nignoredtp+nignoredtracker-nignoredpairs != len(t):
-                    print(seq_idx, f, len(t), tmptp, tmpfp)
-                    print(len(association_matrix), association_matrix)
-                    raise NameError("Something went wrong! nTracker is not TP+FP")
-
-                # check for id switches or Fragmentations               
-                # frag will be more than id switch, switch happens only when id is different but detection exists
-                # frag happens when id switch or detection is missing
-                for i,tt in enumerate(this_ids[0]):
-                    # print(i)
-                    # print(tt)
-                    if tt in last_ids[0]:
-                        idx = last_ids[0].index(tt)
-                        tid = this_ids[1][i]            # id in current tracker corresponding to the gt tt
-                        lid = last_ids[1][idx]          # id in last frame tracker corresponding to the gt tt
-                        if tid != lid and lid != -1 and tid != -1:
-                            if g[i].truncation<self.max_truncation:
-                                g[i].id_switch = 1
-                                ids +=1
-                        if tid != lid and lid != -1:
-                            if g[i].truncation<self.max_truncation:
-                                g[i].fragmentation = 1
-                                fr +=1
-
-                # save current index
-                last_ids = this_ids
-                # compute MOTP_t
-                MODP_t = 1
-                if tmptp!=0:
-                    MODP_t = tmpc/float(tmptp)
-                self.MODP_t.append(MODP_t)
-
-            # remove empty lists for current gt trajectories
-            self.gt_trajectories[seq_idx]             = seq_trajectories
-            self.ign_trajectories[seq_idx]            = seq_ignored
-            
-            # self.num_gt += n_gts
             # gather statistics for "per sequence" statistics.
-            self.n_gts.append(n_gts)
-            self.n_trs.append(n_trs)
-            self.tps.append(seqtp)
-            self.itps.append(seqitp)
-            self.fps.append(seqfp)
-            self.fns.append(seqfn)
-            self.ifns.append(seqifn)
-            self.n_igts.append(seqigt)
-            self.n_itrs.append(seqitr)
-        
-        # compute MT/PT/ML, fragments, idswitches for all groundtruth trajectories
-        n_ignored_tr_total = 0
-        for seq_idx, (seq_trajectories,seq_ignored) in enumerate(zip(self.gt_trajectories, self.ign_trajectories)):
-            if len(seq_trajectories)==0:
+            self.n_gts.append(int(np.sum(n_g)))
+            self.n_trs.append(int(np.sum(n_t)))
+            self.tps.append(int(np.sum(tmptp)))
+            self.itps.append(int(np.sum(nignoredtp)))
+            self.fps.append(int(np.sum(tmpfp)))
+            self.fns.append(int(np.sum(tmpfn)))
+            self.ifns.append(int(np.sum(ignoredfn)))
+            self.n_igts.append(int(np.sum(ignoredfn) + np.sum(nignoredtp)))
+            self.n_itrs.append(int(np.sum(nignoredtracker)))
+
+            # compute MT/PT/ML, fragments, idswitches for all groundtruth trajectories
+            if len(g_frame)==0:
                 continue
-            tmpMT, tmpML, tmpPT, tmpId_switches, tmpFragments = [0]*5
-            n_ignored_tr = 0
-            for g, ign_g in zip(seq_trajectories.values(), seq_ignored.values()):
-                # all frames of this gt trajectory are ignored
-                if all(ign_g):
-                    n_ignored_tr+=1
-                    n_ignored_tr_total+=1
-                    continue
-                # all frames of this gt trajectory are not assigned to any detections
-                if all([this==-1 for this in g]):
-                    tmpML+=1
-                    self.ML+=1
-                    continue
-                # compute tracked frames in trajectory
-                last_id = g[0]
-                # first detection (necessary to be in gt_trajectories) is always tracked
-                tracked = 1 if g[0]>=0 else 0
-                lgt = 0 if ign_g[0] else 1
-                for f in range(1,len(g)):
-                    if ign_g[f]:
-                        last_id = -1
-                        continue
-                    lgt+=1
-                    if last_id != g[f] and last_id != -1 and g[f] != -1 and g[f-1] != -1:
-                        tmpId_switches   += 1
-                        self.id_switches += 1
-                    if f < len(g)-1 and g[f-1] != g[f] and last_id != -1 and g[f] != -1 and g[f+1] != -1:
-                        tmpFragments   += 1
-                        self.fragments += 1
-                    if g[f] != -1:
-                        tracked += 1
-                        last_id = g[f]
-                # handle last frame; tracked state is handled in for loop (g[f]!=-1)
-                if len(g)>1 and g[f-1] != g[f] and last_id != -1  and g[f] != -1 and not ign_g[f]:
-                    tmpFragments   += 1
-                    self.fragments += 1
-
-                # compute MT/PT/ML
-                tracking_ratio = tracked / float(len(g) - sum(ign_g))
-                if tracking_ratio > 0.8:
-                    tmpMT   += 1
-                    self.MT += 1
-                elif tracking_ratio < 0.2:
-                    tmpML   += 1
-                    self.ML += 1
-                else: # 0.2 <= tracking_ratio <= 0.8
-                    tmpPT   += 1
-                    self.PT += 1
+            order = np.argsort(arrays['g_id'], kind='stable')
+            trajectory = arrays['g_id'][order]
+            g, ign_g = g_tracker[order], g_ignore[order]
+            first = np.concatenate([[True], trajectory[1:] != trajectory[:-1]])
+            last = np.concatenate([first[1:], [True]])
+            index = np.cumsum(first) - 1
+            all_ignored = np.bincount(index, weights=~ign_g) == 0
+            all_missed = np.bincount(index, weights=g != -1) == 0
+
+            # the last tracked id before each frame is the id of the first frame, and is reset by ignored frames
+            changed = first | ign_g | (g != -1)
+            changed_id = np.where(ign_g & ~first, -1, g)
+            last_id = np.concatenate([[-1], changed_id[np.maximum.accumulate(np.where(changed, np.arange(len(g)), 0))][:-1]])
+            last_g, next_g = np.concatenate([[-1], g[:-1]]), np.concatenate([g[1:], [-1]])
+
+            # id switches and fragmentations of the frames that are not ignored, the last frame of a trajectory
+            # is fragmented if its id is new
+            counted_trajectory = ~(all_ignored | all_missed)
+            counted = ~first & ~ign_g & counted_trajectory[index]
+            id_switch = counted & (last_id != g) & (last_id != -1) & (g != -1) & (last_g != -1)
+            fragment = counted & (last_g != g) & (g != -1) & (last | ((last_id != -1) & (next_g != -1)))
+            self.id_switches += int(np.sum(id_switch))
+            self.fragments += int(np.sum(fragment))
+
+            # the first frame of a trajectory is always tracked if assigned, the other frames if not ignored
+            tracked = (g[first] >= 0) + np.bincount(index, weights=~first & ~ign_g & (g != -1))
+            not_ignored = np.bincount(index) - np.bincount(index, weights=ign_g)
+            tracking_ratio = tracked[counted_trajectory] / not_ignored[counted_trajectory]
+            n_ignored_tr_total += int(np.sum(all_ignored))
+            self.ML += int(np.sum(all_missed & ~all_ignored))
+            self.MT += int(np.sum(tracking_ratio > 0.8))
+            self.ML += int(np.sum(tracking_ratio < 0.2))
+            self.PT += int(np.sum((tracking_ratio >= 0.2) & (tracking_ratio <= 0.8)))
 
         if (self.n_gt_trajectories-n_ignored_tr_total)==0:
             self.MT = 0.
@@ -1004,7 +856,7 @@ class trackingEvaluation(object):
 
         if threshold is None: summary = self.createSummary_details()
         else: summary = self.createSummary_simple(threshold, recall)
-        mail.msg(summary)       # mail or print the summary.
+        self.mail.msg(summary)       # mail or print the summary.
         print(summary, file=dump)
 
 class stat:
@@ -1120,10 +972,33 @@ class stat:
         self.plot_over_recall(self.fn_list, 'False Negative - Recall Curve', 'False Negative', os.path.join(save_dir, 'FN_recall_curve_%s_%s.pdf' % (self.cls, self.suffix)))
         self.plot_over_recall(self.precision_list, 'Precision - Recall Curve', 'Precision', os.path.join(save_dir, 'precision_recall_curve_%s_%s.pdf' % (self.cls, self.suffix)))
 
-def evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres):
+# evaluators of the classes and the metrics of a threshold, the evaluators are given to the worker processes
+# of the sweep by init_sweep so that they are also set with the spawn start method
+sweep_evaluators = dict()
+sweep_metrics = ['MOTA', 'MOTP', 'MODA', 'MODP', 'sMOTA', 'MT', 'ML', 'id_switches', 'fragments', 'F1', 'precision', \
+    'recall', 'FAR', 'tp', 'fp', 'fn']
+
+def init_sweep(evaluators):
+    sweep_evaluators.clear()
+    sweep_evaluators.update(evaluators)
+
+def sweep_job(job):
+    """
+        Metrics of a class at a threshold of the sweep, the association of the threshold is already cached
+    """
+
+    cls, call, threshold, recall = job
+    e = sweep_evaluators[cls]
+    e.reset()
+    e.compute3rdPartyMetrics(threshold, recall, e.sweep_associations[call], call)
+    return {name: getattr(e, name) for name in sweep_metrics}
+
+def evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres,num_workers=1,assignment='scipy',single_pass=True):
     """
         Entry point for evaluation, will load the data and start evaluation for
-        CAR and PEDESTRIAN if available.
+        CAR and PEDESTRIAN if available. The thresholds of all classes are evaluated
+        by num_workers processes if more than 1. With single_pass, the files are read
+        once for all classes.
     """
     
     # start evaluation and instanciated eval object
@@ -1134,12 +1009,19 @@ def evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres):
     else:
         assert False, 'error'
     classes = []
+    evaluators = OrderedDict()
+
+    # read the tracking results and the ground truth of all classes once, each class selects its rows
+    if single_pass:
+        tracker_labels, gt_labels = trackingEvaluation(t_sha=result_sha, mail=mail, num_hypo=num_hypo).loadLabels()
+    else:
+        tracker_labels, gt_labels = None, None
     # for c in ("car", "pedestrian", "cyclist"):
     for c in ("cyclist", "pedestrian", "car"):
-        e = trackingEvaluation(t_sha=result_sha, mail=mail,cls=c,eval_3diou=eval_3diou,eval_2diou=eval_2diou,num_hypo=num_hypo,thres=thres)
+        e = trackingEvaluation(t_sha=result_sha, mail=mail,cls=c,eval_3diou=eval_3diou,eval_2diou=eval_2diou,num_hypo=num_hypo,thres=thres,assignment=assignment)
         # load tracker data and check provided classes
         try:
-            if not e.loadTracker():
+            if not e.loadTracker(tracker_labels):
                 continue
             mail.msg("Loading Results - Success")
             mail.msg("Evaluate Object Class: %s" % c.upper())
@@ -1149,7 +1031,7 @@ def evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres):
             mail.msg("   Caught exception while loading result data.")
             break
         # load groundtruth data for this class
-        if not e.loadGroundtruth():
+        if not e.loadGroundtruth(gt_labels):
             raise ValueError("Ground truth not found.")
         mail.msg("Loading Groundtruth - Success")
         # sanity checks
@@ -1159,19 +1041,37 @@ def evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres):
         mail.msg("Loaded %d Sequences." % len(e.groundtruth))
         mail.msg("Start Evaluation...")
 
+        # the first call gives the thresholds, and the association at each threshold is computed in order
+        association = e.associate(-10000)
+        e.compute3rdPartyMetrics(association=association)
+        threshold_list, e.recall_list = e.getThresholds(e.scores, e.num_gt)
+        e.prepareSweep(association, threshold_list)
+        evaluators[c] = e
+
+    # evaluate the metrics at all thresholds of all classes
+    jobs = [(c, call, threshold_tmp, recall_tmp) for c, e in evaluators.items() \
+        for call, (threshold_tmp, recall_tmp) in enumerate(zip(e.threshold_list, e.recall_list), 1)]
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers, initializer=init_sweep, initargs=(evaluators,)) as pool:
+            results = pool.map(sweep_job, jobs, chunksize=1)
+    else:
+        init_sweep(evaluators)
+        results = list(map(sweep_job, jobs))
+    sweep_evaluators.clear()
+
+    for c, e in evaluators.items():
         if eval_3diou: suffix = 'eval3D'
         else: suffix = 'eval2D'
         filename = os.path.join(e.t_path, "../summary_%s_average_%s.txt" % (c, suffix)); dump = open(filename, "w+")
         stat_meter = stat(t_sha=result_sha, cls=c, suffix=suffix, dump=dump)
-        e.compute3rdPartyMetrics()
 
         # evaluate the mean average metrics
         best_mota, best_threshold = 0, -10000
-        threshold_list, recall_list = e.getThresholds(e.scores, e.num_gt)
-        for threshold_tmp, recall_tmp in zip(threshold_list, recall_list):
+        for job, result in zip(jobs, results):
+            if job[0] != c: continue
+            threshold_tmp, recall_tmp = job[2], job[3]
+            for name, value in result.items(): setattr(e, name, value)
             data_tmp = dict()
-            e.reset()
-            e.compute3rdPartyMetrics(threshold_tmp, recall_tmp)
             data_tmp['mota'], data_tmp['motp'], data_tmp['moda'], data_tmp['modp'], data_tmp['precision'], \
             data_tmp['F1'], data_tmp['fp'], data_tmp['fn'], data_tmp['recall'], data_tmp['sMOTA'] = \
                 e.MOTA, e.MOTP, e.MODA, e.MODP, e.precision, e.F1, e.fp, e.fn, e.recall, e.sMOTA
@@ -1183,7 +1083,7 @@ def evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres):
             e.saveToStats(dump, threshold_tmp, recall_tmp) 
 
         e.reset()
-        e.compute3rdPartyMetrics(best_threshold)
+        e.compute3rdPartyMetrics(best_threshold, association=e.associate(best_threshold), call=len(e.threshold_list) + 1)
         e.saveToStats(dump) 
 
         stat_meter.output()
@@ -1208,8 +1108,8 @@ if __name__ == "__main__":
 
     # check for correct number of arguments. if user_sha and email are not supplied,
     # no notification email is sent (this option is used for auto-updates)
-    if len(sys.argv)!=3 and len(sys.argv)!=4 and len(sys.argv)!=5:
-        print("Usage: python3 scripts/KITTI/evaluate.py result_sha num_hypothesis(e.g., 1) dimension(e.g., 2D or 3D) thres(e.g., 0.25)")
+    if len(sys.argv)!=3 and len(sys.argv)!=4 and len(sys.argv)!=5 and len(sys.argv)!=6:
+        print("Usage: python3 scripts/KITTI/evaluate.py result_sha num_hypothesis(e.g., 1) dimension(e.g., 2D or 3D) thres(e.g., 0.25) num_workers(e.g., 4)")
         sys.exit(1);
 
     # get unique sha key of submitted results
@@ -1223,13 +1123,17 @@ if __name__ == "__main__":
         elif sys.argv[3] == '3D':
             eval_3diou, eval_2diou = True, False        # eval 3d
         else:
-            print("Usage: python3 scripts/KITTI/evaluate.py result_sha num_hypothesis(e.g., 1) dimension(e.g., 2D or 3D) thres(e.g., 0.25)")
+            print("Usage: python3 scripts/KITTI/evaluate.py result_sha num_hypothesis(e.g., 1) dimension(e.g., 2D or 3D) thres(e.g., 0.25) num_workers(e.g., 4)")
             sys.exit(1);    
-        if len(sys.argv)==5: thres = float(sys.argv[4])
+        if len(sys.argv)>=5: thres = float(sys.argv[4])
         else: thres = None
     else:
         eval_3diou, eval_2diou = True, False        # eval 3d
         thres = None
 
+    # the thresholds of all classes are evaluated in parallel if num_workers is given
+    if len(sys.argv)==6: num_workers = int(sys.argv[5])
+    else: num_workers = 1
+
     # evaluate results
-    success = evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres)
\ No newline at end of file
+    success = evaluate(result_sha,mail,num_hypo,eval_3diou,eval_2diou,thres,num_workers)
\ No newline at end of file
@@ -0,0 +1,102 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# parser of the label files in KITTI tracking format used by the evaluation, the rows of all sequences are
+# returned as columns. The ground truth is parsed once and saved as one .npy file per column, keyed by the
+# split, the class, the loaded classes and the mtime of the label files, and memory-mapped by later runs.
+# The rows of all classes can be loaded at once and then selected for each class
+
+import os, shutil, hashlib, numpy as np
+
+# KITTI tracking benchmark data format:
+# (frame,tracklet_id,objectType,truncation,occlusion,alpha,x1,y1,x2,y2,h,w,l,X,Y,Z,ry,score)
+label_columns = [('frame', int), ('track_id', int), ('obj_type', str), ('truncation', int), ('occlusion', int), \
+    ('obs_angle', float), ('x1', float), ('y1', float), ('x2', float), ('y2', float), ('h', float), ('w', float), \
+    ('l', float), ('x', float), ('y', float), ('z', float), ('ry', float), ('score', float)]
+label_names = [name for name, _ in label_columns]
+cache_version = 1
+
+def loaded_classes(cls):
+    # classes that should be loaded (ignored neighboring classes)
+    if "car" in cls.lower():
+        classes = ["car","van"]
+    elif "pedestrian" in cls.lower():
+        classes = ["pedestrian","person_sitting"]
+    else:
+        classes = [cls.lower()]
+    classes += ["dontcare"]
+    return classes
+
+def parse_labels(filename, classes=None, loading_groundtruth=False):
+    """
+        Rows of a label file of the given classes, or all classes if None, as a list per column, the objects
+        marked as invalid are dropped. The score of the ground truth is -1000, and -1 for tracking results without score.
+        Returns None if the file is not in KITTI format
+    """
+
+    rows = []
+    with open(filename, "r") as f:
+        for line in f:
+            fields = line.strip().split(" ")
+            if classes is not None and not any([s for s in classes if s in fields[2].lower()]):
+                continue
+            if loading_groundtruth: score = -1000
+            elif len(fields) == 17: score = -1
+            elif len(fields) == 18: score = float(fields[17])     # detection score
+            else: return None
+            row = [int(float(fields[0])), int(float(fields[1])), fields[2].lower(), int(float(fields[3])), int(float(fields[4]))] \
+                + [float(field) for field in fields[5:17]] + [score]
+
+            # do not consider objects marked as invalid
+            if row[1] == -1 and row[2] != "dontcare":
+                continue
+            rows.append(row)
+
+    return [list(column) for column in zip(*rows)] if len(rows) > 0 else [[] for _ in label_columns]
+
+def load_labels(root_dir, sequence_name, classes=None, loading_groundtruth=False, cache_dir=None, cache_name=None):
+    """
+        Rows of the label files of all sequences of the given classes, or all classes if None, as a dict of
+        columns and the offset of every sequence in the rows. The columns are memory-mapped from the cache in cache_dir if given, which is written on the
+        first run. Returns None if a file is not in KITTI format
+    """
+
+    filenames = [os.path.join(root_dir, "%s.txt" % s_name) for s_name in sequence_name]
+    if cache_dir is not None:
+        key = [cache_version, classes, loading_groundtruth] + \
+            [(filename, os.stat(filename).st_mtime_ns, os.stat(filename).st_size) for filename in filenames]
+        cache_path = os.path.join(cache_dir, "%s_%s" % (cache_name, hashlib.md5(repr(key).encode()).hexdigest()[:16]))
+        if os.path.isdir(cache_path):
+            columns = {name: np.load(os.path.join(cache_path, "%s.npy" % name), mmap_mode='r') for name in label_names}
+            return columns, np.load(os.path.join(cache_path, "seq_offset.npy"))
+
+    seq_columns = []
+    for filename in filenames:
+        seq_columns.append(parse_labels(filename, classes, loading_groundtruth))
+        if seq_columns[-1] is None: return None
+    seq_offset = np.cumsum([0] + [len(columns[0]) for columns in seq_columns])
+    columns = {name: np.array([value for columns in seq_columns for value in columns[index]], dtype=dtype) \
+        for index, (name, dtype) in enumerate(label_columns)}
+
+    if cache_dir is not None:
+        # write to a temporary folder first, so that parallel evaluations never read a partial cache
+        tmp_path = "%s.tmp%d" % (cache_path, os.getpid())
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, values in columns.items(): np.save(os.path.join(tmp_path, "%s.npy" % name), values)
+        np.save(os.path.join(tmp_path, "seq_offset.npy"), seq_offset)
+        try: os.rename(tmp_path, cache_path)
+        except OSError: shutil.rmtree(tmp_path)
+
+    return columns, seq_offset
+
+def select_labels(labels, classes):
+    """
+        Rows of the given classes from the labels of all classes, the same as loading only these classes
+    """
+
+    columns, seq_offset = labels
+    obj_types = [obj_type for obj_type in np.unique(columns['obj_type']).tolist() if any([s for s in classes if s in obj_type])]
+    selected = np.isin(columns['obj_type'], obj_types)
+    seq_index = np.repeat(np.arange(len(seq_offset) - 1), np.diff(seq_offset))
+    seq_offset = np.cumsum([0] + np.bincount(seq_index[selected], minlength=len(seq_offset) - 1).tolist())
+    return {name: values[selected] for name, values in columns.items()}, seq_offset
@@ -0,0 +1,70 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# micro-benchmark of the batched affinity computation against the per-pair computation on Box3D,
+# also checking that both produce the same affinity matrix within a tolerance
+
+import time, argparse, numpy as np
+from AB3DMOT_libs.box import Box3D
+from AB3DMOT_libs.matching import compute_affinity
+from AB3DMOT_libs.dist_metrics import iou, dist3d, dist_ground, m_distance
+from tests.references import random_boxes
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--num_boxes', type=int, nargs='+', default=[10, 100, 500], help='number of dets/trks')
+    parser.add_argument('--metrics', type=str, nargs='+', default=['iou_2d', 'iou_3d', 'giou_2d', 'giou_3d', \
+        'dist_2d', 'dist_3d', 'm_dis', 'euler'], help='metrics to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs for the batched version')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def compute_affinity_pairwise(dets, trks, metric, trk_inv_inn_matrices=None):
+	# reference implementation looping over every pair of Box3D
+
+	dets = [Box3D.array2bbox(det) for det in dets]
+	trks = [Box3D.array2bbox(trk) for trk in trks]
+	aff_matrix = np.zeros((len(dets), len(trks)), dtype=np.float32)
+	for d, det in enumerate(dets):
+		for t, trk in enumerate(trks):
+			if 'iou' in metric:    	  dist_now = iou(det, trk, metric)            
+			elif metric == 'm_dis':   dist_now = -m_distance(det, trk, trk_inv_inn_matrices[t])
+			elif metric == 'euler':   dist_now = -np.squeeze(m_distance(det, trk, None))
+			elif metric == 'dist_2d': dist_now = -dist_ground(det, trk)              	
+			elif metric == 'dist_3d': dist_now = -dist3d(det, trk)              				
+			else: assert False, 'error'
+			aff_matrix[d, t] = dist_now
+
+	return aff_matrix
+
+def benchmark(num_boxes, metrics, repeat, seed):
+	rng = np.random.RandomState(seed)
+	print('%8s %8s %10s %12s %12s %9s %10s' % ('metric', 'boxes', 'pairs', 'pairwise(s)', 'batched(s)', 'speedup', 'max diff'))
+	for num in num_boxes:
+		dets = random_boxes(num, rng)
+		trks = dets + rng.normal(0, 0.3, dets.shape) * np.array([1, 0.1, 1, 0.2, 0.1, 0.1, 0.1])
+
+		# random positive definite innovation matrix for mahalanobis distance
+		noise = rng.normal(0, 0.1, (num, 7, 7))
+		trk_inn_matrices = np.matmul(noise, noise.transpose(0, 2, 1)) + np.eye(7)
+		trk_inv_inn_matrices, trk_inn_cholesky = np.linalg.inv(trk_inn_matrices), np.linalg.cholesky(trk_inn_matrices)
+
+		for metric in metrics:
+			since = time.time()
+			aff_ref = compute_affinity_pairwise(dets, trks, metric, trk_inv_inn_matrices)
+			time_ref = time.time() - since
+
+			since = time.time()
+			for _ in range(repeat):
+				aff = compute_affinity(dets, trks, metric, trk_inn_cholesky)
+			time_batch = (time.time() - since) / repeat
+
+			max_diff = np.max(np.abs(aff - aff_ref))
+			print('%8s %8d %10d %12.4f %12.4f %8.1fx %10.2e' % (metric, num, num * num, time_ref, \
+				time_batch, time_ref / max(time_batch, 1e-9), max_diff))
+			assert max_diff < 1e-4, 'batched affinity differs from the pairwise affinity for %s' % metric
+
+if __name__ == '__main__':
+	args = parse_args()
+	benchmark(args.num_boxes, args.metrics, args.repeat, args.seed)
@@ -0,0 +1,53 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# micro-benchmark of the data association with the gate against the dense association, the scene grows with
+# the number of boxes at a constant density so that the number of candidate pairs is linear in the boxes.
+# The accepted matches of the greedy matching are checked to be the same as the dense association, the
+# hungarian algorithm always scores all pairs and is not gated
+
+import time, argparse, numpy as np
+from AB3DMOT_libs.matching import data_association
+from tests.references import random_boxes
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--num_boxes', type=int, nargs='+', default=[100, 500, 2000], help='number of dets/trks')
+    parser.add_argument('--metric', type=str, default='giou_3d', help='metric of the association')
+    parser.add_argument('--thres', type=float, default=-0.2, help='threshold of the affinity')
+    parser.add_argument('--gate_radius', type=float, default=10., help='radius of the gate')
+    parser.add_argument('--density', type=float, default=0.01, help='number of boxes per square meter')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def sorted_matches(matches):
+	return matches[np.lexsort((matches[:, 1], matches[:, 0]))]
+
+def benchmark(num_boxes, metric, thres, gate_radius, density, seed):
+	rng = np.random.RandomState(seed)
+	print('%8s %8s %10s %10s %10s %9s %10s' % ('algm', 'boxes', 'matches', 'dense(s)', 'gated(s)', 'speedup', 'same'))
+	for num in num_boxes:
+		dets = random_boxes(num, rng, area=np.sqrt(num / density))
+		trks = dets + rng.normal(0, 0.3, dets.shape) * np.array([1, 0.1, 1, 0.2, 0.1, 0.1, 0.1])
+		trks = trks[rng.permutation(num)[:int(num * 0.9)]] 		# some detections are new objects
+
+		for algm in ['greedy']:
+			since = time.time()
+			matches = data_association(dets, trks, metric, thres, algm)[0]
+			time_dense = time.time() - since
+
+			since = time.time()
+			matches_gated = data_association(dets, trks, metric, thres, algm, gate_radius=gate_radius)[0]
+			time_gated = time.time() - since
+
+			same = np.array_equal(sorted_matches(matches), sorted_matches(matches_gated))
+			print('%8s %8d %10d %10.4f %10.4f %8.1fx %10s' % (algm, num, len(matches), time_dense, time_gated, \
+				time_dense / max(time_gated, 1e-9), same))
+
+			# greedy only accepts pairs above the threshold, which are all within the gate
+			assert same, 'gated greedy matching differs from the dense matching'
+
+if __name__ == '__main__':
+	args = parse_args()
+	benchmark(args.num_boxes, args.metric, args.thres, args.gate_radius, args.density, args.seed)
@@ -0,0 +1,104 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# equivalence suite and micro-benchmark of the closed-form overlap kernel of rotated boxes in the bird's eye view
+# against the previous polygon_clip + ConvexHull implementation, the degenerate cases (identical, touching,
+# containment, ...) are checked against their analytic values since the previous implementation is not
+# robust there, e.g., the clipping of identical boxes produces duplicated vertices and a wrong area
+
+import time, argparse, numpy as np
+from AB3DMOT_libs.box import Box3D
+from AB3DMOT_libs.dist_metrics import compute_bottom, compute_inter_2D, convex_area, iou, iou_batch
+from tests.references import random_boxes, degenerate_cases, legacy_inter_2D, legacy_convex_area
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--num_pairs', type=int, default=20000, help='number of random pairs to check')
+    parser.add_argument('--num_boxes', type=int, nargs='+', default=[10, 100, 500], help='number of boxes for timing')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def check_degenerate():
+	print('%25s %10s %10s %10s %10s %12s %12s' % ('case', 'inter', 'expected', 'convex', 'expected', 'legacy inter', 'legacy convex'))
+	for name, box_a, box_b, inter_gt, convex_gt in degenerate_cases():
+		boxa_bot, boxb_bot = compute_bottom(Box3D.array2bbox(box_a), Box3D.array2bbox(box_b))
+		inter, convex = compute_inter_2D(boxa_bot, boxb_bot), convex_area(boxa_bot, boxb_bot)
+
+		# the previous implementation can fail or warn on these cases, only report its output
+		with np.errstate(all='ignore'):
+			try: legacy_inter = '%.4f' % legacy_inter_2D(boxa_bot, boxb_bot)
+			except Exception: legacy_inter = 'failed'
+			try: legacy_convex = '%.4f' % legacy_convex_area(boxa_bot, boxb_bot)
+			except Exception: legacy_convex = 'failed'
+
+		print('%25s %10.4f %10.4f %10.4f %10.4f %12s %12s' % (name, inter, inter_gt, convex, convex_gt, legacy_inter, legacy_convex))
+		assert abs(inter - inter_gt) < 1e-9, 'wrong intersection area for %s' % name
+		assert abs(convex - convex_gt) < 1e-9, 'wrong enclosing area for %s' % name
+
+		# the batched version should give the same iou and giou as the scalar version
+		for metric in ['iou_2d', 'iou_3d', 'giou_2d', 'giou_3d']:
+			with np.errstate(all='ignore'):
+				scalar = iou(Box3D.array2bbox(box_a), Box3D.array2bbox(box_b), metric)
+				batch = iou_batch(box_a[None], box_b[None], metric)[0, 0]
+			assert np.allclose(scalar, batch, equal_nan=True), 'batched %s differs for %s' % (metric, name)
+
+def check_random(num_pairs, seed):
+	# random pairs in a small area so that most of them overlap, compared to the previous implementation
+
+	rng = np.random.RandomState(seed)
+	boxes_a, boxes_b = random_boxes(num_pairs, rng, area=6.), random_boxes(num_pairs, rng, area=6.)
+	inter_diff, convex_diff, num_overlap = 0., 0., 0
+	for box_a, box_b in zip(boxes_a, boxes_b):
+		boxa_bot, boxb_bot = compute_bottom(Box3D.array2bbox(box_a), Box3D.array2bbox(box_b))
+		inter, legacy_inter = compute_inter_2D(boxa_bot, boxb_bot), legacy_inter_2D(boxa_bot, boxb_bot)
+		convex, legacy_convex = convex_area(boxa_bot, boxb_bot), legacy_convex_area(boxa_bot, boxb_bot)
+		inter_diff = max(inter_diff, abs(inter - legacy_inter))
+		convex_diff = max(convex_diff, abs(convex - legacy_convex))
+		num_overlap += inter > 0
+
+	print('%d random pairs (%d overlapping), max diff of intersection %.2e, enclosing area %.2e' % \
+		(num_pairs, num_overlap, inter_diff, convex_diff))
+	assert inter_diff < 1e-9 and convex_diff < 1e-9, 'closed-form kernel differs from the previous implementation'
+
+def benchmark(num_boxes, seed):
+	rng = np.random.RandomState(seed)
+	print('%8s %8s %10s %12s %12s %12s %9s' % ('metric', 'boxes', 'pairs', 'legacy(s)', 'kernel(s)', 'batched(s)', 'speedup'))
+	for num in num_boxes:
+		dets = random_boxes(num, rng)
+		trks = dets + rng.normal(0, 0.3, dets.shape) * np.array([1, 0.1, 1, 0.2, 0.1, 0.1, 0.1])
+		bboxes_dets = [Box3D.array2bbox(det) for det in dets]
+		bboxes_trks = [Box3D.array2bbox(trk) for trk in trks]
+		for metric in ['iou_3d', 'giou_3d']:
+
+			# per-pair loop with the previous implementation
+			since = time.time()
+			for det in bboxes_dets:
+				for trk in bboxes_trks:
+					boxa_bot, boxb_bot = compute_bottom(det, trk)
+					legacy_inter_2D(boxa_bot, boxb_bot)
+					if 'giou' in metric: legacy_convex_area(boxa_bot, boxb_bot)
+			time_legacy = time.time() - since
+
+			# per-pair loop with the closed-form kernel
+			since = time.time()
+			for det in bboxes_dets:
+				for trk in bboxes_trks: iou(det, trk, metric)
+			time_kernel = time.time() - since
+
+			since = time.time()
+			iou_batch(dets, trks, metric)
+			time_batch = time.time() - since
+
+			print('%8s %8d %10d %12.4f %12.4f %12.4f %8.1fx' % (metric, num, num * num, time_legacy, \
+				time_kernel, time_batch, time_legacy / max(time_batch, 1e-9)))
+
+if __name__ == '__main__':
+	args = parse_args()
+
+	# compile the kernel before timing
+	iou_batch(np.zeros((1, 7)) + 1, np.zeros((1, 7)) + 1, 'giou_3d')
+
+	check_degenerate()
+	check_random(args.num_pairs, args.seed)
+	benchmark(args.num_boxes, args.seed)
@@ -0,0 +1,108 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# validation and micro-benchmark of the hungarian algorithm of the association solved per connected component
+# of the pairs above the lowest affinity, against linear_sum_assignment over the dense N x M affinity matrix.
+# The detections are replayed through the tracker and the inputs of data_association of every frame are
+# recorded, their affinity is solved with the metric of the tracker and with iou_3d, which has a floor of 0
+# for the boxes that do not overlap. Then scenes of growing number of boxes at a constant density are solved
+# with iou_3d. The total affinity of both is checked to be equal, and so are the accepted matches unless there
+# are ties between optimal assignments
+
+import os, glob, time, argparse, numpy as np
+from scipy.optimize import linear_sum_assignment
+from easydict import EasyDict as edict
+import AB3DMOT_libs.model as model
+from AB3DMOT_libs.model import AB3DMOT
+from AB3DMOT_libs.box import Box3D
+from AB3DMOT_libs.io import load_detection, get_frame_det
+from AB3DMOT_libs.matching import compute_affinity, hungarian_matching, data_association
+from tests.references import random_boxes
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--det_root', type=str, default='./data', help='root of datasets')
+    parser.add_argument('--dataset', type=str, default='KITTI', help='KITTI, nuScenes')
+    parser.add_argument('--det_name', type=str, default='pointrcnn', help='name of the detector')
+    parser.add_argument('--cat', type=str, default='Car', help='category to replay')
+    parser.add_argument('--split', type=str, default='val', help='split of detections to replay')
+    parser.add_argument('--num_seq', type=int, default=0, help='number of sequences to replay, all if 0')
+    parser.add_argument('--num_boxes', type=int, nargs='+', default=[100, 500, 1000, 2000, 4000], help='number of dets/trks')
+    parser.add_argument('--iou_thres', type=float, default=0.1, help='threshold of iou_3d')
+    parser.add_argument('--density', type=float, default=0.01, help='number of boxes per square meter')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def record_frames(det_root, dataset, det_name, cat, split, num_seq):
+	# replay the detections through the tracker and record the inputs of data_association
+
+	frames = []
+	def recorder(dets, trks, metric, threshold, *args, **kwargs):
+		if len(dets) > 0 and len(trks) > 0: frames.append((Box3D.bboxes2array(dets), Box3D.bboxes2array(trks)))
+		return data_association(dets, trks, metric, threshold, *args, **kwargs)
+	data_association, model.data_association = model.data_association, recorder
+
+	seq_files = sorted(glob.glob(os.path.join(det_root, dataset, 'detection', '%s_%s_%s' % (det_name, cat, split), '*.txt')))
+	if num_seq > 0: seq_files = seq_files[:num_seq]
+	for seq_file in seq_files:
+		seq_dets, flag = load_detection(seq_file)
+		if not flag: continue
+		cfg = edict(dataset=dataset, det_name=det_name, ego_com=False, vis=False, affi_pro=False, kf_backend='cv')
+		tracker = AB3DMOT(cfg, cat, log=open(os.devnull, 'w'))
+		for frame in range(int(seq_dets[:, 0].max()) + 1):
+			tracker.track(get_frame_det(seq_dets, frame), frame, os.path.basename(seq_file))
+	model.data_association = data_association
+
+	return frames, tracker.metric, tracker.thres, len(seq_files)
+
+def compare(aff_matrix, threshold):
+	# time of both assignments, and whether they have the same accepted matches
+	since = time.time()
+	row_ind, col_ind = linear_sum_assignment(-aff_matrix)
+	np.stack((row_ind, col_ind), axis=1)
+	time_dense = time.time() - since
+	since = time.time()
+	matched_indices = hungarian_matching(aff_matrix, threshold)
+	time_comp = time.time() - since
+
+	total_dense = np.sum(aff_matrix[row_ind, col_ind], dtype=np.float64)
+	total_comp = np.sum(aff_matrix[matched_indices[:, 0], matched_indices[:, 1]], dtype=np.float64)
+	assert len(matched_indices) == len(row_ind), 'not a complete assignment'
+	assert abs(total_dense - total_comp) < 1e-4, 'per-component assignment is not optimal'
+	keep = aff_matrix[row_ind, col_ind] >= threshold
+	matches = np.stack((row_ind[keep], col_ind[keep]), axis=1)
+	same = np.array_equal(matches, matched_indices[aff_matrix[matched_indices[:, 0], matched_indices[:, 1]] >= threshold])
+
+	return time_dense, time_comp, same
+
+def benchmark_frames(frames, metric, thres, iou_thres):
+	print('%8s %8s %10s %10s %12s %9s %10s' % ('metric', 'frames', 'max N x M', 'dense(s)', 'component(s)', 'speedup', 'same'))
+	for metric, thres in [(metric, thres), ('iou_3d', iou_thres)]:
+		time_dense, time_comp, num_same, max_size = 0., 0., 0, 0
+		for dets, trks in frames:
+			time_frame_dense, time_frame_comp, same = compare(compute_affinity(dets, trks, metric), thres)
+			time_dense, time_comp, num_same = time_dense + time_frame_dense, time_comp + time_frame_comp, num_same + same
+			max_size = max(max_size, len(dets) * len(trks))
+		print('%8s %8d %10d %10.4f %12.4f %8.1fx %10d' % (metric, len(frames), max_size, time_dense, time_comp, \
+			time_dense / max(time_comp, 1e-9), num_same))
+
+def benchmark_scenes(num_boxes, iou_thres, density, seed):
+	rng = np.random.RandomState(seed)
+	print('%8s %8s %10s %10s %12s %9s %10s' % ('metric', 'boxes', 'matches', 'dense(s)', 'component(s)', 'speedup', 'same'))
+	for num in num_boxes:
+		dets = random_boxes(num, rng, area=np.sqrt(num / density))
+		trks = dets + rng.normal(0, 0.3, dets.shape) * np.array([1, 0.1, 1, 0.2, 0.1, 0.1, 0.1])
+		trks = trks[rng.permutation(num)[:int(num * 0.9)]] 		# some detections are new objects
+		aff_matrix = compute_affinity(dets, trks, 'iou_3d')
+		time_dense, time_comp, same = compare(aff_matrix, iou_thres)
+		print('%8s %8d %10d %10.4f %12.4f %8.1fx %10s' % ('iou_3d', num, np.sum(aff_matrix.max(axis=1) >= iou_thres), \
+			time_dense, time_comp, time_dense / max(time_comp, 1e-9), same))
+
+if __name__ == '__main__':
+	args = parse_args()
+	hungarian_matching(np.eye(3, dtype=np.float32), 0.5, joint_size=0) 	# compile the kernel
+	frames, metric, thres, num_seq = record_frames(args.det_root, args.dataset, args.det_name, args.cat, args.split, args.num_seq)
+	print('replayed %d sequences of %s %s %s detections' % (num_seq, args.dataset, args.det_name, args.cat))
+	benchmark_frames(frames, metric, thres, args.iou_thres)
+	benchmark_scenes(args.num_boxes, args.iou_thres, args.density, args.seed)
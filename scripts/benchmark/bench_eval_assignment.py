@@ -0,0 +1,97 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# regression check and micro-benchmark of the assignment backends of the evaluation. The matches within the
+# gating of the scipy backend are checked to be the same as munkres on random gated cost matrices with and
+# without ties, then on the cost matrices of every frame of the KITTI evaluation of the given results, and
+# the metrics of all thresholds of the evaluation are checked to be the same with both backends
+
+import os, sys, time, argparse, numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../KITTI'))   # evaluate.py imports its siblings
+import mailpy
+from assignment import assignment_backends
+from evaluate import trackingEvaluation, max_cost, sweep_metrics
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--result_sha', type=str, default='pointrcnn_val_H1', help='name of the KITTI results to evaluate')
+    parser.add_argument('--dimension', type=str, default='3D', help='2D or 3D evaluation')
+    parser.add_argument('--num_checks', type=int, default=1000, help='number of random matrices to check')
+    parser.add_argument('--num_objects', type=int, nargs='+', default=[10, 50, 200], help='number of gt/tracks of random frames')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def gated_matches(cost_matrix, backend):
+	association_matrix = assignment_backends[backend](cost_matrix, max_cost)
+	cost = cost_matrix[association_matrix[:, 0], association_matrix[:, 1]]
+	return association_matrix[cost < max_cost]
+
+def check(num_checks, rng):
+	for check_i in range(num_checks):
+		num_gt, num_trk = rng.randint(0, 30), rng.randint(0, 30)
+		if check_i % 2 == 0: cost_matrix = rng.randint(0, 4, (num_gt, num_trk)) / 4.
+		else: cost_matrix = rng.rand(num_gt, num_trk)
+		cost_matrix[rng.rand(num_gt, num_trk) < rng.rand()] = max_cost
+		assert np.array_equal(gated_matches(cost_matrix, 'scipy'), gated_matches(cost_matrix, 'munkres')), 'matches differ'
+	print('same matches on %d random cost matrices' % num_checks)
+
+def benchmark_random(num_objects, rng):
+	# frames with a growing number of objects where each gt has a few tracks within the gating
+	print('%12s %12s %12s %9s' % ('objects', 'munkres(s)', 'scipy(s)', 'speedup'))
+	for num in num_objects:
+		cost_matrix = rng.rand(num, num)
+		cost_matrix[rng.rand(num, num) > 3. / num] = max_cost
+		time_backend, matches = dict(), dict()
+		for backend in ['munkres', 'scipy']:
+			since = time.time()
+			matches[backend] = gated_matches(cost_matrix, backend)
+			time_backend[backend] = time.time() - since
+		assert np.array_equal(matches['munkres'], matches['scipy']), 'matches differ'
+		print('%12d %12.4f %12.4f %8.1fx' % (num, time_backend['munkres'], time_backend['scipy'], \
+			time_backend['munkres'] / max(time_backend['scipy'], 1e-9)))
+
+def evaluator(result_sha, cls, dimension, backend):
+	e = trackingEvaluation(t_sha=result_sha, mail=mailpy.Mail(""), cls=cls, eval_3diou=dimension=='3D', \
+		eval_2diou=dimension=='2D', assignment=backend)
+	if not e.loadTracker() or not e.loadGroundtruth(): return None
+	return e
+
+def benchmark(result_sha, dimension):
+	print('%12s %8s %12s %12s %9s %8s %10s' % ('class', 'frames', 'munkres(s)', 'scipy(s)', 'speedup', 'same', 'metrics'))
+	for cls in ('cyclist', 'pedestrian', 'car'):
+		evaluators = {backend: evaluator(result_sha, cls, dimension, backend) for backend in ['munkres', 'scipy']}
+		if evaluators['munkres'] is None: continue
+
+		# assignment of the cost matrices of all frames
+		e = evaluators['munkres']
+		e.buildArrays()
+		cost_matrices = [cost_matrix for arrays in e.seq_arrays for cost_matrix in arrays['cost']]
+		time_backend, matches = dict(), dict()
+		for backend in ['munkres', 'scipy']:
+			since = time.time()
+			matches[backend] = [gated_matches(cost_matrix, backend) for cost_matrix in cost_matrices]
+			time_backend[backend] = time.time() - since
+		num_same = sum(np.array_equal(m, s) for m, s in zip(matches['munkres'], matches['scipy']))
+
+		# metrics of all thresholds of the evaluation
+		metrics = dict()
+		for backend, e in evaluators.items():
+			e.compute3rdPartyMetrics()
+			metrics[backend] = []
+			for threshold in e.getThresholds(e.scores, e.num_gt)[0]:
+				e.reset()
+				e.compute3rdPartyMetrics(threshold)
+				metrics[backend].append([getattr(e, name) for name in sweep_metrics])
+		same_metrics = metrics['munkres'] == metrics['scipy']
+
+		print('%12s %8d %12.4f %12.4f %8.1fx %8d %10s' % (cls, len(cost_matrices), time_backend['munkres'], \
+			time_backend['scipy'], time_backend['munkres'] / max(time_backend['scipy'], 1e-9), num_same, same_metrics))
+		assert num_same == len(cost_matrices) and same_metrics, 'assignment backends differ'
+
+if __name__ == '__main__':
+	args = parse_args()
+	rng = np.random.RandomState(args.seed)
+	check(args.num_checks, rng)
+	benchmark_random(args.num_objects, rng)
+	benchmark(args.result_sha, args.dimension)
@@ -0,0 +1,56 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# validation and micro-benchmark of the compiled greedy matching against the loop over all sorted pairs it
+# replaces, the matches are checked to be the same on random cost matrices with and without ties, then both
+# are timed on the cost matrices of a scene growing at a constant density as in bench_association
+
+import time, argparse, numpy as np
+from AB3DMOT_libs.matching import greedy_matching, compute_affinity
+from tests.references import random_boxes, greedy_matching_loop
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--num_boxes', type=int, nargs='+', default=[100, 500, 2000], help='number of dets/trks')
+    parser.add_argument('--thres', type=float, default=-0.2, help='threshold of the giou_3d affinity')
+    parser.add_argument('--density', type=float, default=0.01, help='number of boxes per square meter')
+    parser.add_argument('--num_checks', type=int, default=1000, help='number of random matrices to check')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def check(num_checks, rng):
+	for check_i in range(num_checks):
+		num_dets, num_trks = rng.randint(1, 60), rng.randint(1, 60)
+		if check_i % 2 == 0: cost_matrix = rng.randint(0, 5, (num_dets, num_trks)).astype(np.float32)
+		else: cost_matrix = rng.rand(num_dets, num_trks).astype(np.float32)
+		max_cost = rng.choice([np.inf, 0.5, 2.])
+		for partial_size in [16, 65536]:
+			matches = greedy_matching(cost_matrix, max_cost, partial_size=partial_size)
+			assert np.array_equal(matches, greedy_matching_loop(cost_matrix, max_cost)), 'greedy matching differs'
+	print('same matches on %d random cost matrices' % num_checks)
+
+def benchmark(num_boxes, thres, density, rng):
+	print('%8s %10s %10s %10s %9s' % ('boxes', 'matches', 'loop(s)', 'kernel(s)', 'speedup'))
+	for num in num_boxes:
+		dets = random_boxes(num, rng, area=np.sqrt(num / density))
+		trks = dets + rng.normal(0, 0.3, dets.shape) * np.array([1, 0.1, 1, 0.2, 0.1, 0.1, 0.1])
+		cost_matrix = -compute_affinity(dets, trks[rng.permutation(num)], 'giou_3d')
+
+		since = time.time()
+		matches_loop = greedy_matching_loop(cost_matrix, -thres)
+		time_loop = time.time() - since
+
+		since = time.time()
+		matches = greedy_matching(cost_matrix, -thres)
+		time_kernel = time.time() - since
+
+		assert np.array_equal(matches, matches_loop), 'greedy matching differs'
+		print('%8d %10d %10.4f %10.4f %8.1fx' % (num, len(matches), time_loop, time_kernel, time_loop / max(time_kernel, 1e-9)))
+
+if __name__ == '__main__':
+	args = parse_args()
+	rng = np.random.RandomState(args.seed)
+	greedy_matching(np.zeros((1, 1), dtype=np.float32)) 		# compile the kernel
+	check(args.num_checks, rng)
+	benchmark(args.num_boxes, args.thres, args.density, rng)
@@ -0,0 +1,87 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# validation and micro-benchmark of the Kalman filter backends of TrackBank, the recorded KITTI detections
+# are replayed through one tracker per backend in lockstep and the states and covariances of all tracks are
+# compared to the filterpy backend after every frame, then the prediction and update are timed on random tracks
+
+import os, glob, time, argparse, numpy as np
+from easydict import EasyDict as edict
+from AB3DMOT_libs.model import AB3DMOT
+from AB3DMOT_libs.io import load_detection, get_frame_det
+from AB3DMOT_libs.kalman_filter import TrackBank
+from tests.references import random_boxes
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--det_root', type=str, default='./data/KITTI/detection', help='root of detections')
+    parser.add_argument('--det_name', type=str, default='pointrcnn', help='name of the detector')
+    parser.add_argument('--split', type=str, default='val', help='split of detections to replay')
+    parser.add_argument('--num_tracks', type=int, nargs='+', default=[10, 100, 1000], help='number of tracks for timing')
+    parser.add_argument('--repeat', type=int, default=20, help='number of runs for timing')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def replay(det_root, det_name, split, backends=['cv', 'dense'], reference='filterpy'):
+	# run one tracker per backend on the same detections, compare to the reference backend after each frame
+
+	max_diff = {backend: [0., 0.] for backend in backends}			# relative diff of states and covariances
+	num_frames = 0
+	for cat in ['Car', 'Pedestrian', 'Cyclist']:
+		seq_files = sorted(glob.glob(os.path.join(det_root, '%s_%s_%s' % (det_name, cat, split), '*.txt')))
+		for seq_file in seq_files:
+			seq_dets, flag = load_detection(seq_file)
+			if not flag: continue
+
+			trackers = dict()
+			for backend in [reference] + backends:
+				cfg = edict(dataset='KITTI', det_name=det_name, ego_com=False, vis=False, affi_pro=False, kf_backend=backend)
+				trackers[backend] = AB3DMOT(cfg, cat, log=open(os.devnull, 'w'))
+
+			for frame in range(int(seq_dets[:, 0].max()) + 1):
+				dets_frame = get_frame_det(seq_dets, frame)
+				outputs = {backend: trackers[backend].track(dets_frame, frame, os.path.basename(seq_file))[0][0] \
+					for backend in trackers}
+				bank_ref = trackers[reference].trackers
+				for backend in backends:
+					bank = trackers[backend].trackers
+					assert np.array_equal(bank.id, bank_ref.id), 'tracks differ from %s in %s' % (reference, seq_file)
+					x_diff = np.abs(bank.x - bank_ref.x) / (1 + np.abs(bank_ref.x))
+					P_diff = np.abs(bank.P - bank_ref.P) / (1 + np.abs(bank_ref.P))
+					max_diff[backend][0] = max(max_diff[backend][0], np.max(x_diff, initial=0))
+					max_diff[backend][1] = max(max_diff[backend][1], np.max(P_diff, initial=0))
+					assert outputs[backend].shape == outputs[reference].shape, 'outputs differ from %s' % reference
+				num_frames += 1
+
+	print('replayed %d frames of KITTI %s detections' % (num_frames, split))
+	for backend in backends:
+		print('%10s: max relative diff to %s, states %.2e, covariances %.2e' % (backend, reference, \
+			max_diff[backend][0], max_diff[backend][1]))
+		assert max(max_diff[backend]) < 1e-8, '%s differs from %s' % (backend, reference)
+
+def benchmark(num_tracks, repeat, seed, backends=['filterpy', 'dense', 'cv']):
+	rng = np.random.RandomState(seed)
+	print('%10s %8s %14s %14s' % ('backend', 'tracks', 'predict(ms)', 'update(ms)'))
+	for num in num_tracks:
+		boxes = random_boxes(num, rng)
+		measurements = boxes + rng.normal(0, 0.1, boxes.shape)
+		for backend in backends:
+			bank = TrackBank(backend=backend)
+			bank.birth(boxes, np.zeros((num, 0)), np.arange(num))
+
+			since = time.time()
+			for _ in range(repeat): bank.predict()
+			time_predict = (time.time() - since) / repeat
+
+			index = np.arange(num)
+			since = time.time()
+			for _ in range(repeat): bank.update(index, measurements)
+			time_update = (time.time() - since) / repeat
+
+			print('%10s %8d %14.3f %14.3f' % (backend, num, time_predict * 1000, time_update * 1000))
+
+if __name__ == '__main__':
+	args = parse_args()
+	replay(args.det_root, args.det_name, args.split)
+	benchmark(args.num_tracks, args.repeat, args.seed)
@@ -0,0 +1,88 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# validation and micro-benchmark of the mahalanobis distance with the cholesky factors of the innovation
+# matrices against the previous inverse of each innovation matrix, and of the data association of m_dis
+# with the chi-square gate against the dense association. The scene grows with the number of boxes at a
+# constant density as in bench_association, the accepted matches of the greedy matching are checked to be
+# the same with and without the gate, the hungarian algorithm is not gated
+
+import time, argparse, numpy as np
+from scipy.stats import chi2
+from AB3DMOT_libs.dist_metrics import m_distance_batch
+from AB3DMOT_libs.matching import data_association
+from tests.references import random_boxes
+from scripts.benchmark.bench_association import sorted_matches
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--num_boxes', type=int, nargs='+', default=[100, 500, 2000], help='number of dets/trks')
+    parser.add_argument('--thres', type=float, default=-3., help='threshold of the affinity, i.e., negative distance')
+    parser.add_argument('--prob', type=float, default=0.99, help='probability of the chi-square gate')
+    parser.add_argument('--density', type=float, default=0.01, help='number of boxes per square meter')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def m_distance_inverse(dets, trks, trk_innovation_matrix):
+	# previous mahalanobis distance, the innovation matrix of each track is inverted one by one
+
+	trk_inv_inn_matrices = np.stack([np.linalg.inv(m) for m in trk_innovation_matrix])
+	diff = dets[:, None, :7] - trks[None, :, :7]
+	yaw_diff = diff[..., 3]
+	yaw_diff = np.where(yaw_diff > np.pi / 2, yaw_diff - np.pi, yaw_diff)
+	yaw_diff = np.where(yaw_diff < -np.pi / 2, yaw_diff + np.pi, yaw_diff)
+	diff[..., 3] = yaw_diff
+	return np.sqrt(np.einsum('nmi,mij,nmj->nm', diff, trk_inv_inn_matrices, diff))
+
+def random_innovation(num, rng):
+	# innovation matrices of tracks of different ages, S = HPH' + R with the position more uncertain
+
+	noise = rng.normal(0, 0.2, (num, 7, 7))
+	scale = rng.uniform(1., 3., (num, 1, 1)) * np.diag([2., 1., 2., 1., 1., 1., 1.])
+	return np.matmul(noise, noise.transpose(0, 2, 1)) + scale
+
+def benchmark(num_boxes, thres, prob, density, seed):
+	rng = np.random.RandomState(seed)
+	chi2_gate = max(chi2.ppf(prob, 7), thres ** 2)
+	data_association(np.zeros((1, 7)), np.zeros((1, 7)), 'm_dis', thres, 'greedy', np.eye(7)[None]) 	# compile the kernels
+	print('chi-square gate %.2f' % chi2_gate)
+	print('%8s %8s %12s %12s %9s %10s' % ('', 'boxes', 'inverse(s)', 'cholesky(s)', 'speedup', 'max diff'))
+	for num in num_boxes:
+		dets = random_boxes(num, rng, area=np.sqrt(num / density))
+		trks = dets + rng.normal(0, 0.3, dets.shape) * np.array([1, 0.1, 1, 0.2, 0.1, 0.1, 0.1])
+		trks = trks[rng.permutation(num)[:int(num * 0.9)]] 		# some detections are new objects
+		trk_innovation_matrix = random_innovation(len(trks), rng)
+
+		since = time.time()
+		dist_ref = m_distance_inverse(dets, trks, trk_innovation_matrix)
+		time_ref = time.time() - since
+
+		since = time.time()
+		dist = m_distance_batch(dets, trks, np.linalg.cholesky(trk_innovation_matrix))
+		time_chol = time.time() - since
+
+		max_diff = np.max(np.abs(dist - dist_ref))
+		print('%8s %8d %12.4f %12.4f %8.1fx %10.2e' % ('distance', num, time_ref, time_chol, \
+			time_ref / max(time_chol, 1e-9), max_diff))
+		assert max_diff < 1e-6, 'mahalanobis distance differs'
+
+		for algm in ['greedy']:
+			since = time.time()
+			matches = data_association(dets, trks, 'm_dis', thres, algm, trk_innovation_matrix)[0]
+			time_dense = time.time() - since
+
+			since = time.time()
+			matches_gated = data_association(dets, trks, 'm_dis', thres, algm, trk_innovation_matrix, chi2_gate=chi2_gate)[0]
+			time_gated = time.time() - since
+
+			same = np.array_equal(sorted_matches(matches), sorted_matches(matches_gated))
+			print('%8s %8d %12.4f %12.4f %8.1fx %10s' % (algm, num, time_dense, time_gated, \
+				time_dense / max(time_gated, 1e-9), same))
+
+			# greedy only accepts pairs above the threshold, which are all within the gate
+			assert same, 'gated greedy matching differs from the dense matching'
+
+if __name__ == '__main__':
+	args = parse_args()
+	benchmark(args.num_boxes, args.thres, args.prob, args.density, args.seed)
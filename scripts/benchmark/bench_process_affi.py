@@ -0,0 +1,105 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# validation and micro-benchmark of the post-processing of the affinity matrix with the maps from ID to
+# index against the previous post-processing searching the lists of IDs, the output matrices are checked
+# to be the same on random frames of growing number of tracks. The output is a past outputs x current outputs
+# matrix, so the time is also shown per entry of the output, which stays constant with the maps, i.e., the
+# ID lookups are linear in the number of outputs and the cost is dominated by filling the output matrix
+
+import time, argparse, numpy as np
+from easydict import EasyDict as edict
+from AB3DMOT_libs.model import AB3DMOT
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--num_trks', type=int, nargs='+', default=[100, 1000, 3000], help='number of past tracks')
+    parser.add_argument('--repeat', type=int, default=3, help='number of repeats of each frame')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    return args
+
+def process_affi_search(tracker, affi, det2trk, unmatched_dets, new_id_list):
+	# previous post-processing, each ID is searched in the lists of IDs
+
+	trk_id = tracker.id_past
+	matched = det2trk >= 0
+	det_id = np.empty(affi.shape[0], dtype=int)
+	det_id[matched] = np.asarray(trk_id, dtype=int)[det2trk[matched]]
+	det_id[unmatched_dets] = new_id_list
+	det_id = det_id.tolist()
+
+	affi = affi.transpose()
+	permute_row = list()
+	for output_id_tmp in tracker.id_past_output:
+		permute_row.append(trk_id.index(output_id_tmp))
+	affi = affi[permute_row, :]
+
+	max_index = affi.shape[1]
+	permute_col = list()
+	to_fill_col, to_fill_id = list(), list()
+	for output_id_tmp in tracker.id_now_output:
+		try:
+			index = det_id.index(output_id_tmp)
+		except:
+			index = max_index
+			max_index += 1
+			to_fill_col.append(index); to_fill_id.append(output_id_tmp)
+		permute_col.append(index)
+
+	append = np.zeros((affi.shape[0], max_index - affi.shape[1]))
+	append.fill(tracker.min_sim)
+	affi = np.concatenate([affi, append], axis=1)
+	for count in range(len(to_fill_col)):
+		row_index = tracker.id_past_output.index(to_fill_id[count])
+		affi[row_index, to_fill_col[count]] = tracker.max_sim
+	affi = affi[:, permute_col]
+
+	return affi
+
+def random_frame(tracker, num_trks, rng):
+	# a frame with num_trks past tracks, 90% of them output in the past frame, 80% matched to a detection,
+	# and 10% of new detections born in a random order, the current outputs are the matched and the unmatched
+	# past outputs
+
+	trk_id = np.sort(rng.choice(10 * num_trks, num_trks, replace=False)) + 1
+	past_output = np.sort(rng.choice(num_trks, int(num_trks * 0.9), replace=False))
+	num_dets = int(num_trks * 0.9)
+	det2trk = np.full(num_dets, -1, dtype=int)
+	det2trk[rng.choice(num_dets, int(num_trks * 0.8), replace=False)] = rng.choice(num_trks, int(num_trks * 0.8), replace=False)
+	unmatched_dets = rng.permutation(np.flatnonzero(det2trk < 0))
+	new_id_list = list(range(10 * num_trks + 1, 10 * num_trks + 1 + len(unmatched_dets)))
+
+	output = np.union1d(past_output, det2trk[det2trk >= 0])
+	tracker.id_past = trk_id.tolist()
+	tracker.id_past_output = trk_id[past_output].astype(float).tolist()
+	tracker.id_now_output = np.concatenate([trk_id[output], new_id_list]).astype(float).tolist()
+	affi = rng.uniform(-1, 1, (num_dets, num_trks)).astype(np.float32)
+
+	return affi, det2trk, unmatched_dets, new_id_list
+
+def benchmark(num_trks, repeat, seed):
+	rng = np.random.RandomState(seed)
+	cfg = edict(dataset='KITTI', det_name='pointrcnn', ego_com=False, vis=False, affi_pro=True)
+	tracker = AB3DMOT(cfg, 'Car', log=None)
+	print('%8s %8s %12s %12s %9s %16s' % ('trks', 'outputs', 'search(s)', 'maps(s)', 'speedup', 'maps(ns/entry)'))
+	for num in num_trks:
+		affi, det2trk, unmatched_dets, new_id_list = random_frame(tracker, num, rng)
+		num_outputs = len(tracker.id_now_output)
+		num_entries = len(tracker.id_past_output) * num_outputs
+
+		since = time.time()
+		for _ in range(repeat): affi_ref = process_affi_search(tracker, affi, det2trk, unmatched_dets, new_id_list)
+		time_search = (time.time() - since) / repeat
+
+		since = time.time()
+		for _ in range(repeat): affi_maps = tracker.process_affi(affi, det2trk, unmatched_dets, new_id_list)
+		time_maps = (time.time() - since) / repeat
+
+		assert np.array_equal(affi_ref, affi_maps), 'post-processed affinity differs'
+		print('%8d %8d %12.4f %12.4f %8.1fx %16.2f' % (num, num_outputs, time_search, time_maps, \
+			time_search / max(time_maps, 1e-9), time_maps / num_entries * 1e9))
+
+if __name__ == '__main__':
+	args = parse_args()
+	benchmark(args.num_trks, args.repeat, args.seed)
@@ -20,21 +20,25 @@
 """
 
 import matplotlib; matplotlib.use('Agg')
-import sys, os, copy, math, numpy as np, matplotlib.pyplot as plt
-from scripts.KITTI.munkres import Munkres
+import sys, os, copy, math, multiprocessing, numpy as np, matplotlib.pyplot as plt
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../KITTI'))   # siblings of scripts/KITTI/evaluate.py
+from assignment import assignment_backends
+from label_cache import label_names, loaded_classes, load_labels, select_labels
 from collections import defaultdict
 try:
     from ordereddict import OrderedDict # can be installed using pip
 except:
     from collections import OrderedDict # only included from python 2.7 on
 
-import scripts.KITTI.mailpy as mailpy
+import mailpy
 
 eval_3diou, eval_2diou = True, False        # eval 3d
 eval_metrics = 'dist'
 dist_threshold = 2
 num_sample_pts = 41.0
+assignment = 'scipy'            # backend of the hungarian method, see scripts/KITTI/assignment.py
 results_dir = './results/nuScenes'
+tdata_names = [{'x': 'X', 'y': 'Y', 'z': 'Z', 'ry': 'yaw'}.get(name, name) for name in label_names]    # arguments of tData
 
 def get_dist(gg, tt):
     loc_g = np.array([gg.X, gg.Y, gg.Z])
@@ -46,6 +50,10 @@ class tData:
     """
         Utility class to load data.
     """
+    # one object is created for every box, slots keep it small
+    __slots__ = ('frame', 'track_id', 'obj_type', 'truncation', 'occlusion', 'obs_angle', 'x1', 'y1', 'x2', 'y2', 'w', 'h', 'l', 'X', 'Y', 'Z', \
+        'yaw', 'score', 'ignored', 'valid', 'tracker', 'id_switch', 'fragmentation', 'distance')
+
     def __init__(self,frame=-1,obj_type="unset",truncation=-1,occlusion=-1,\
                  obs_angle=-10,x1=-1,y1=-1,x2=-1,y2=-1,w=-1,h=-1,l=-1,\
                  X=-1000,Y=-1000,Z=-1000,yaw=-10,score=-1000,track_id=-1):
@@ -81,8 +89,8 @@ class tData:
             Print read data.
         """
         
-        attrs = vars(self)
-        return '\n'.join("%s: %s" % item for item in attrs.items())
+        attrs = [(name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name)]
+        return '\n'.join("%s: %s" % item for item in attrs)
 
 class trackingEvaluation(object):
     """ tracking statistics (CLEAR MOT, id-switches, fragments, ML/PT/MT, precision/recall)
@@ -103,7 +111,7 @@ class trackingEvaluation(object):
     """
 
     def __init__(self, t_sha, gt_path='./data/nuScenes/nuKITTI/tracking', max_truncation = 0, min_height = 25, \
-        max_occlusion = 2, mail=None, cls="car", num_hypo=1, split='val'):
+        max_occlusion = 2, mail=None, cls="car", num_hypo=1, split='val', gt_cache_dir=os.path.join(results_dir, 'gt_cache')):
 
         # get number of sequences and
         # get number of frames per sequence from test mapping
@@ -128,6 +136,8 @@ class trackingEvaluation(object):
 
         # data and parameter
         self.gt_path           = os.path.join(gt_path, split, "label_02")
+        self.split             = split
+        self.gt_cache_dir      = gt_cache_dir   # cache of the parsed ground truth, None to always parse the label files
         self.t_sha             = t_sha
         self.t_path            = os.path.join(results_dir, t_sha, "data_%d" % (int(num_hypo)-1))
         self.ids_save_file     = os.path.join(results_dir, t_sha, "ids_%d_%s.json" % (int(num_hypo)-1, self.cls))
@@ -193,99 +203,80 @@ class trackingEvaluation(object):
         self.gt_trajectories            = [[] for x in range(self.n_sequences)]
         self.ign_trajectories           = [[] for x in range(self.n_sequences)]
 
-    def loadGroundtruth(self):
+    def loadLabels(self):
+        """
+            Helper function to read the tracker data and ground truth of all classes at once, every class
+            then selects its rows with loadTracker(labels) and loadGroundtruth(labels). None if not readable
         """
-            Helper function to load ground truth.
+
+        try:
+            tracker_labels = load_labels(self.t_path, self.sequence_name)
+        except IOError:
+            tracker_labels = None
+        try:
+            gt_labels = load_labels(self.gt_path, self.sequence_name, loading_groundtruth=True, \
+                cache_dir=self.gt_cache_dir, cache_name="%s_all" % self.split)
+        except IOError:
+            gt_labels = None
+        return tracker_labels, gt_labels
+
+    def loadGroundtruth(self, labels=None):
+        """
+            Helper function to load ground truth, selected from the labels of all classes if given.
         """
         
         try:
-            self._loadData(self.gt_path, cls=self.cls, loading_groundtruth=True)
+            self._loadData(self.gt_path, cls=self.cls, loading_groundtruth=True, labels=labels)
         except IOError:
             return False
         return True
 
-    def loadTracker(self):
+    def loadTracker(self, labels=None):
         """
-            Helper function to load tracker data.
+            Helper function to load tracker data, selected from the labels of all classes if given.
         """
         
         try:
-            if not self._loadData(self.t_path, cls=self.cls, loading_groundtruth=False):
+            if not self._loadData(self.t_path, cls=self.cls, loading_groundtruth=False, labels=labels):
                 return False
         except IOError:
             return False
         return True
 
-    def _loadData(self, root_dir, cls, min_score=-1000, loading_groundtruth=False):
+    def _loadData(self, root_dir, cls, min_score=-1000, loading_groundtruth=False, labels=None):
         """
             Generic loader for ground truth and tracking data.
             Use loadGroundtruth() or loadTracker() to load this data.
-            Loads detections in KITTI format from textfiles.
+            Loads detections in KITTI format from textfiles, or selects them from the labels of all classes.
         """
-        # construct objectDetections object to hold detection data
-        t_data  = tData()
-        data    = []
-        eval_2d = True
-        eval_3d = True
+        # rows of the classes to load of all sequences, the ground truth is parsed once and cached
+        if labels is not None:
+            labels = select_labels(labels, loaded_classes(cls))
+        elif loading_groundtruth:
+            labels = load_labels(root_dir, self.sequence_name, loaded_classes(cls), loading_groundtruth=True, \
+                cache_dir=self.gt_cache_dir, cache_name="%s_%s" % (self.split, cls.lower()))
+        else:
+            labels = load_labels(root_dir, self.sequence_name, loaded_classes(cls))
+        if labels is None:
+            self.mail.msg("file is not in KITTI format")
+            return
+        columns, seq_offset = labels
+
+        # check if uploaded data provides information for 2D and 3D evaluation
+        eval_2d = not np.any((columns['x1']==-1) | (columns['x2']==-1) | (columns['y1']==-1) | (columns['y2']==-1))
+        eval_3d = not np.any((columns['x']==-1000) | (columns['y']==-1000) | (columns['z']==-1000))
 
         seq_data           = []
         n_trajectories     = 0
         n_trajectories_seq = []
-        for seq, s_name in enumerate(self.sequence_name):
-            i              = 0
-            filename       = os.path.join(root_dir, "%s.txt" % s_name)
-            f              = open(filename, "r")
-
+        for seq in range(len(self.sequence_name)):
             f_data         = [[] for x in range(self.n_frames[seq])] # current set has only 1059 entries, sufficient length is checked anyway
-            ids            = []
+            ids            = set()
             n_in_seq       = 0
-            id_frame_cache = []
-            for line in f:
-                # KITTI tracking benchmark data format:
-                # (frame,tracklet_id,objectType,truncation,occlusion,alpha,x1,y1,x2,y2,h,w,l,X,Y,Z,ry)
-                line = line.strip()
-                fields            = line.split(" ")
-                # classes that should be loaded (ignored neighboring classes)
-                if "car" in cls.lower():
-                    classes = ["car","van"]
-                elif "pedestrian" in cls.lower():
-                    classes = ["pedestrian","person_sitting"]
-                # elif "cyclist" in cls.lower()::
-                else:
-                    classes = [cls.lower()]
-                classes += ["dontcare"]
-                if not any([s for s in classes if s in fields[2].lower()]):
-                    continue
-                # get fields from table
-                t_data.frame        = int(float(fields[0]))     # frame
-                t_data.track_id     = int(float(fields[1]))     # id
-                t_data.obj_type     = fields[2].lower()         # object type [car, pedestrian, cyclist, ...]
-                t_data.truncation   = int(float(fields[3]))     # truncation [-1,0,1,2]
-                t_data.occlusion    = int(float(fields[4]))     # occlusion  [-1,0,1,2]
-                t_data.obs_angle    = float(fields[5])          # observation angle [rad]
-                t_data.x1           = float(fields[6])          # left   [px]
-                t_data.y1           = float(fields[7])          # top    [px]
-                t_data.x2           = float(fields[8])          # right  [px]
-                t_data.y2           = float(fields[9])          # bottom [px]
-                t_data.h            = float(fields[10])         # height [m]
-                t_data.w            = float(fields[11])         # width  [m]
-                t_data.l            = float(fields[12])         # length [m]
-                t_data.X            = float(fields[13])         # X [m]
-                t_data.Y            = float(fields[14])         # Y [m]
-                t_data.Z            = float(fields[15])         # Z [m]
-                t_data.yaw          = float(fields[16])         # yaw angle [rad]
-                if not loading_groundtruth:
-                    if len(fields) == 17:
-                        t_data.score = -1
-                    elif len(fields) == 18:
-                        t_data.score  = float(fields[17])     # detection score
-                    else:
-                        self.mail.msg("file is not in KITTI format")
-                        return
-
-                # do not consider objects marked as invalid
-                if t_data.track_id is -1 and t_data.obj_type != "dontcare":
-                    continue
+            id_frame_cache = set()
+            seq_rows       = zip(*[columns[name][seq_offset[seq]:seq_offset[seq+1]].tolist() for name in label_names])
+            for row in seq_rows:
+                t_data = tData(**dict(zip(tdata_names, row)))
 
                 idx = t_data.frame
                 # check if length for frame data is sufficient
@@ -300,27 +291,20 @@ class trackingEvaluation(object):
                         self.mail.msg("Exiting...")
                         #continue # this allows to evaluate non-unique result files
                         return False
-                    id_frame_cache.append(id_frame)
-                    f_data[t_data.frame].append(copy.copy(t_data))
+                    id_frame_cache.add(id_frame)
+                    f_data[t_data.frame].append(t_data)
                 except:
                     print(len(f_data), idx)
                     raise
 
                 if t_data.track_id not in ids and t_data.obj_type!="dontcare":
-                    ids.append(t_data.track_id)
+                    ids.add(t_data.track_id)
                     n_trajectories +=1
                     n_in_seq +=1
 
-                # check if uploaded data provides information for 2D and 3D evaluation
-                if not loading_groundtruth and eval_2d is True and(t_data.x1==-1 or t_data.x2==-1 or t_data.y1==-1 or t_data.y2==-1):
-                    eval_2d = False
-                if not loading_groundtruth and eval_3d is True and(t_data.X==-1000 or t_data.Y==-1000 or t_data.Z==-1000):
-                    eval_3d = False
-
             # only add existing frames
             n_trajectories_seq.append(n_in_seq)
             seq_data.append(f_data)
-            f.close()
 
         if not loading_groundtruth:
             self.tracker=seq_data
@@ -443,8 +427,8 @@ class trackingEvaluation(object):
 
         ids_list, frg_list = list(), list()
 
-        # construct Munkres object for Hungarian Method association
-        hm = Munkres()
+        # backend for Hungarian Method association
+        hm = assignment_backends[assignment]
         max_cost = 1e9
         self.scores = list()
 
@@ -569,7 +553,7 @@ class trackingEvaluation(object):
                 if len(g) is 0:
                     cost_matrix=[[]]
                 # associate
-                association_matrix = hm.compute(cost_matrix)
+                association_matrix = hm(cost_matrix, max_cost)
 
                 # tmp variables for sanity checks and MODP computation
                 tmptp = 0
@@ -1058,7 +1042,7 @@ class trackingEvaluation(object):
 
         if threshold is None: summary = self.createSummary_details()
         else: summary = self.createSummary_simple(threshold, recall)
-        mail.msg(summary)       # mail or print the summary.
+        self.mail.msg(summary)       # mail or print the summary.
         print(summary, file=dump)
 
 class stat:
@@ -1172,21 +1156,79 @@ class stat:
         self.plot_over_recall(self.fn_list, 'False Negative - Recall Curve', 'False Negative', os.path.join(save_dir, 'FN_recall_curve_%s_%s.pdf' % (self.cls, self.suffix)))
         self.plot_over_recall(self.precision_list, 'Precision - Recall Curve', 'Precision', os.path.join(save_dir, 'precision_recall_curve_%s_%s.pdf' % (self.cls, self.suffix)))
 
-def evaluate(result_sha,mail,num_hypo,split):
+# evaluators of the classes, given to the worker processes evaluating the classes in parallel by init_classes
+# so that they are also set with the spawn start method
+class_evaluators = dict()
+
+def init_classes(evaluators):
+    class_evaluators.clear()
+    class_evaluators.update(evaluators)
+
+def evaluate_class(c):
+    """
+        Evaluate a class at all thresholds and save the stats, returns the summary
+    """
+
+    e = class_evaluators[c]
+    if eval_3diou: suffix = 'eval3D'
+    else: suffix = 'eval2D'
+    filename = os.path.join(e.t_path, "../summary_%s_average_%s.txt" % (c, suffix)); dump = open(filename, "w+")
+    stat_meter = stat(t_sha=e.t_sha, cls=c, suffix=suffix, dump=dump)
+    e.compute3rdPartyMetrics()
+
+    # evaluate the mean average metrics
+    best_mota, best_threshold = 0, -10000
+    threshold_list, recall_list = e.getThresholds(e.scores, e.num_gt)
+    for threshold_tmp, recall_tmp in zip(threshold_list, recall_list):
+        data_tmp = dict()
+        e.reset()
+        e.compute3rdPartyMetrics(threshold_tmp, recall_tmp)
+        data_tmp['mota'], data_tmp['motp'], data_tmp['moda'], data_tmp['modp'], data_tmp['precision'], \
+        data_tmp['F1'], data_tmp['fp'], data_tmp['fn'], data_tmp['recall'], data_tmp['sMOTA'] = \
+            e.MOTA, e.MOTP, e.MODA, e.MODP, e.precision, e.F1, e.fp, e.fn, e.recall, e.sMOTA
+        stat_meter.update(data_tmp)
+        mota_tmp = e.MOTA
+        if mota_tmp > best_mota: 
+            best_threshold = threshold_tmp
+            best_mota = mota_tmp
+        e.saveToStats(dump, threshold_tmp, recall_tmp) 
+
+    e.reset()
+    e.compute3rdPartyMetrics(best_threshold)
+    e.saveToStats(dump) 
+
+    stat_meter.output()
+    summary = stat_meter.print_summary()
+    stat_meter.plot()
+    dump.close()
+
+    return summary
+
+def evaluate(result_sha,mail,num_hypo,split,num_workers=1,single_pass=True):
     """
         Entry point for evaluation, will load the data and start evaluation for
-        CAR and PEDESTRIAN if available.
+        CAR and PEDESTRIAN if available. The classes are evaluated by num_workers
+        processes if more than 1. With single_pass, the files are read once for
+        all classes.
     """
     
     # start evaluation and instanciated eval object
     mail.msg("Processing Result for nuScenes Tracking Benchmark")
     classes = []
+    evaluators = dict()
+
+    # read the tracking results and the ground truth of all classes once, each class selects its rows
+    if single_pass:
+        tracker_labels, gt_labels = trackingEvaluation(t_sha=result_sha, mail=mail, num_hypo=num_hypo, split=split).loadLabels()
+    else:
+        tracker_labels, gt_labels = None, None
+
     # for c in ('car', 'pedestrian', 'bicycle', 'motorcycle', 'bus', 'trailer', 'truck', 'cyclist'):
     for c in ('bicycle', 'motorcycle', 'bus', 'trailer', 'truck', 'pedestrian', 'car'):
         e = trackingEvaluation(t_sha=result_sha, mail=mail,cls=c,num_hypo=num_hypo,split=split)
         # load tracker data and check provided classes
         try:
-            if not e.loadTracker():
+            if not e.loadTracker(tracker_labels):
                 continue
             mail.msg("Loading Results - Success")
             mail.msg("Evaluate Object Class: %s" % c.upper())
@@ -1196,7 +1238,7 @@ def evaluate(result_sha,mail,num_hypo,split):
             mail.msg("   Caught exception while loading result data.")
             break
         # load groundtruth data for this class
-        if not e.loadGroundtruth():
+        if not e.loadGroundtruth(gt_labels):
             raise ValueError("Ground truth not found.")
         mail.msg("Loading Groundtruth - Success")
         # sanity checks
@@ -1212,38 +1254,17 @@ def evaluate(result_sha,mail,num_hypo,split):
         #     mail.msg("Feel free to contact us (lenz@kit.edu), if you receive this error message:")
         #     mail.msg("   Caught exception while creating results.")
         
-        if eval_3diou: suffix = 'eval3D'
-        else: suffix = 'eval2D'
-        filename = os.path.join(e.t_path, "../summary_%s_average_%s.txt" % (c, suffix)); dump = open(filename, "w+")
-        stat_meter = stat(t_sha=result_sha, cls=c, suffix=suffix, dump=dump)
-        e.compute3rdPartyMetrics()
-
-        # evaluate the mean average metrics
-        best_mota, best_threshold = 0, -10000
-        threshold_list, recall_list = e.getThresholds(e.scores, e.num_gt)
-        for threshold_tmp, recall_tmp in zip(threshold_list, recall_list):
-            data_tmp = dict()
-            e.reset()
-            e.compute3rdPartyMetrics(threshold_tmp, recall_tmp)
-            data_tmp['mota'], data_tmp['motp'], data_tmp['moda'], data_tmp['modp'], data_tmp['precision'], \
-            data_tmp['F1'], data_tmp['fp'], data_tmp['fn'], data_tmp['recall'], data_tmp['sMOTA'] = \
-                e.MOTA, e.MOTP, e.MODA, e.MODP, e.precision, e.F1, e.fp, e.fn, e.recall, e.sMOTA
-            stat_meter.update(data_tmp)
-            mota_tmp = e.MOTA
-            if mota_tmp > best_mota: 
-                best_threshold = threshold_tmp
-                best_mota = mota_tmp
-            e.saveToStats(dump, threshold_tmp, recall_tmp) 
-
-        e.reset()
-        e.compute3rdPartyMetrics(best_threshold)
-        e.saveToStats(dump) 
-
-        stat_meter.output()
-        summary = stat_meter.print_summary()
-        stat_meter.plot()
-        mail.msg(summary)       # mail or print the summary.
-        dump.close()
+        evaluators[c] = e
+
+    # evaluate the classes
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers, initializer=init_classes, initargs=(evaluators,)) as pool:
+            summaries = pool.map(evaluate_class, classes, chunksize=1)
+    else:
+        init_classes(evaluators)
+        summaries = list(map(evaluate_class, classes))
+    class_evaluators.clear()
+    for summary in summaries: mail.msg(summary)       # mail or print the summary.
 
     # finish
     if len(classes)==0:
@@ -1262,8 +1283,8 @@ if __name__ == "__main__":
 
     # check for correct number of arguments. if user_sha and email are not supplied,
     # no notification email is sent (this option is used for auto-updates)
-    if len(sys.argv)!=2 and len(sys.argv)!=4:
-      print("Usage: python scripts/nuScenes/evaluate_quick.py result_sha num_hypothesis(e.g., 1) split(train or val)")
+    if len(sys.argv)!=2 and len(sys.argv)!=4 and len(sys.argv)!=5:
+      print("Usage: python scripts/nuScenes/evaluate_quick.py result_sha num_hypothesis(e.g., 1) split(train or val) num_workers(e.g., 4)")
       sys.exit(1);
 
     # get unique sha key of submitted results
@@ -1272,5 +1293,9 @@ if __name__ == "__main__":
     split = sys.argv[3]
     mail = mailpy.Mail("")
 
+    # the classes are evaluated in parallel if num_workers is given
+    if len(sys.argv)==5: num_workers = int(sys.argv[4])
+    else: num_workers = 1
+
     # evaluate results and send notification email to user
-    success = evaluate(result_sha,mail,num_hypo,split)
\ No newline at end of file
+    success = evaluate(result_sha,mail,num_hypo,split,num_workers)
\ No newline at end of file
@@ -0,0 +1,45 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# export the packed results of every category, i.e., result_sink : packed in the config, to the KITTI text
+# layout of trk_withid, data and affinity, then combine the results from different categories
+
+import os, argparse
+from AB3DMOT_libs.io import export_packed_results, AsyncWriter
+from AB3DMOT_libs.utils import get_subfolder_seq, Config
+from scripts.post_processing.combine_trk_cat import combine_trk_cat
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AB3DMOT')
+    parser.add_argument('--det_name', type=str, default='pointrcnn', help='we provide pointrcnn on KITTI, megvii for nuScenes')
+    parser.add_argument('--dataset', type=str, default='KITTI', help='nuScenes, KITTI')
+    parser.add_argument('--split', type=str, default='val', help='train, val, test')
+    parser.add_argument('--num_hypo', type=int, default=1, help='number of hypothesis to export')
+    parser.add_argument('--no_combine', action='store_true', help='only export, do not combine the categories')
+    args = parser.parse_args()
+    return args
+
+def export_trk_cat(split, dataset, method, num_hypo):
+
+	# load dataset-specific config
+	file_path = os.path.dirname(os.path.realpath(__file__))
+	root_dir = os.path.join(file_path, '../../results', dataset)
+	_, det_id2str, _, seq_list, _ = get_subfolder_seq(dataset, split)
+	config_path = os.path.join(file_path, '../../configs/%s.yml' % dataset)
+	cfg, _ = Config(config_path)
+
+	# loop through each category and sequence, the files are written on a background thread
+	writer = AsyncWriter()
+	for cat in cfg.cat_list:
+		save_dir = os.path.join(root_dir, '%s_%s_%s_H%d' % (method, cat, split, num_hypo))
+		num_seq = 0
+		for seq_tmp in seq_list:
+			num_seq += export_packed_results(save_dir, seq_tmp, num_hypo, det_id2str, cfg.score_threshold, writer)
+		print('exported %d sequences of %s' % (num_seq, save_dir))
+	writer.close()
+
+if __name__ == '__main__':
+	args = parse_args()
+	export_trk_cat(args.split, args.dataset, args.det_name, args.num_hypo)
+	if not args.no_combine:
+		combine_trk_cat(args.split, args.dataset, args.det_name, 'H%d' % args.num_hypo, args.num_hypo)
@@ -2,12 +2,13 @@
 # email: xinshuo.weng@gmail.com
 
 # combine the detection txt from each frame to a single txt per sequence including detection results at all frames
-# used to create input files for AB3DMOT
+# used to create input files for AB3DMOT, optionally also converted to the binary detection store
 
-import os, argparse
+import os, glob, argparse, numpy as np
 from AB3DMOT_libs.utils import get_subfolder_seq
 from AB3DMOT_libs.nuScenes2KITTI_helper import load_correspondence, load_correspondence_inverse
 from AB3DMOT_libs.kitti_obj import read_label
+from AB3DMOT_libs.io import save_detection_store
 from xinshuo_miscellaneous.file_io import mkdir_if_missing, is_path_exists
 
 def parse_args():
@@ -15,6 +16,8 @@ def parse_args():
     parser.add_argument('--dataset', type=str, default='nuScenes', help='KITTI, nuScenes')
     parser.add_argument('--split', type=str, default='val', help='train, val, test')
     parser.add_argument('--det_name', type=str, default='centerpoint', help='name of the detection method')
+    parser.add_argument('--binary', action='store_true', help='also convert the detections to the binary store')
+    parser.add_argument('--dtype', type=str, default='float64', help='float64, float32, precision of the binary store, float32 changes the results')
     args = parser.parse_args()
     return args
 
@@ -71,7 +74,18 @@ def combine_dets(dataset, split, det_name):
 		for cat in save_file.keys():
 			save_file[cat].close()
 
+def convert_binary(dataset, split, det_name, dtype='float64'):
+	# convert the combined detections of each sequence and category to the binary store, which is 
+	# loaded with memory mapping by main.py instead of parsing the text file
+
+	det_root = os.path.join('./data', dataset, 'detection')
+	det_files = sorted(glob.glob(os.path.join(det_root, '%s_*_%s' % (det_name, split), '*.txt')))
+	print('converting %d files of %s, %s, %s to %s binary store' % (len(det_files), dataset, det_name, split, dtype))
+	for det_file in det_files:
+		save_detection_store(det_file, dtype=np.dtype(dtype))
+
 if __name__ == '__main__':	
 
 	args = parse_args()
-	combine_dets(args.dataset, args.split, args.det_name)
\ No newline at end of file
+	combine_dets(args.dataset, args.split, args.det_name)
+	if args.binary: convert_binary(args.dataset, args.split, args.det_name, args.dtype)
\ No newline at end of file
@@ -0,0 +1,89 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# references shared by the tests and the benchmarks in scripts/benchmark, random scenes, the previous
+# implementations replaced by faster ones and cases with analytic values
+
+import numpy as np
+from scipy.spatial import ConvexHull
+from AB3DMOT_libs.dist_metrics import convex_hull_intersection, PolyArea2D
+
+def random_boxes(num, rng, area=60.):
+	# generate a dense scene of car-like boxes in the format of [x,y,z,theta,l,w,h]
+
+	boxes = np.zeros((num, 7))
+	boxes[:, 0] = rng.uniform(-area / 2, area / 2, num)
+	boxes[:, 1] = rng.uniform(1.0, 2.0, num)
+	boxes[:, 2] = rng.uniform(0, area, num)
+	boxes[:, 3] = rng.uniform(-np.pi, np.pi, num)
+	boxes[:, 4] = rng.uniform(3.0, 5.0, num)
+	boxes[:, 5] = rng.uniform(1.5, 2.0, num)
+	boxes[:, 6] = rng.uniform(1.4, 1.8, num)
+	return boxes
+
+def random_mixed_boxes(num, rng, area):
+	# generate a scene of boxes of sizes from pedestrians to buses at random positions and orientations
+
+	boxes = np.zeros((num, 7))
+	boxes[:, [0, 2]] = rng.uniform(-area / 2, area / 2, (num, 2))
+	boxes[:, 1] = rng.uniform(-1, 1, num)
+	boxes[:, 3] = rng.uniform(-np.pi, np.pi, num)
+	boxes[:, 4] = rng.uniform(0.5, 15, num)
+	boxes[:, 5] = rng.uniform(0.5, 3, num)
+	boxes[:, 6] = rng.uniform(1, 4, num)
+	return boxes
+
+def legacy_inter_2D(boxa_bot, boxb_bot):
+	# intersection area with polygon_clip, as used before the closed-form kernel
+
+	_, I_2D = convex_hull_intersection(boxa_bot, boxb_bot)
+	return I_2D
+
+def legacy_convex_area(boxa_bot, boxb_bot):
+	# enclosing convex hull area with scipy, as used before the closed-form kernel
+
+	all_corners = np.vstack((boxa_bot, boxb_bot))
+	C = ConvexHull(all_corners)
+	convex_corners = all_corners[C.vertices]
+	return PolyArea2D(convex_corners)
+
+def degenerate_cases():
+	# pairs of boxes in the format of [x,y,z,theta,l,w,h] with the analytic intersection and enclosing area
+
+	box = np.array([0, 1, 10, 0.3, 4, 2, 1.5])
+	cases = []
+	cases.append(('identical', box, box.copy(), 8.0, 8.0))
+	cases.append(('identical rotated by pi', box, box + [0, 0, 0, np.pi, 0, 0, 0], 8.0, 8.0))
+	cases.append(('contained', box, np.array([0, 1, 10, 0.3, 2, 1, 1.5]), 2.0, 8.0))
+	cases.append(('containing', np.array([0, 1, 10, 0.3, 2, 1, 1.5]), box, 2.0, 8.0))
+
+	# boxes sharing an edge or only a corner have no overlap
+	cases.append(('touching edge', np.array([0, 1, 0, 0, 4, 2, 1.5]), np.array([4, 1, 0, 0, 4, 2, 1.5]), 0.0, 16.0))
+	cases.append(('touching corner', np.array([0, 1, 0, 0, 4, 2, 1.5]), np.array([4, 1, 2, 0, 4, 2, 1.5]), 0.0, 24.0))
+	cases.append(('far apart', np.array([0, 1, 0, 0, 4, 2, 1.5]), np.array([20, 1, 0, 0, 4, 2, 1.5]), 0.0, 48.0))
+
+	# half overlap along the length, cross shape of a box and itself rotated by 90 degrees, flat box
+	cases.append(('half overlap', np.array([0, 1, 0, 0, 4, 2, 1.5]), np.array([2, 1, 0, 0, 4, 2, 1.5]), 4.0, 12.0))
+	cases.append(('cross', np.array([0, 1, 0, 0, 4, 2, 1.5]), np.array([0, 1, 0, np.pi / 2, 4, 2, 1.5]), 4.0, 14.0))
+	cases.append(('zero width', np.array([0, 1, 0, 0, 4, 0, 1.5]), np.array([0, 1, 0, 0, 4, 2, 1.5]), 0.0, 8.0))
+
+	return cases
+
+def greedy_matching_loop(cost_matrix, max_cost=np.inf):
+	# previous greedy matching, all pairs are walked in the order of cost, pairs over max_cost are dropped
+
+	num_dets, num_trks = cost_matrix.shape[0], cost_matrix.shape[1]
+	index_1d = np.argsort(cost_matrix.reshape(-1), kind='stable')
+	index_2d = np.stack([index_1d // num_trks, index_1d % num_trks], axis=1)
+	det_matches_to_trk = [-1] * num_dets
+	trk_matches_to_det = [-1] * num_trks
+	matched_indices = []
+	for sort_i in range(index_2d.shape[0]):
+		det_id, trk_id = int(index_2d[sort_i][0]), int(index_2d[sort_i][1])
+		if trk_matches_to_det[trk_id] == -1 and det_matches_to_trk[det_id] == -1:
+			trk_matches_to_det[trk_id] = det_id
+			det_matches_to_trk[det_id] = trk_id
+			matched_indices.append([det_id, trk_id])
+	matched_indices = np.asarray(matched_indices, dtype=int).reshape((-1, 2))
+
+	return matched_indices[cost_matrix[matched_indices[:, 0], matched_indices[:, 1]] <= max_cost]
@@ -0,0 +1,58 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# tests of the assignment backends of the evaluation, the matches within the gating of the scipy backend are
+# checked to be the same as munkres on gated cost matrices with and without ties. Run from the root of the
+# code: python -m pytest tests
+
+import os, sys, numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../scripts/KITTI'))   # the evaluation imports its siblings
+from assignment import assignment_backends, assign_scipy, assign_munkres, has_ties
+
+max_cost = 1e9 			# cost of the associations over the gating, as in the evaluations
+
+def gated_matches(cost_matrix, backend):
+	association_matrix = assignment_backends[backend](cost_matrix, max_cost)
+	cost = cost_matrix[association_matrix[:, 0], association_matrix[:, 1]]
+	return association_matrix[cost < max_cost]
+
+def check_same(cost_matrix):
+	assert np.array_equal(gated_matches(cost_matrix, 'scipy'), gated_matches(cost_matrix, 'munkres'))
+
+def test_random_gated():
+	# random costs and costs of a few levels, i.e., with ties, with a random part over the gating
+	rng = np.random.RandomState(0)
+	for check in range(1000):
+		num_gt, num_trk = rng.randint(0, 30), rng.randint(0, 30)
+		if check % 2 == 0: cost_matrix = rng.randint(0, 4, (num_gt, num_trk)) / 4.
+		else: cost_matrix = rng.rand(num_gt, num_trk)
+		cost_matrix[rng.rand(num_gt, num_trk) < rng.rand()] = max_cost
+		check_same(cost_matrix)
+
+def test_tied():
+	# optimal assignments that are not unique, e.g., where linear_sum_assignment picks another one than munkres,
+	# the frame is solved by munkres for the same choice
+	cases = []
+	cases.append(np.array([[0.5, 0.5, 0.5], [0., 0.25, max_cost]]))
+	cases.append(np.array([[0., 0.5, 0.25], [0.25, 0.25, 0.], [0.25, max_cost, max_cost]]))
+	cases.append(np.array([[max_cost, 0.25, 0.25], [0.5, 0.25, 0.25], [0.5, max_cost, 0.25]]))
+	cases.append(np.array([[0.5, 0., 0.], [0.25, max_cost, 0.], [0.5, 0.5, 0.25]]))
+	cases.append(np.full((4, 4), 0.5)) 											# all equal
+	cases.append(np.kron(np.eye(3), np.full((2, 2), 0.4)) + (1 - np.kron(np.eye(3), np.ones((2, 2)))) * max_cost)
+	for cost_matrix in cases:
+		rows, cols = np.flatnonzero((cost_matrix < max_cost).any(axis=1)), np.flatnonzero((cost_matrix < max_cost).any(axis=0))
+		assert has_ties(cost_matrix[np.ix_(rows, cols)], max_cost)
+		assert np.array_equal(assign_scipy(cost_matrix, max_cost), assign_munkres(cost_matrix, max_cost))
+		check_same(cost_matrix)
+
+def test_ties_over_gating():
+	# equal costs over the gating only are not ties, scipy solves the gated rows and columns
+	cost_matrix = np.array([[0.1, max_cost, max_cost], [max_cost, 0.2, max_cost], [max_cost, max_cost, max_cost]])
+	assert not has_ties(cost_matrix, max_cost)
+	assert np.array_equal(gated_matches(cost_matrix, 'scipy'), [[0, 0], [1, 1]])
+	check_same(cost_matrix)
+
+def test_empty_and_gated_out():
+	for cost_matrix in [np.zeros((0, 3)), np.zeros((2, 0)), np.full((2, 3), max_cost), np.array([[0.3]])]:
+		check_same(cost_matrix)
+	assert len(assign_scipy(np.full((2, 3), max_cost), max_cost)) == 0
@@ -0,0 +1,60 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# tests of the batched IoU/GIoU, checked against the per-pair implementation, the previous
+# polygon_clip + ConvexHull implementation on random pairs and the analytic areas of degenerate cases, i.e.,
+# identical, touching and contained boxes. Run from the root of the code: python -m pytest tests
+
+import numpy as np, pytest
+from AB3DMOT_libs.box import Box3D
+from AB3DMOT_libs.matching import compute_affinity, compute_affinity_pairs
+from AB3DMOT_libs.dist_metrics import compute_bottom, compute_inter_2D, convex_area, iou, iou_batch
+from tests.references import random_boxes, degenerate_cases, legacy_inter_2D, legacy_convex_area
+
+metrics = ['iou_2d', 'iou_3d', 'giou_2d', 'giou_3d']
+
+def iou_pairwise(boxes_a, boxes_b, metric):
+	# per-pair IoU/GIoU in float64
+	return np.array([[iou(Box3D.array2bbox(box_a), Box3D.array2bbox(box_b), metric) for box_b in boxes_b] for box_a in boxes_a])
+
+def test_degenerate_cases():
+	# analytic intersection and enclosing areas, and the same IoU/GIoU batched as per pair
+	for name, box_a, box_b, inter_gt, convex_gt in degenerate_cases():
+		boxa_bot, boxb_bot = compute_bottom(Box3D.array2bbox(box_a), Box3D.array2bbox(box_b))
+		assert compute_inter_2D(boxa_bot, boxb_bot) == pytest.approx(inter_gt, abs=1e-9), name
+		assert convex_area(boxa_bot, boxb_bot) == pytest.approx(convex_gt, abs=1e-9), name
+		for metric in metrics:
+			with np.errstate(all='ignore'):
+				batch, pairwise = iou_batch(box_a[None], box_b[None], metric), iou_pairwise(box_a[None], box_b[None], metric)
+			assert np.allclose(batch, pairwise, rtol=0, atol=1e-9, equal_nan=True), '%s %s' % (metric, name)
+
+def test_random_pairs_legacy():
+	# the closed-form areas are the same as the previous implementation on overlapping random pairs
+	rng = np.random.RandomState(0)
+	boxes_a, boxes_b = random_boxes(2000, rng, area=6.), random_boxes(2000, rng, area=6.)
+	num_overlap = 0
+	for box_a, box_b in zip(boxes_a, boxes_b):
+		boxa_bot, boxb_bot = compute_bottom(Box3D.array2bbox(box_a), Box3D.array2bbox(box_b))
+		inter = compute_inter_2D(boxa_bot, boxb_bot)
+		assert inter == pytest.approx(legacy_inter_2D(boxa_bot, boxb_bot), abs=1e-9)
+		assert convex_area(boxa_bot, boxb_bot) == pytest.approx(legacy_convex_area(boxa_bot, boxb_bot), abs=1e-9)
+		num_overlap += inter > 0
+	assert num_overlap > 1000
+
+@pytest.mark.parametrize('metric', metrics)
+def test_iou_batch_pairwise(metric):
+	# dense scene with the tracks close to the detections, also processed in chunks of rows and at K pairs
+	rng = np.random.RandomState(0)
+	dets = random_boxes(60, rng)
+	trks = dets + rng.normal(0, 0.3, dets.shape) * np.array([1, 0.1, 1, 0.2, 0.1, 0.1, 0.1])
+	trks = np.concatenate((trks, random_boxes(20, rng)))
+	pairwise = iou_pairwise(dets, trks, metric)
+	assert np.sum(pairwise > 0) > len(dets)
+	batch = iou_batch(dets, trks, metric)
+	assert np.allclose(batch, pairwise, rtol=0, atol=1e-9)
+	assert np.array_equal(iou_batch(dets, trks, metric, max_pairs=100), batch)
+
+	det_index, trk_index = np.nonzero(rng.rand(len(dets), len(trks)) < 0.3)
+	aff = compute_affinity(dets, trks, metric)
+	assert np.array_equal(compute_affinity_pairs(dets, trks, det_index, trk_index, metric), aff[det_index, trk_index])
+
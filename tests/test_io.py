@@ -0,0 +1,40 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# tests of the binary detection store, the frames of the store are checked against the text file of
+# detections, and a store older than the text file is not used. Run from the root of the code: python -m pytest tests
+
+import os, shutil, numpy as np
+from AB3DMOT_libs.io import load_detection, get_frame_det, save_detection_store, load_detection_store, \
+	get_store_path
+
+det_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/KITTI/detection/pointrcnn_Car_val/0001.txt')
+
+def check_frames(store, detections):
+	for frame in range(int(detections[:, 0].max()) + 2):
+		frame_dets, frame_store = get_frame_det(detections, frame), store.get_frame(frame)
+		for key in ['dets', 'info']: assert np.array_equal(frame_store[key], frame_dets[key])
+
+def test_store_same_as_text(tmp_path):
+	# the store is used once converted, and is the same as the text file in float64 by default
+	file = str(tmp_path / '0001.txt')
+	shutil.copy(det_file, file)
+	detections, _ = load_detection(file)
+	assert save_detection_store(file)
+	store, flag = load_detection_store(file)
+	assert flag and isinstance(store.columns, np.memmap) and store.columns.dtype == np.float64
+	check_frames(store, detections)
+
+def test_stale_store(tmp_path):
+	# a text file modified after the conversion is parsed again instead of loading the store
+	file = str(tmp_path / '0001.txt')
+	shutil.copy(det_file, file)
+	assert save_detection_store(file)
+	detections, _ = load_detection(file)
+	detections = detections[detections[:, 0] % 2 == 0]
+	np.savetxt(file, detections, delimiter=',')
+	mtime = max(os.stat(path).st_mtime_ns for path in get_store_path(file)) + 10 ** 9
+	os.utime(file, ns=(mtime, mtime))
+	store, flag = load_detection_store(file)
+	assert flag and not isinstance(store.columns, np.memmap)
+	check_frames(store, detections)
@@ -0,0 +1,112 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# tests of the Kalman filter of the tracks, the closed-form prediction and update of kalman_filter_cv.py are
+# checked against filterpy on the states and covariances of every frame of the KITTI detections replayed
+# through the tracker with the filterpy backend, and the cv backend gives the same tracks. The storage of
+# TrackBank is checked on birth, removal and growth of the buffers. Run from the root of the code:
+# python -m pytest tests
+
+import os, numpy as np, pytest, filterpy.kalman
+from easydict import EasyDict as edict
+from AB3DMOT_libs.model import AB3DMOT
+from AB3DMOT_libs.io import load_detection, get_frame_det
+from AB3DMOT_libs.kalman_filter import TrackBank
+from AB3DMOT_libs.kalman_filter_cv import cv_predict, cv_update
+
+det_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/KITTI/detection')
+
+def build_tracker(cat, backend):
+	cfg = edict(dataset='KITTI', det_name='pointrcnn', ego_com=False, vis=False, affi_pro=False, kf_backend=backend)
+	return AB3DMOT(cfg, cat, log=open(os.devnull, 'w'))
+
+def assert_close(a, b):
+	assert np.allclose(a, b, rtol=1e-9, atol=1e-9), np.max(np.abs(a - b))
+
+@pytest.mark.parametrize('cat, seq_name', [('Car', '0001'), ('Pedestrian', '0013'), ('Cyclist', '0019')])
+def test_cv_against_filterpy(cat, seq_name):
+	# the filterpy backend is recorded at every prediction and update, and cv_predict and cv_update applied to
+	# the same inputs give the same states and covariances. The tracker with the cv backend is run in lockstep
+	seq_file = os.path.join(det_root, 'pointrcnn_%s_val' % cat, '%s.txt' % seq_name)
+	seq_dets, flag = load_detection(seq_file)
+	assert flag
+	tracker, tracker_cv = build_tracker(cat, 'filterpy'), build_tracker(cat, 'cv')
+	bank = tracker.trackers
+	predict, update = bank.predict, bank.update
+	num_calls = [0, 0]
+
+	def predict_check():
+		x, P = bank.x.copy(), bank.P.copy()
+		predict()
+		x_cv, P_cv = cv_predict(x, P, bank.Q)
+		assert_close(x_cv, bank.x)
+		assert_close(P_cv, bank.P)
+		num_calls[0] += len(x)
+
+	def update_check(index, z):
+		x, P = bank.x[index].copy(), bank.P[index].copy()
+		update(index, z)
+		x_cv, P_cv = cv_update(x, P, z, bank.R)
+		assert_close(x_cv, bank.x[index])
+		assert_close(P_cv, bank.P[index])
+		for track_index, z_tmp in enumerate(z):
+			x_ref, P_ref = filterpy.kalman.update(x[track_index, :, None], P[track_index], z_tmp, bank.R, bank.H)
+			assert_close(x_ref[:, 0], bank.x[index[track_index]])
+			assert_close(P_ref, bank.P[index[track_index]])
+		num_calls[1] += len(index)
+
+	bank.predict, bank.update = predict_check, update_check
+	for frame in range(int(seq_dets[:, 0].max()) + 1):
+		dets_frame = get_frame_det(seq_dets, frame)
+		results = tracker.track(dets_frame, frame, seq_name)[0][0]
+		results_cv = tracker_cv.track(dets_frame, frame, seq_name)[0][0]
+		assert np.array_equal(tracker_cv.trackers.id, bank.id)
+		assert_close(tracker_cv.trackers.x, bank.x)
+		assert_close(tracker_cv.trackers.P, bank.P)
+		assert np.allclose(results_cv, results, rtol=1e-9, atol=1e-9)
+	assert num_calls[0] > 100 and num_calls[1] > 100
+
+def check_tracks(bank, boxes, info, ids, hits):
+	assert len(bank) == len(ids)
+	assert np.array_equal(bank.x[:, :7], boxes) and np.all(bank.x[:, 7:] == 0)
+	assert np.array_equal(bank.P, np.broadcast_to(bank.P_init, (len(ids), 10, 10)))
+	assert np.array_equal(bank.info, info) and np.array_equal(bank.id, ids) and np.array_equal(bank.hits, hits)
+
+def test_track_bank_birth_remove():
+	# new tracks are appended in the order of birth, and the removal keeps the order of the remaining tracks
+	rng = np.random.RandomState(0)
+	bank = TrackBank(capacity=4)
+	boxes, info = rng.rand(5, 7), rng.rand(5, 3)
+	bank.birth(boxes[:3], info[:3], np.arange(3))
+	bank.hits[:] = [2, 3, 4]
+	bank.birth(boxes[3:], info[3:], np.arange(3, 5))
+	check_tracks(bank, boxes, info, np.arange(5), [2, 3, 4, 1, 1])
+
+	bank.remove(np.array([True, False, True, False, False]))
+	check_tracks(bank, boxes[[1, 3, 4]], info[[1, 3, 4]], [1, 3, 4], [3, 1, 1])
+	bank.remove(np.zeros(3, dtype=bool))
+	assert len(bank) == 3
+	bank.birth(boxes[:1], info[:1], [5])
+	check_tracks(bank, boxes[[1, 3, 4, 0]], info[[1, 3, 4, 0]], [1, 3, 4, 5], [3, 1, 1, 1])
+	bank.remove(np.ones(4, dtype=bool))
+	assert len(bank) == 0 and bank.x.shape == (0, 10)
+
+def test_track_bank_reserve():
+	# the buffers grow by doubling and keep the tracks, the size of info only changes without tracks
+	rng = np.random.RandomState(0)
+	bank = TrackBank(capacity=2)
+	boxes, info = rng.rand(9, 7), rng.rand(9, 2)
+	bank.reserve(2, 2)
+	assert bank._x.shape[0] == 4 and bank._info.shape == (4, 2)
+	for index in range(9):
+		bank.birth(boxes[index:index + 1], info[index:index + 1], [index])
+		assert bank._x.shape[0] >= len(bank)
+		assert all(array.shape[0] == bank._x.shape[0] for array in [bank._P, bank._id, bank._hits, bank._time_since_update, bank._info])
+	assert bank._x.shape[0] == 16
+	check_tracks(bank, boxes, info, np.arange(9), np.ones(9))
+
+	with pytest.raises(AssertionError): bank.reserve(9, 3)
+	check_tracks(bank, boxes, info, np.arange(9), np.ones(9))
+	bank.remove(np.ones(9, dtype=bool))
+	bank.birth(boxes[:1], rng.rand(1, 3), [9])
+	assert bank.info.shape == (1, 3)
@@ -0,0 +1,272 @@
+# Author: Xinshuo Weng
+# email: xinshuo.weng@gmail.com
+
+# tests of the data association, the gated association, the compiled greedy and the hungarian algorithm per
+# connected component are checked against the dense association, the loop over all sorted pairs and the global
+# assignment, on random data and on the frames of the KITTI and nuScenes detections replayed through the
+# tracker. Run from the root of the code: python -m pytest tests
+
+import os, glob, numpy as np, pytest
+from scipy.optimize import linear_sum_assignment
+from easydict import EasyDict as edict
+import AB3DMOT_libs.model as model
+from AB3DMOT_libs.model import AB3DMOT
+from AB3DMOT_libs.box import Box3D, Box3DArray
+from AB3DMOT_libs.io import load_detection, get_frame_det
+from AB3DMOT_libs.matching import compute_affinity, min_affinity, data_association, gate_radius_bound, gate_pairs, \
+	compute_affinity_pairs, hungarian_components, hungarian_matching, greedy_matching, greedy_matching_sparse, \
+	gated_association
+from tests.references import random_mixed_boxes, greedy_matching_loop
+
+data_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data')
+categories = ['Car', 'Pedestrian', 'Truck', 'Trailer', 'Bus', 'Motorcycle', 'Bicycle']
+
+def replay_frames(dataset, cat, det_name, num_seq=3):
+	# inputs of data_association of every frame of the first sequences of the val detections, and the
+	# algorithm, metric and threshold of the tracker
+
+	frames = []
+	def recorder(dets, trks, *args, **kwargs):
+		frames.append((Box3D.bboxes2array(dets), Box3D.bboxes2array(trks)))
+		return data_association(dets, trks, *args, **kwargs)
+	data_association, model.data_association = model.data_association, recorder
+	try:
+		det_dir = os.path.join(data_root, dataset, 'detection', '%s_%s_val' % (det_name, cat))
+		for seq_file in sorted(glob.glob(os.path.join(det_dir, '*.txt')))[:num_seq]:
+			seq_dets, flag = load_detection(seq_file)
+			if not flag: continue
+			cfg = edict(dataset=dataset, det_name=det_name, ego_com=False, vis=False, affi_pro=False)
+			tracker = AB3DMOT(cfg, cat, log=open(os.devnull, 'w'))
+			for frame in range(int(seq_dets[:, 0].max()) + 1):
+				tracker.track(get_frame_det(seq_dets, frame), frame, os.path.basename(seq_file))
+	finally:
+		model.data_association = data_association
+	assert len(frames) > 0, 'no detections of %s' % cat
+
+	return frames, tracker.algm, tracker.metric, tracker.thres
+
+def within_gate(dets, trks, radius):
+	dist = np.hypot(dets[:, None, 0] - trks[None, :, 0], dets[:, None, 2] - trks[None, :, 2])
+	return dist <= radius[None, :]
+
+@pytest.mark.parametrize('metric', ['giou_3d', 'giou_2d', 'iou_3d', 'iou_2d'])
+def test_gate_radius_bound(metric):
+	# all pairs above the threshold are within the radius, including the boxes along the same line
+	rng = np.random.RandomState(0)
+	for thres in [-0.8, -0.5, -0.4, -0.2, 0., 0.1, 0.5]:
+		dets, trks = random_mixed_boxes(300, rng, 80.), random_mixed_boxes(200, rng, 80.)
+		trks[:50, [0, 2, 3]] = dets[:50, [0, 2, 3]] + np.stack([rng.uniform(-40, 40, 50), np.zeros(50), np.zeros(50)], axis=1)
+		radius = gate_radius_bound(dets, trks, metric, thres)
+		if radius is None:
+			assert 'giou' not in metric and thres <= 0
+			continue
+		accepted = compute_affinity(dets, trks, metric) >= thres
+		assert np.all(within_gate(dets, trks, radius)[accepted]), 'pair above the threshold out of the gate'
+
+def test_gate_radius_collinear_trucks():
+	# two trucks along the same line still have a GIoU above -0.4 at 23 meters
+	trucks = np.array([[0., 0., 0., 0., 10., 2.5, 3.], [23., 0., 0., 0., 10., 2.5, 3.]])
+	assert compute_affinity(trucks[:1], trucks[1:], 'giou_3d')[0, 0] >= -0.4
+	assert gate_radius_bound(trucks[:1], trucks[1:], 'giou_3d', -0.4)[0] >= 23.
+
+def check_gated_association(frames, algm, metric, thres):
+	# every pair above the threshold of the dense affinity is within the gate, and the gated association of the
+	# algorithm gives the same matches, the hungarian algorithm scoring all pairs
+	for dets, trks in frames:
+		radius = gate_radius_bound(dets, trks, metric, thres)
+		if radius is None: continue
+		accepted = compute_affinity(dets, trks, metric) >= thres
+		assert np.all(within_gate(dets, trks, radius)[accepted]), 'pair above the threshold out of the gate'
+
+		dense = data_association(dets, trks, metric, thres, algm)
+		gated = data_association(dets, trks, metric, thres, algm, gate_radius=radius)
+		for index in [0, 1, 2, 5, 6]: assert np.array_equal(dense[index], gated[index])
+		assert dense[3] == pytest.approx(gated[3])
+		in_gate = within_gate(dets, trks, radius)
+		assert np.array_equal(gated[4][in_gate], dense[4][in_gate])
+		assert np.all((gated[4] == dense[4]) | (gated[4] == min_affinity(metric)))
+
+@pytest.mark.parametrize('cat', categories)
+def test_gated_association_nuscenes(cat):
+	check_gated_association(*replay_frames('nuScenes', cat, 'centerpoint'))
+
+@pytest.mark.parametrize('cat', ['Car', 'Cyclist'])
+def test_gated_association_kitti(cat):
+	# hungarian algorithm of Car with giou_3d and Cyclist with dist_3d, also forced on the nuScenes frames
+	frames, algm, metric, thres = replay_frames('KITTI', cat, 'pointrcnn', num_seq=None)
+	assert algm == 'hungar'
+	check_gated_association(frames, algm, metric, thres)
+	check_gated_association(*replay_frames('nuScenes', cat.replace('Cyclist', 'Bicycle'), 'centerpoint')[:1], 'hungar', metric, thres)
+
+def test_gated_hungarian_pairs_below_threshold():
+	# the dense hungarian algorithm matches two pairs, one of them only possible by giving up the best pair
+	trks = np.array([[0., 0., 0., 0., 1., 1., 1.], [1.6, 0., 0., 0., 1., 1., 1.]])
+	dets = np.array([[0.3, 0., 0., 0., 1., 1., 1.], [-1.2, 0., 0., 0., 1., 1., 1.]])
+	radius = gate_radius_bound(dets, trks, 'dist_3d', -2)
+	for gate_radius in [None, radius]:
+		matches = data_association(dets, trks, 'dist_3d', -2, 'hungar', gate_radius=gate_radius)[0]
+		assert np.array_equal(matches, [[0, 1], [1, 0]])
+
+def test_gated_association_max_rest():
+	# over max_rest pairs left, the pairs out of the gate are not scored, with the same matches and detections left
+	rng = np.random.RandomState(0)
+	for check in range(50):
+		trks = random_mixed_boxes(rng.randint(1, 60), rng, 60.)
+		dets = trks[rng.permutation(len(trks))[:rng.randint(0, len(trks) + 1)]]
+		dets = np.concatenate((dets + rng.normal(0, 0.5, dets.shape) * [1, 0, 1, 0, 0, 0, 0], random_mixed_boxes(rng.randint(1, 20), rng, 60.)))
+		radius = gate_radius_bound(dets, trks, 'giou_3d', -0.4)
+		dense = data_association(dets, trks, 'giou_3d', -0.4, 'greedy')
+		gated = gated_association(Box3DArray.from_boxes(dets), Box3DArray.from_boxes(trks), 'giou_3d', -0.4, None, radius, max_rest=0)
+		for index in [0, 2, 5, 6]: assert np.array_equal(dense[index], gated[index])
+		assert np.array_equal(np.sort(dense[1]), np.sort(gated[1]))
+		in_gate = within_gate(dets, trks, radius)
+		assert np.array_equal(gated[4][in_gate], dense[4][in_gate]) and np.all(gated[4][~in_gate] == min_affinity('giou_3d'))
+
+def test_greedy_matching_loop():
+	# the compiled greedy with early exit and partial sort gives the matches of the loop over all sorted pairs,
+	# with ties broken in the order of detection then track, also over the K pairs of the sparse greedy
+	rng = np.random.RandomState(0)
+	for check in range(300):
+		num_dets, num_trks = rng.randint(1, 60), rng.randint(1, 60)
+		if check % 2 == 0: cost_matrix = rng.randint(0, 5, (num_dets, num_trks)).astype(np.float32)
+		else: cost_matrix = rng.rand(num_dets, num_trks).astype(np.float32)
+		for max_cost in [np.inf, 0.3, 0.5, 2.]:
+			matches = greedy_matching_loop(cost_matrix, max_cost)
+			for partial_size in [16, 65536]:
+				assert np.array_equal(greedy_matching(cost_matrix, max_cost, partial_size=partial_size), matches)
+			det_index, trk_index = np.nonzero(np.ones((num_dets, num_trks), dtype=bool))
+			matches_sparse = greedy_matching_sparse(det_index, trk_index, cost_matrix.reshape(-1), max_cost)
+			assert np.array_equal(matches_sparse, matches)
+
+def test_greedy_matching_partial():
+	# large matrices where the partition grows, a few matches far beyond the smallest costs
+	rng = np.random.RandomState(0)
+	for num in [200, 500]:
+		cost_matrix = rng.rand(num, num).astype(np.float32)
+		cost_matrix[:, 0] = 0. 			# all detections want the first track
+		for max_cost in [np.inf, 0.5]:
+			matches = greedy_matching_loop(cost_matrix, max_cost)
+			assert np.array_equal(greedy_matching(cost_matrix, max_cost, partial_size=1000), matches)
+
+def birth_order(aff_matrix, threshold, algm):
+	# unmatched detections of the original data_association, the detections never assigned in index order, then
+	# the ones of the assigned pairs below the threshold in the order of assignment
+	if algm == 'hungar': matched_indices = np.stack(linear_sum_assignment(-aff_matrix), axis=1)
+	else: matched_indices = greedy_matching(-aff_matrix)
+	unmatched_dets = [d for d in range(aff_matrix.shape[0]) if d not in matched_indices[:, 0]]
+	return unmatched_dets + [m[0] for m in matched_indices if aff_matrix[m[0], m[1]] < threshold]
+
+@pytest.mark.parametrize('algm', ['hungar', 'greedy'])
+def test_unmatched_dets_order(algm):
+	# the unmatched detections are born in the order of the original data_association, also with the gate for
+	# the greedy
+	rng = np.random.RandomState(0)
+	for check in range(100):
+		trks = random_mixed_boxes(rng.randint(1, 30), rng, 60.)
+		dets = trks[rng.permutation(len(trks))[:rng.randint(0, len(trks) + 1)]]
+		dets = np.concatenate((dets + rng.normal(0, 0.5, dets.shape) * [1, 0, 1, 0, 0, 0, 0], random_mixed_boxes(rng.randint(0, 10), rng, 60.)))
+		for thres in [-0.4, 0., 0.3]:
+			unmatched_dets = data_association(dets, trks, 'giou_3d', thres, algm)[1]
+			assert np.array_equal(unmatched_dets, birth_order(compute_affinity(dets, trks, 'giou_3d'), thres, algm))
+			if algm == 'hungar': continue
+			radius = gate_radius_bound(dets, trks, 'giou_3d', thres)
+			assert np.array_equal(data_association(dets, trks, 'giou_3d', thres, algm, gate_radius=radius)[1], unmatched_dets)
+
+def global_assignment(det_index, trk_index, gain, num_dets, num_trks):
+	# hungarian algorithm on the whole N x M gain matrix, the pairs out of the graph have zero gain and are dropped
+	gain_matrix = np.zeros((num_dets, num_trks))
+	pair_matrix = np.full((num_dets, num_trks), -1)
+	gain_matrix[det_index, trk_index], pair_matrix[det_index, trk_index] = gain, np.arange(len(gain))
+	matched = pair_matrix[linear_sum_assignment(gain_matrix, maximize=True)]
+	matched = np.sort(matched[matched >= 0])
+	return np.stack((det_index[matched], trk_index[matched]), axis=1), gain[matched].sum()
+
+def check_components(det_index, trk_index, gain, num_dets, num_trks, unique=True):
+	# same total gain as the global assignment, and the same matches if the optimum is unique
+	matches, total = global_assignment(det_index, trk_index, gain, num_dets, num_trks)
+	matches_comp = hungarian_components(det_index, trk_index, gain, num_dets, num_trks)
+	gain_matrix = np.zeros((num_dets, num_trks))
+	gain_matrix[det_index, trk_index] = gain
+	assert len(np.unique(matches_comp[:, 0])) == len(matches_comp) and len(np.unique(matches_comp[:, 1])) == len(matches_comp)
+	assert np.all(np.isin(matches_comp[:, 0] * num_trks + matches_comp[:, 1], det_index * num_trks + trk_index))
+	assert gain_matrix[matches_comp[:, 0], matches_comp[:, 1]].sum() == pytest.approx(total)
+	if unique: assert np.array_equal(matches_comp, matches)
+
+def random_graph(num_dets, num_trks, num_pairs, rng, ties=False):
+	pairs = np.unique(rng.randint(0, num_dets * num_trks, num_pairs))
+	det_index, trk_index = pairs // num_trks, pairs % num_trks
+	gain = rng.randint(1, 4, len(pairs)).astype(float) if ties else rng.rand(len(pairs))
+	return det_index, trk_index, gain
+
+def test_hungarian_components_random():
+	# graphs from many small components to a single large one, with unique or tied gains
+	rng = np.random.RandomState(0)
+	for check in range(300):
+		num_dets, num_trks = rng.randint(1, 60), rng.randint(1, 60)
+		num_pairs = rng.randint(0, 3 * max(num_dets, num_trks))
+		for ties in [False, True]:
+			det_index, trk_index, gain = random_graph(num_dets, num_trks, num_pairs, rng, ties)
+			check_components(det_index, trk_index, gain, num_dets, num_trks, unique=not ties)
+
+def test_hungarian_components_stars():
+	# a detection with several tracks, a track with several detections and isolated pairs
+	det_index, trk_index = np.array([0, 0, 0, 1, 2, 3, 4]), np.array([0, 1, 2, 3, 3, 4, 5])
+	gain = np.array([0.2, 0.7, 0.1, 0.3, 0.6, 0.5, 0.4])
+	matches = hungarian_components(det_index, trk_index, gain, 5, 6)
+	assert np.array_equal(matches, [[0, 1], [2, 3], [3, 4], [4, 5]])
+	check_components(det_index, trk_index, gain, 5, 6)
+
+@pytest.mark.parametrize('cat', ['Car', 'Pedestrian', 'Truck'])
+def test_hungarian_components_nuscenes(cat):
+	# the assignment of the accepted pairs of the replayed frames is the global assignment
+	frames, _, metric, thres = replay_frames('nuScenes', cat, 'centerpoint')
+	for dets, trks in frames:
+		radius = gate_radius_bound(dets, trks, metric, thres)
+		if radius is None: continue
+		det_index, trk_index = gate_pairs(dets, trks, radius)
+		aff = compute_affinity_pairs(dets, trks, det_index, trk_index, metric)
+		edge = aff >= thres
+		det_index, trk_index, gain = det_index[edge], trk_index[edge], aff[edge].astype(np.float64) - thres
+		check_components(det_index, trk_index, gain, len(dets), len(trks))
+
+def check_hungarian_matching(aff_matrix, threshold):
+	# complete assignment of the same total affinity as the dense hungarian algorithm, with the same accepted matches
+	row_ind, col_ind = linear_sum_assignment(-aff_matrix)
+	matched_indices = hungarian_matching(aff_matrix, threshold, joint_size=0)
+	assert len(matched_indices) == len(row_ind) and np.all(np.diff(matched_indices[:, 0]) > 0)
+	assert len(np.unique(matched_indices[:, 1])) == len(matched_indices)
+	total = np.sum(aff_matrix[row_ind, col_ind], dtype=np.float64)
+	assert np.sum(aff_matrix[matched_indices[:, 0], matched_indices[:, 1]], dtype=np.float64) == pytest.approx(total, abs=1e-4)
+	keep = aff_matrix[row_ind, col_ind] >= threshold
+	accepted = aff_matrix[matched_indices[:, 0], matched_indices[:, 1]] >= threshold
+	assert np.array_equal(matched_indices[accepted], np.stack((row_ind[keep], col_ind[keep]), axis=1))
+
+def test_hungarian_matching_random():
+	# iou_3d scenes of growing density, where the boxes that do not overlap have the floor of 0, and giou_3d where
+	# the graph is a single component
+	rng = np.random.RandomState(0)
+	for check in range(100):
+		trks = random_mixed_boxes(rng.randint(1, 80), rng, rng.uniform(10., 200.))
+		dets = trks[rng.permutation(len(trks))[:rng.randint(0, len(trks) + 1)]]
+		dets = np.concatenate((dets + rng.normal(0, 0.5, dets.shape) * [1, 0, 1, 0, 0, 0, 0], random_mixed_boxes(rng.randint(1, 20), rng, 60.)))
+		check_hungarian_matching(compute_affinity(dets, trks, 'iou_3d'), 0.1)
+		if check % 10 == 0: check_hungarian_matching(compute_affinity(dets, trks, 'giou_3d'), -0.2)
+
+@pytest.mark.parametrize('dataset, cat, det_name', [('KITTI', 'Car', 'pointrcnn'), ('nuScenes', 'Car', 'centerpoint')])
+def test_hungarian_matching_frames(dataset, cat, det_name):
+	# replayed frames with the metric of the tracker and with iou_3d, and the association of a scene over the
+	# size of the joint assignment is the same as the dense hungarian algorithm
+	frames, _, metric, thres = replay_frames(dataset, cat, det_name)
+	for dets, trks in frames:
+		if len(dets) == 0 or len(trks) == 0: continue
+		check_hungarian_matching(compute_affinity(dets, trks, metric), thres)
+		check_hungarian_matching(compute_affinity(dets, trks, 'iou_3d'), 0.1)
+
+	rng = np.random.RandomState(0)
+	trks = random_mixed_boxes(600, rng, 250.)
+	dets = trks + rng.normal(0, 0.5, trks.shape) * [1, 0, 1, 0, 0, 0, 0]
+	matches, _, _, cost, aff_matrix = data_association(dets, trks, 'iou_3d', 0.1, 'hungar')[:5]
+	row_ind, col_ind = linear_sum_assignment(-aff_matrix)
+	keep = aff_matrix[row_ind, col_ind] >= 0.1
+	assert np.array_equal(matches, np.stack((row_ind[keep], col_ind[keep]), axis=1))
+	assert cost == pytest.approx(-np.sum(aff_matrix[row_ind, col_ind], dtype=np.float64), abs=1e-3)